@@ -93,6 +93,10 @@ api.add_namespace(onboarding_namespace, '/onboarding')
 api.add_namespace(submit_page_namespace, '/submit_page')
 api.add_namespace(prompt_lib_manual, '/prompt_lib_manual')
 
+# Resolve the Azure credential and Key Vault secret before the first playground call needs them
+from azure_credentials import warm_up
+warm_up()
+
 if __name__ == '__main__':
     app.run(debug=True)
 
@@ -0,0 +1,73 @@
+from db import get_db_connection
+from cache import TTLCache
+from config import Config
+
+# user email -> authorization context, see get_authorization_context
+_context_cache = TTLCache(ttl=Config.AUTHZ_CACHE_TTL, max_size=Config.AUTHZ_CACHE_SIZE)
+
+
+def _load_authorization_context(email, cursor):
+    cursor.execute('SELECT 1 FROM shared.admin_users WHERE email = ? and is_active = 1', (email,))
+    is_admin = cursor.fetchone() is not None
+
+    # Admins see every application, everybody else only the ones they own or use
+    if is_admin:
+        cursor.execute('SELECT client_id, app_name, owner FROM shared.application')
+    else:
+        cursor.execute('SELECT client_id, app_name, owner FROM shared.application WHERE owner = ? OR app_user = ?',
+                       (email, email))
+    applications = [{
+        'client_id': row[0],
+        'app_name': row[1],
+        'is_owner': (row[2] or '').lower() == email,
+    } for row in cursor.fetchall()]
+
+    return {
+        'email': email,
+        'is_admin': is_admin,
+        'is_owner': any(app['is_owner'] for app in applications),
+        'applications': applications,
+        'client_ids': [app['client_id'] for app in applications],
+    }
+
+
+def get_authorization_context(user_email, cursor=None):
+    """
+    Resolves what the user is allowed to see, caching the result for Config.AUTHZ_CACHE_TTL seconds.
+
+    :param user_email: The user's email ('preferred_username' claim)
+    :param cursor: Optional open cursor to reuse on a cache miss instead of checking out a new connection
+    :return: Dict with 'is_admin', 'is_owner', 'applications' (client_id, app_name, is_owner)
+             and 'client_ids' visible to the user. Shared between requests, treat as read-only.
+    """
+    email = (user_email or '').lower()
+    context = _context_cache.get(email)
+    if context is not None:
+        return context
+
+    if cursor is not None:
+        context = _load_authorization_context(email, cursor)
+    else:
+        db_connection = None
+        own_cursor = None
+        try:
+            db_connection = get_db_connection()
+            own_cursor = db_connection.cursor()
+            context = _load_authorization_context(email, own_cursor)
+        finally:
+            if own_cursor:
+                own_cursor.close()
+            if db_connection:
+                db_connection.close()
+
+    _context_cache.set(email, context)
+    return context
+
+
+def invalidate_authorization_context(user_email=None):
+    """
+    Drops cached authorization contexts. Call after shared.application or shared.admin_users change.
+
+    :param user_email: Only drop this user's context; drops every context when omitted
+    """
+    _context_cache.invalidate(user_email.lower() if user_email else None)
@@ -0,0 +1,98 @@
+import threading
+import time
+
+from azure.identity import DefaultAzureCredential
+from azure.keyvault.secrets import SecretClient
+
+from config import Config
+
+_credential = None
+_credential_lock = threading.Lock()
+
+
+def get_credential():
+    """
+    Returns the process-wide DefaultAzureCredential, created on first use.
+    Credential discovery (environment, managed identity, CLI) is slow, so it
+    must not happen per request.
+    """
+    global _credential
+    if _credential is None:
+        with _credential_lock:
+            if _credential is None:
+                _credential = DefaultAzureCredential()
+    return _credential
+
+
+class SecretProvider:
+    """
+    Process-wide cache of Key Vault secrets.
+
+    A secret is read synchronously the first time it is requested and from then
+    on refreshed by a background thread every `refresh_interval` seconds. When
+    Key Vault cannot be reached the last known value keeps being served.
+    """
+
+    def __init__(self, vault_url, refresh_interval):
+        self.vault_url = vault_url
+        self.refresh_interval = refresh_interval
+        self._client = None
+        self._values = {}
+        self._lock = threading.Lock()
+        self._refresher = None
+
+    def get(self, name):
+        """
+        :param name: Secret name
+        :return: Secret value, or None if it has never been retrieved successfully
+        """
+        value = self._values.get(name)
+        if value is None:
+            value = self._fetch(name)
+            self._ensure_refresher()
+        return value
+
+    def _fetch(self, name):
+        try:
+            value = self._get_client().get_secret(name).value
+            self._values[name] = value
+            return value
+        except Exception as e:
+            print(f"Error retrieving secret {name}: {e}")
+            return self._values.get(name)
+
+    def _get_client(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = SecretClient(vault_url=self.vault_url, credential=get_credential())
+        return self._client
+
+    def _ensure_refresher(self):
+        if self._refresher is None:
+            with self._lock:
+                if self._refresher is None:
+                    self._refresher = threading.Thread(target=self._refresh_loop, name='key-vault-refresher', daemon=True)
+                    self._refresher.start()
+
+    def _refresh_loop(self):
+        while True:
+            time.sleep(self.refresh_interval)
+            for name in list(self._values):
+                self._fetch(name)
+
+
+key_vault = SecretProvider(
+    f"https://{Config.key_vault_rg}.vault.azure.net",
+    refresh_interval=Config.KEY_VAULT_SECRET_REFRESH_INTERVAL,
+)
+
+
+def get_client_secret():
+    """Client secret of the API's app registration, used for on-behalf-of exchanges."""
+    return key_vault.get(f"{Config.key_vault_secret}")
+
+
+def warm_up():
+    """Runs credential discovery and the first secret read in the background so the first request does not pay for it."""
+    threading.Thread(target=get_client_secret, name='key-vault-warm-up', daemon=True).start()
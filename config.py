@@ -20,4 +20,48 @@ class Config:
     APIM_SCOPE = os.getenv('APIM_SCOPE')
     key_vault_rg = os.getenv('key_vault_rg')
     key_vault_secret = os.getenv('key_vault_secret')
+    DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 10))
+    DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', 30))
+    DB_POOL_MAX_IDLE = float(os.getenv('DB_POOL_MAX_IDLE', 300))
+    DB_POOL_HEALTH_CHECK_INTERVAL = float(os.getenv('DB_POOL_HEALTH_CHECK_INTERVAL', 30))
+    JWKS_CACHE_TTL = int(os.getenv('JWKS_CACHE_TTL', 3600))
+    JWKS_MIN_REFETCH_INTERVAL = int(os.getenv('JWKS_MIN_REFETCH_INTERVAL', 60))
+    TOKEN_CACHE_SIZE = int(os.getenv('TOKEN_CACHE_SIZE', 1024))
+    AUTHZ_CACHE_TTL = int(os.getenv('AUTHZ_CACHE_TTL', 60))
+    AUTHZ_CACHE_SIZE = int(os.getenv('AUTHZ_CACHE_SIZE', 1024))
+    PLAYGROUND_MAX_WORKERS = int(os.getenv('PLAYGROUND_MAX_WORKERS', 16))
+    PLAYGROUND_MODEL_TIMEOUT = float(os.getenv('PLAYGROUND_MODEL_TIMEOUT', 60))
+    PLAYGROUND_REQUEST_TIMEOUT = float(os.getenv('PLAYGROUND_REQUEST_TIMEOUT', 90))
+    OBO_REFRESH_MARGIN = int(os.getenv('OBO_REFRESH_MARGIN', 300))
+    OBO_CACHE_SIZE = int(os.getenv('OBO_CACHE_SIZE', 1024))
+    KEY_VAULT_SECRET_REFRESH_INTERVAL = int(os.getenv('KEY_VAULT_SECRET_REFRESH_INTERVAL', 3600))
+    HTTP_POOL_CONNECTIONS = int(os.getenv('HTTP_POOL_CONNECTIONS', 10))
+    HTTP_POOL_MAXSIZE = int(os.getenv('HTTP_POOL_MAXSIZE', 32))
+    HTTP_RETRIES = int(os.getenv('HTTP_RETRIES', 2))
+    HTTP_BACKOFF_FACTOR = float(os.getenv('HTTP_BACKOFF_FACTOR', 0.5))
+    HTTP_TIMEOUT = float(os.getenv('HTTP_TIMEOUT', 30))
+    HTTP_JWKS_TIMEOUT = float(os.getenv('HTTP_JWKS_TIMEOUT', 10))
+    HTTP_OBO_TIMEOUT = float(os.getenv('HTTP_OBO_TIMEOUT', 30))
+    MODEL_CATALOG_TTL = int(os.getenv('MODEL_CATALOG_TTL', 300))
+    MODEL_ROUTES_TTL = int(os.getenv('MODEL_ROUTES_TTL', 300))
+    MODEL_ROUTES_FILE = os.getenv('MODEL_ROUTES_FILE')
+    LEADERBOARD_CHECK_INTERVAL = int(os.getenv('LEADERBOARD_CHECK_INTERVAL', 60))
+    SAFETY_METRICS_CACHE_TTL = int(os.getenv('SAFETY_METRICS_CACHE_TTL', 300))
+    SAFETY_METRICS_CACHE_SIZE = int(os.getenv('SAFETY_METRICS_CACHE_SIZE', 1024))
+    DASHBOARD_BATCH_MAX_FILTERS = int(os.getenv('DASHBOARD_BATCH_MAX_FILTERS', 100))
+    USAGE_COST_PAGE_SIZE = int(os.getenv('USAGE_COST_PAGE_SIZE', 1000))
+    USAGE_COST_MAX_PAGE_SIZE = int(os.getenv('USAGE_COST_MAX_PAGE_SIZE', 10000))
+    USAGE_COST_EXPORT_BATCH_SIZE = int(os.getenv('USAGE_COST_EXPORT_BATCH_SIZE', 5000))
+    USAGE_COST_INGEST_BATCH_SIZE = int(os.getenv('USAGE_COST_INGEST_BATCH_SIZE', 5000))
+    USAGE_COST_INGEST_MAX_RECORDS = int(os.getenv('USAGE_COST_INGEST_MAX_RECORDS', 500000))
+    COST_ROLLUP_CHECK_INTERVAL = int(os.getenv('COST_ROLLUP_CHECK_INTERVAL', 300))
+    COST_ROLLUP_FULL_REFRESH_INTERVAL = int(os.getenv('COST_ROLLUP_FULL_REFRESH_INTERVAL', 21600))
+    PROMPT_FUZZY_THRESHOLD = float(os.getenv('PROMPT_FUZZY_THRESHOLD', 0.3))
+    PROMPT_FUZZY_TOP_K = int(os.getenv('PROMPT_FUZZY_TOP_K', 20))
+    PROMPT_FUZZY_MAX_TOP_K = int(os.getenv('PROMPT_FUZZY_MAX_TOP_K', 100))
+    PROMPT_LIB_PAGE_SIZE = int(os.getenv('PROMPT_LIB_PAGE_SIZE', 20))
+    PROMPT_LIB_MAX_PAGE_SIZE = int(os.getenv('PROMPT_LIB_MAX_PAGE_SIZE', 200))
+    PROMPT_VERSION_KEYFRAME_INTERVAL = int(os.getenv('PROMPT_VERSION_KEYFRAME_INTERVAL', 20))
+    PROMPT_VERSION_CACHE_SIZE = int(os.getenv('PROMPT_VERSION_CACHE_SIZE', 256))
+    PROMPT_ID_BLOCK_SIZE = int(os.getenv('PROMPT_ID_BLOCK_SIZE', 50))
 load_dotenv()
\ No newline at end of file
@@ -1,13 +1,239 @@
 import os
+import threading
+import time
+from collections import deque
+
 import pyodbc
 from config import Config
 
+
+def _connect():
+    """
+    Opens a brand-new pyodbc connection to the configured SQL Server.
+
+    :return: Raw pyodbc connection, or None when no managed identity is available
+    """
+    connection_string = 'DRIVER='+Config.DRIVER+';SERVER='+Config.SERVER+';DATABASE='+Config.DATABASE
+    if os.getenv("MSI_SECRET"):
+        return pyodbc.connect(connection_string+';Authentication=ActiveDirectoryInteractive')
+    return None
+
+
+class PooledConnection:
+    """
+    Proxy around a pyodbc connection checked out from the pool.
+    close() hands the connection back to the pool instead of tearing it down,
+    so the existing `finally: db_connection.close()` blocks keep working unchanged.
+    """
+
+    def __init__(self, pool, raw):
+        self._pool = pool
+        self._raw = raw
+
+    def __getattr__(self, name):
+        raw = self.__dict__.get('_raw')
+        if raw is None:
+            raise pyodbc.ProgrammingError('Attempt to use a connection that was returned to the pool')
+        return getattr(raw, name)
+
+    def close(self):
+        raw, self._raw = self.__dict__.get('_raw'), None
+        if raw is not None:
+            self._pool.release(raw)
+
+    def __del__(self):
+        # Safety net for handlers that forget to close; returns the slot to the pool
+        try:
+            self.close()
+        except Exception:
+            pass
+
+
+class ConnectionPool:
+    """
+    Bounded, thread-safe pool of pyodbc connections.
+
+    - At most `max_size` connections exist at any time (idle + checked out).
+    - acquire() waits up to `timeout` seconds for a free slot, then raises TimeoutError.
+    - Idle connections unused for longer than `max_idle` seconds are closed.
+    - Connections idle for longer than `health_check_interval` seconds are probed
+      with `SELECT 1` before being handed out; dead ones are replaced.
+    """
+
+    def __init__(self, factory, max_size=10, timeout=30, max_idle=300, health_check_interval=30):
+        self._factory = factory
+        self._max_size = max_size
+        self._timeout = timeout
+        self._max_idle = max_idle
+        self._health_check_interval = health_check_interval
+        self._idle = deque()  # (raw connection, last returned at)
+        self._in_use = 0
+        self._cond = threading.Condition()
+        self._stats = {
+            'created': 0,
+            'closed': 0,
+            'checkouts': 0,
+            'timeouts': 0,
+            'evicted_idle': 0,
+            'failed_health_checks': 0,
+            'connect_errors': 0,
+            'total_wait_seconds': 0.0,
+        }
+
+    def acquire(self):
+        """
+        Checks out a connection, reusing an idle one when possible.
+
+        :return: PooledConnection, or None when the factory cannot produce a connection
+        """
+        started = time.monotonic()
+        deadline = started + self._timeout
+        stale = []
+        with self._cond:
+            while True:
+                stale.extend(self._evict_idle_locked())
+                if self._idle:
+                    # LIFO keeps the most recently used connections warm
+                    raw, last_used = self._idle.pop()
+                    self._in_use += 1
+                    break
+                if self._in_use < self._max_size:
+                    raw, last_used = None, None
+                    self._in_use += 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._stats['timeouts'] += 1
+                    raise TimeoutError(f"Timed out after {self._timeout}s waiting for a database connection")
+                self._cond.wait(remaining)
+            self._stats['total_wait_seconds'] += time.monotonic() - started
+
+        for conn in stale:
+            self._close_raw(conn)
+
+        if raw is not None and time.monotonic() - last_used > self._health_check_interval:
+            if not self._is_healthy(raw):
+                self._close_raw(raw)
+                with self._cond:
+                    self._stats['failed_health_checks'] += 1
+                raw = None
+
+        if raw is None:
+            try:
+                raw = self._factory()
+            except Exception:
+                with self._cond:
+                    self._stats['connect_errors'] += 1
+                self._release_slot()
+                raise
+            if raw is None:
+                self._release_slot()
+                return None
+            with self._cond:
+                self._stats['created'] += 1
+
+        with self._cond:
+            self._stats['checkouts'] += 1
+        return PooledConnection(self, raw)
+
+    def release(self, raw):
+        """
+        Returns a connection to the pool, rolling back any uncommitted work.
+        Connections that fail to roll back are assumed broken and discarded.
+        """
+        try:
+            raw.rollback()
+        except Exception:
+            self._close_raw(raw)
+            self._release_slot()
+            return
+        with self._cond:
+            self._in_use -= 1
+            self._idle.append((raw, time.monotonic()))
+            self._cond.notify()
+
+    def close_all(self):
+        """Closes every idle connection. Checked-out connections are closed when released."""
+        with self._cond:
+            idle = [raw for raw, _ in self._idle]
+            self._idle.clear()
+        for raw in idle:
+            self._close_raw(raw)
+
+    def stats(self):
+        """Snapshot of pool-wide counters and current occupancy."""
+        with self._cond:
+            snapshot = dict(self._stats)
+            snapshot.update({
+                'max_size': self._max_size,
+                'in_use': self._in_use,
+                'idle': len(self._idle),
+            })
+        return snapshot
+
+    def _evict_idle_locked(self):
+        # Oldest entries sit at the left end of the deque
+        evicted = []
+        cutoff = time.monotonic() - self._max_idle
+        while self._idle and self._idle[0][1] < cutoff:
+            evicted.append(self._idle.popleft()[0])
+        self._stats['evicted_idle'] += len(evicted)
+        return evicted
+
+    def _release_slot(self):
+        with self._cond:
+            self._in_use -= 1
+            self._cond.notify()
+
+    def _is_healthy(self, raw):
+        try:
+            cursor = raw.cursor()
+            try:
+                cursor.execute('SELECT 1')
+                cursor.fetchone()
+            finally:
+                cursor.close()
+            return True
+        except Exception as e:
+            print(f"Discarding unhealthy database connection: {e}")
+            return False
+
+    def _close_raw(self, raw):
+        try:
+            raw.close()
+        except Exception:
+            pass
+        with self._cond:
+            self._stats['closed'] += 1
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Returns the process-wide connection pool, creating it on first use."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(
+                    _connect,
+                    max_size=Config.DB_POOL_SIZE,
+                    timeout=Config.DB_POOL_TIMEOUT,
+                    max_idle=Config.DB_POOL_MAX_IDLE,
+                    health_check_interval=Config.DB_POOL_HEALTH_CHECK_INTERVAL,
+                )
+    return _pool
+
+
+def get_pool_stats():
+    return get_pool().stats()
+
+
 def get_db_connection():
     try:
-        connection_string = 'DRIVER='+Config.DRIVER+';SERVER='+Config.SERVER+';DATABASE='+Config.DATABASE
-        if os.getenv("MSI_SECRET"):
-            conn = pyodbc.connect(connection_string+';Authentication=ActiveDirectoryInteractive')
-            return conn
+        return get_pool().acquire()
     except Exception as e:
         print(f"Failed to connect to database: {e}")
-        return None
\ No newline at end of file
+        return None
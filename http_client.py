@@ -0,0 +1,138 @@
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from config import Config
+
+
+class _NonIdempotentRetry(Retry):
+    """Only 429 responses carrying Retry-After are replayed: the server refused the request without processing it."""
+
+    RETRY_AFTER_STATUS_CODES = frozenset({429})
+
+
+class HttpClient:
+    """
+    Shared outbound HTTP client.
+
+    Wraps requests Sessions whose adapters keep up to `pool_maxsize` keep-alive
+    connections per host, so repeated calls to APIM and Azure AD reuse TLS
+    connections. GETs are retried on connection errors, timeouts, 429 and 5xx with
+    exponential backoff (honouring Retry-After). Other methods (billable model
+    calls, token exchanges) are only retried when the connection could not be
+    established, or on a 429 with Retry-After; never after a read timeout or a 5xx.
+    Each call names a route, which selects its timeout and the counters it is
+    reported under in stats().
+    """
+
+    RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+    def __init__(self, pool_connections, pool_maxsize, retries, backoff_factor, default_timeout, route_timeouts):
+        self.default_timeout = default_timeout
+        self.route_timeouts = route_timeouts
+        retry = Retry(
+            total=retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=self.RETRY_STATUSES,
+            allowed_methods=frozenset({'GET'}),
+            respect_retry_after_header=True,
+            raise_on_status=False,
+        )
+        non_idempotent_retry = _NonIdempotentRetry(
+            total=retries,
+            connect=retries,
+            read=0,
+            other=0,
+            backoff_factor=backoff_factor,
+            allowed_methods=None,
+            respect_retry_after_header=True,
+            raise_on_status=False,
+        )
+        self._adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize, max_retries=retry)
+        self._non_idempotent_adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize,
+                                                   max_retries=non_idempotent_retry)
+        self.session = self._mount(requests.Session(), self._adapter)
+        self._non_idempotent_session = self._mount(requests.Session(), self._non_idempotent_adapter)
+        self._lock = threading.Lock()
+        self._routes = {}
+
+    def request(self, method, url, route='default', **kwargs):
+        """
+        :param method: HTTP method
+        :param url: Absolute URL
+        :param route: Logical route name used for the timeout and metrics
+        :param kwargs: Passed through to requests; an explicit timeout wins over the route timeout
+        :return: requests.Response
+        """
+        kwargs.setdefault('timeout', self.route_timeouts.get(route, self.default_timeout))
+        counters = self._route_counters(route)
+        with self._lock:
+            counters['requests'] += 1
+            counters['in_flight'] += 1
+        started = time.monotonic()
+        try:
+            session = self.session if method.upper() == 'GET' else self._non_idempotent_session
+            return session.request(method, url, **kwargs)
+        except requests.RequestException:
+            with self._lock:
+                counters['errors'] += 1
+            raise
+        finally:
+            with self._lock:
+                counters['in_flight'] -= 1
+                counters['total_seconds'] += time.monotonic() - started
+
+    def get(self, url, route='default', **kwargs):
+        return self.request('GET', url, route=route, **kwargs)
+
+    def post(self, url, route='default', **kwargs):
+        return self.request('POST', url, route=route, **kwargs)
+
+    def stats(self):
+        """Per-route call counters and per-host connection pool usage."""
+        with self._lock:
+            routes = {route: dict(counters) for route, counters in self._routes.items()}
+        pools = {}
+        for kind, adapter in (('idempotent', self._adapter), ('non_idempotent', self._non_idempotent_adapter)):
+            manager = adapter.poolmanager
+            for key in list(manager.pools.keys()):
+                pool = manager.pools.get(key)
+                if pool is None:
+                    continue
+                pools[f"{kind} {key.key_scheme}://{key.key_host}:{key.key_port}"] = {
+                    'connections_created': pool.num_connections,
+                    'requests': pool.num_requests,
+                    'available_slots': pool.pool.qsize() if pool.pool is not None else 0,
+                    'max_size': adapter._pool_maxsize,
+                }
+        return {'routes': routes, 'pools': pools}
+
+    @staticmethod
+    def _mount(session, adapter):
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        return session
+
+    def _route_counters(self, route):
+        with self._lock:
+            counters = self._routes.get(route)
+            if counters is None:
+                counters = self._routes[route] = {'requests': 0, 'errors': 0, 'in_flight': 0, 'total_seconds': 0.0}
+            return counters
+
+
+http = HttpClient(
+    pool_connections=Config.HTTP_POOL_CONNECTIONS,
+    pool_maxsize=Config.HTTP_POOL_MAXSIZE,
+    retries=Config.HTTP_RETRIES,
+    backoff_factor=Config.HTTP_BACKOFF_FACTOR,
+    default_timeout=Config.HTTP_TIMEOUT,
+    route_timeouts={
+        'jwks': Config.HTTP_JWKS_TIMEOUT,
+        'obo': Config.HTTP_OBO_TIMEOUT,
+        'apim_model': Config.PLAYGROUND_MODEL_TIMEOUT,
+    },
+)
@@ -0,0 +1,64 @@
+import threading
+
+from config import Config
+from db import get_db_connection
+
+RESERVE_RANGE_QUERY = '''
+    SET NOCOUNT ON;
+    DECLARE @first SQL_VARIANT;
+    EXEC sys.sp_sequence_get_range @sequence_name = N'{sequence}', @range_size = ?, @range_first_value = @first OUTPUT;
+    SELECT CAST(@first AS BIGINT);
+'''
+
+
+class SequenceAllocator:
+    """
+    Hands out unique integer ids from a SQL Server sequence.
+
+    Ids are reserved `block_size` at a time with sp_sequence_get_range on a
+    connection of their own, so a reservation is never rolled back with the
+    caller's transaction and most calls need no database round trip. The sequence
+    guarantees uniqueness across processes; ids reserved but not used by a
+    process that stops are skipped. The sequence is created by a migration
+    (see migrations/), not by the application.
+    """
+
+    def __init__(self, sequence, block_size):
+        self.sequence = sequence
+        self.block_size = block_size
+        self._next = 0
+        self._end = 0
+        self._lock = threading.Lock()
+
+    def next_id(self):
+        """
+        :return: The next unused id
+        :raises Exception: If no block can be reserved
+        """
+        with self._lock:
+            if self._next >= self._end:
+                self._next = self._reserve()
+                self._end = self._next + self.block_size
+            value = self._next
+            self._next += 1
+            return value
+
+    def _reserve(self):
+        db_connection = None
+        cursor = None
+        try:
+            db_connection = get_db_connection()
+            cursor = db_connection.cursor()
+            cursor.execute(RESERVE_RANGE_QUERY.format(sequence=self.sequence), (self.block_size,))
+            first = cursor.fetchone()[0]
+            db_connection.commit()
+            return int(first)
+        finally:
+            if cursor:
+                cursor.close()
+            if db_connection:
+                db_connection.close()
+
+
+# Created by migrations/002_prompt_id_sequence.sql
+prompt_id_allocator = SequenceAllocator('base.prompt_id_seq', block_size=Config.PROMPT_ID_BLOCK_SIZE)
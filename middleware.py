@@ -1,8 +1,81 @@
 from flask import request, jsonify, g
 from functools import wraps
+from collections import OrderedDict
 from token_validation import validate_token
+from config import Config
+import hashlib
+import threading
+import time
 import jwt
 
+
+class VerifiedTokenCache:
+    """
+    Bounded LRU cache of successfully validated tokens.
+
+    Entries are keyed by the SHA-256 digest of the raw token (the token itself is
+    never stored) and hold the decoded claims until the token's 'exp' claim.
+    Expired entries are dropped when looked up and swept before evicting live
+    entries on insert.
+    """
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._entries = OrderedDict()  # digest -> (exp, claims)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _digest(token):
+        return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+    def get(self, token):
+        """
+        :param token: Raw bearer token
+        :return: Copy of the cached claims, or None on a miss or an expired entry
+        """
+        digest = self._digest(token)
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is None or entry[0] <= time.time():
+                if entry is not None:
+                    del self._entries[digest]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(digest)
+            self.hits += 1
+            return dict(entry[1])
+
+    def put(self, token, claims):
+        """
+        Caches decoded claims until the token expires. Tokens without a numeric 'exp' are not cached.
+        """
+        exp = claims.get('exp')
+        if not isinstance(exp, (int, float)) or exp <= time.time():
+            return
+        digest = self._digest(token)
+        with self._lock:
+            self._entries[digest] = (exp, dict(claims))
+            self._entries.move_to_end(digest)
+            if len(self._entries) > self.max_size:
+                self._purge_expired_locked()
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            return {'size': len(self._entries), 'max_size': self.max_size, 'hits': self.hits, 'misses': self.misses}
+
+    def _purge_expired_locked(self):
+        now = time.time()
+        for digest in [d for d, (exp, _) in self._entries.items() if exp <= now]:
+            del self._entries[digest]
+
+
+token_cache = VerifiedTokenCache(Config.TOKEN_CACHE_SIZE)
+
+
 def token_required(func):
     """
     Middleware to require and validate a token for accessing the endpoint.
@@ -25,10 +98,13 @@ def token_required(func):
             # Extract the token from the header
             token = auth_header.split(' ')[1]
 
-            # Validate the token
-            validation_response = validate_token(token)
-            if 'error' in validation_response:
-                return validation_response, 401
+            # Validate the token, skipping signature verification for recently verified tokens
+            validation_response = token_cache.get(token)
+            if validation_response is None:
+                validation_response = validate_token(token)
+                if 'error' in validation_response:
+                    return validation_response, 401
+                token_cache.put(token, validation_response)
             print("====================>", validation_response)
             # Store the decoded token in the global 'g' object for use in the request
             g.decoded_token = validation_response
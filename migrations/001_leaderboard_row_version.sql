@@ -0,0 +1,21 @@
+-- Change detector for the leaderboard snapshot (resources/leaderboard.py).
+-- row_version is bumped by SQL Server on every insert and update, and its index makes
+-- MAX(row_version) a single seek instead of a scan of the table.
+
+IF COL_LENGTH('dbr_report.model_requester_aggr', 'row_version') IS NULL
+    ALTER TABLE dbr_report.model_requester_aggr ADD row_version ROWVERSION;
+GO
+IF NOT EXISTS (SELECT 1 FROM sys.indexes
+               WHERE name = 'IX_model_requester_aggr_row_version'
+                 AND object_id = OBJECT_ID('dbr_report.model_requester_aggr'))
+    CREATE INDEX IX_model_requester_aggr_row_version ON dbr_report.model_requester_aggr (row_version);
+GO
+
+IF COL_LENGTH('dbr_report.lb_latency', 'row_version') IS NULL
+    ALTER TABLE dbr_report.lb_latency ADD row_version ROWVERSION;
+GO
+IF NOT EXISTS (SELECT 1 FROM sys.indexes
+               WHERE name = 'IX_lb_latency_row_version'
+                 AND object_id = OBJECT_ID('dbr_report.lb_latency'))
+    CREATE INDEX IX_lb_latency_row_version ON dbr_report.lb_latency (row_version);
+GO
@@ -0,0 +1,13 @@
+-- Source of prompt ids (id_allocator.py). It starts after the largest numeric prompt_id
+-- already in base.prompt_lib. The application reserves ids in blocks with
+-- sp_sequence_get_range, which needs UPDATE permission on the sequence.
+
+IF OBJECT_ID('base.prompt_id_seq', 'SO') IS NULL
+BEGIN
+    DECLARE @start BIGINT = (SELECT ISNULL(MAX(TRY_CAST(prompt_id AS BIGINT)), 0) + 1 FROM base.prompt_lib);
+    -- START WITH only takes a constant, hence the dynamic statement
+    DECLARE @ddl NVARCHAR(400) = N'CREATE SEQUENCE base.prompt_id_seq AS BIGINT START WITH '
+        + CAST(@start AS NVARCHAR(20)) + N' INCREMENT BY 1 NO CACHE';
+    EXEC sp_executesql @ddl;
+END
+GO
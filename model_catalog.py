@@ -0,0 +1,133 @@
+import threading
+import time
+
+from config import Config
+from db import get_db_connection
+
+MODEL_COLUMNS = (
+    'model_id',
+    'model_name',
+    'model_provider',
+    'model_type',
+    'active',
+    'security_clearance',
+    'IT_clearance',
+    'legal_clearance',
+    'expirementation',
+    'adgroupformodelaccess_nonprod',
+    'adgroupformodelaccess_prod',
+)
+
+
+class ModelCatalogSnapshot:
+    """
+    Immutable view of base.models at one point in time, with its lookup indexes.
+    Rows are dicts keyed by MODEL_COLUMNS and shared between requests, treat as read-only.
+    """
+
+    def __init__(self, version, models):
+        self.version = version
+        self.loaded_at = time.time()
+        self.models = models
+        self.by_id = {}
+        self.by_id_and_name = {}
+        self.by_provider = {}
+        for model in models:
+            self.by_id.setdefault(model['model_id'], model)
+            self.by_id_and_name.setdefault((model['model_id'], model['model_name']), model)
+            self.by_provider.setdefault((model['model_provider'] or '').lower(), []).append(model)
+
+    def active_models(self):
+        # base.models.active is a 'true'/'false' string column
+        return [model for model in self.models if str(model['active']).lower() == 'true']
+
+
+class ModelCatalog:
+    """
+    Process-wide cache of base.models.
+
+    The table is loaded once and reloaded when it is older than `ttl` seconds or
+    after invalidate(). Every reload that changes the rows bumps the snapshot
+    version, so dependants (e.g. the playground route table) can rebuild only
+    when the catalog actually changed. If a reload fails the previous snapshot
+    keeps being served.
+    """
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._snapshot = None
+        self._loaded_at = None
+        self._lock = threading.Lock()
+
+    def snapshot(self):
+        """
+        :return: Current ModelCatalogSnapshot
+        :raises Exception: If base.models has never been loaded successfully and cannot be read
+        """
+        if self._loaded_at is None or time.monotonic() - self._loaded_at >= self.ttl:
+            with self._lock:
+                if self._loaded_at is None or time.monotonic() - self._loaded_at >= self.ttl:
+                    self._reload()
+        return self._snapshot
+
+    def get(self, model_id, model_name=None):
+        """
+        :param model_id: Model ID
+        :param model_name: Optional model name the row must also match
+        :return: Model row, or None if not in base.models
+        """
+        snapshot = self.snapshot()
+        if model_name is None:
+            return snapshot.by_id.get(model_id)
+        return snapshot.by_id_and_name.get((model_id, model_name))
+
+    def by_provider(self, provider):
+        """:return: Model rows of the provider (case-insensitive)"""
+        return list(self.snapshot().by_provider.get((provider or '').lower(), []))
+
+    def invalidate(self):
+        """Forces a reload on the next lookup. Call after base.models changes."""
+        with self._lock:
+            self._loaded_at = None
+
+    def stats(self):
+        snapshot = self._snapshot
+        if snapshot is None:
+            return {'version': None, 'models': 0, 'age_seconds': None}
+        return {
+            'version': snapshot.version,
+            'models': len(snapshot.models),
+            'age_seconds': round(time.time() - snapshot.loaded_at, 1),
+        }
+
+    def _reload(self):
+        try:
+            models = self._load()
+        except Exception as e:
+            if self._snapshot is None:
+                raise
+            print(f"Error reloading model catalog, serving version {self._snapshot.version}: {e}")
+            # Retry on the next TTL rather than on every request
+            self._loaded_at = time.monotonic()
+            return
+        if self._snapshot is None or models != self._snapshot.models:
+            version = 1 if self._snapshot is None else self._snapshot.version + 1
+            self._snapshot = ModelCatalogSnapshot(version, models)
+        self._loaded_at = time.monotonic()
+
+    def _load(self):
+        db_connection = None
+        cursor = None
+        try:
+            db_connection = get_db_connection()
+            cursor = db_connection.cursor()
+            cursor.execute(f"SELECT {', '.join(MODEL_COLUMNS)} FROM base.models")
+            return [dict(zip(MODEL_COLUMNS, row)) for row in cursor.fetchall()]
+        finally:
+            if cursor:
+                cursor.close()
+            if db_connection:
+                db_connection.close()
+
+
+model_catalog = ModelCatalog(ttl=Config.MODEL_CATALOG_TTL)
@@ -1,4 +1,4 @@
-from db import get_db_connection
+from authorization import get_authorization_context, invalidate_authorization_context
 from flask_restful import Resource, request
 from flask_restx import Resource, Namespace
 from middleware import token_required
@@ -15,27 +15,13 @@ class AdminResource(Resource):
     def get(self):
         token_details = g.decoded_token
         user_email = token_details['preferred_username'].lower()
-        db_connection = None
-        cursor = None  # Initialize cursor to None
         try:
-            # Connect to the database
-            db_connection = get_db_connection()
-            cursor = db_connection.cursor()
-
-            # Check if the user is an admin
-            admin_check_query = 'SELECT 1 FROM shared.admin_users WHERE email = ? AND is_active = 1'
-            cursor.execute(admin_check_query, (user_email,))
-            is_admin = cursor.fetchone() is not None
-
-            # Check if the user is the owner of any application
-            owner_check_query = 'SELECT 1 FROM shared.application WHERE owner = ?'
-            cursor.execute(owner_check_query, (user_email,))
-            is_owner = cursor.fetchone() is not None
+            context = get_authorization_context(user_email)
 
             # Return both admin and owner status in the response
             return {
-                'is_admin': is_admin,
-                'is_owner': is_owner
+                'is_admin': context['is_admin'],
+                'is_owner': context['is_owner']
             }, 200
 
         except Exception as e:
@@ -43,13 +29,26 @@ class AdminResource(Resource):
             logging.error(f"An error occurred: {e}")
             return {'message': 'Internal Server Error', 'details': str(e)}, 500
 
-        finally:
-            # Ensure that the cursor and connection are properly closed
-            if cursor:
-                cursor.close()
-            if db_connection:
-                db_connection.close()
+
+class AdminCacheResource(Resource):
+    @token_required
+    def delete(self):
+        """
+        Drops every cached authorization context so changes to shared.application
+        or shared.admin_users take effect immediately.
+        """
+        token_details = g.decoded_token
+        user_email = token_details['preferred_username'].lower()
+        try:
+            if not get_authorization_context(user_email)['is_admin']:
+                return {'message': 'Only admins can invalidate the authorization cache'}, 403
+            invalidate_authorization_context()
+            return {'message': 'Authorization cache invalidated'}, 200
+        except Exception as e:
+            logging.error(f"An error occurred: {e}")
+            return {'message': 'Internal Server Error', 'details': str(e)}, 500
 
 
 # Add the resource to the namespace
-api.add_resource(AdminResource, '/')
\ No newline at end of file
+api.add_resource(AdminResource, '/')
+api.add_resource(AdminCacheResource, '/cache')
\ No newline at end of file
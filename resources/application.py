@@ -1,5 +1,6 @@
 from flask_restx import Resource, fields, Namespace  # type: ignore # Use flask-restplus instead of flask-restx
 from db import get_db_connection
+from authorization import get_authorization_context, invalidate_authorization_context
 from middleware import token_required
 from flask_jwt_extended import jwt_required
 from flask import g, request
@@ -28,49 +29,26 @@ class ApplicationResource(Resource):
     def get(self):
         token_details = g.decoded_token
         user_email = token_details['preferred_username']
-        db_connection = None
-        cursor = None  # Initialize cursor to None
         try:
-            # Connect to the database
-            db_connection = get_db_connection()
-            cursor = db_connection.cursor()
-            rai_data = request.args.get('rai', False)    
-            # Check if the user is an admin
-            admin_check_query = 'SELECT 1 FROM shared.admin_users WHERE email = ? and is_active = 1'
-            cursor.execute(admin_check_query, (user_email.lower(),))
-            is_admin = cursor.fetchone() is not None
-            # If user is an admin, retrieve all applications
-            if is_admin:
-                query = 'SELECT * FROM shared.application'
-                cursor.execute(query)
-            elif rai_data:
-                # Otherwise, retrieve applications based on owner
-                query = 'SELECT * FROM shared.application WHERE owner = ?'
-                cursor.execute(query, (user_email.lower()))
-            else:
-                # Otherwise, retrieve applications based on owner or app_user
-                query = 'SELECT * FROM shared.application WHERE owner = ? OR app_user = ?'
-                cursor.execute(query, (user_email.lower(), user_email.lower()))
+            rai_data = request.args.get('rai', False)
+            context = get_authorization_context(user_email)
+            applications = context['applications']
+            # Admins get every application; RAI views are limited to applications the user owns
+            if rai_data and not context['is_admin']:
+                applications = [app for app in applications if app['is_owner']]
 
-            applications = cursor.fetchall()
-            applications.sort(key=lambda x: x[1])
             # Prepare data for response
             applications_data = []
-            for app in applications:
+            for app in sorted(applications, key=lambda x: x['app_name'] or ''):
                 applications_data.append({
-                    'application_id': app[0],
-                    'application_name': app[1],
+                    'application_id': app['client_id'],
+                    'application_name': app['app_name'],
                 })
 
             return applications_data, 200
         except Exception as e:
             print(f"Database connection failed: {e}")
             return {'message': 'Database connection failed'}, 500
-        finally:
-            if cursor:  # Only close the cursor if it was successfully created
-                cursor.close()
-            if db_connection:  # Only close the connection if it was successfully created
-                db_connection.close()
                 
     
     @api.expect(app_model_post)
@@ -112,6 +90,8 @@ class ApplicationResource(Resource):
                 # onboarding_req_num (Optional)
             ))
             db_connection.commit()
+            # Owners, app users and admins (whose contexts list every application) must see it straight away
+            invalidate_authorization_context()
             return {'message': 'Application created successfully'}, 201
         except Exception as e:
             print(f"Error inserting application: {e}")
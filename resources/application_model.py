@@ -2,7 +2,7 @@ from collections import defaultdict
 from flask import request, jsonify
 # from flask_restful import Resource
 from flask_jwt_extended import jwt_required
-from db import get_db_connection
+from model_catalog import model_catalog
 from flask_restx import Namespace, fields,Resource # type: ignore
 from middleware import token_required
 
@@ -32,37 +32,22 @@ class ApplicationModelResource(Resource):
         Retrieve model information from the `base.models` table.
         """
         try:
-            db_connection = get_db_connection()
-            cursor = db_connection.cursor()
-            
-            # Query to fetch model data
-            query = """
-                    SELECT DISTINCT
-                        model_id, 
-                        model_name, 
-                        security_clearance, 
-                        IT_clearance, 
-                        legal_clearance,
-                        expirementation
-                    FROM 
-                        base.models where active = ?;
-                    """
-            
-            cursor.execute(query,'true')
-            model_data = cursor.fetchall()
-            
             # Transform data into the expected format
             models = []
-            if model_data:
-                for row in model_data:
-                    model = {
-                        "model_id": row[0],
-                        "model_name": row[1],
-                        "security_clearance": row[2],
-                        "IT_clearance": row[3],
-                        "legal_clearance": row[4],
-                        "expirementation": row[5]
-                    }
+            seen = set()
+            for row in model_catalog.snapshot().active_models():
+                model = {
+                    "model_id": row['model_id'],
+                    "model_name": row['model_name'],
+                    "security_clearance": row['security_clearance'],
+                    "IT_clearance": row['IT_clearance'],
+                    "legal_clearance": row['legal_clearance'],
+                    "expirementation": row['expirementation']
+                }
+                # Same rows as the previous SELECT DISTINCT
+                key = tuple(model.values())
+                if key not in seen:
+                    seen.add(key)
                     models.append(model)
 
             # Response format expected by the application_model schema
@@ -71,8 +56,5 @@ class ApplicationModelResource(Resource):
         except Exception as e:
             print(f"Error fetching application model data: {e}")
             return jsonify({"message": "An error occurred while fetching data"}), 500
-        finally:
-            cursor.close()
-            db_connection.close()
 
 api.add_resource(ApplicationModelResource, '/')
\ No newline at end of file
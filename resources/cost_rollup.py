@@ -0,0 +1,218 @@
+import bisect
+import threading
+import time
+from datetime import datetime
+
+from db import get_db_connection
+
+# Per-day change detector for dbr_report.dbr_model_serving_cost
+DAY_SIGNATURE_QUERY = '''
+    SELECT
+        CAST(usage_date AS date) AS usage_day,
+        COUNT_BIG(*),
+        CHECKSUM_AGG(BINARY_CHECKSUM(client_request_id, model_id, total_tokens, total_cost))
+    FROM
+        dbr_report.dbr_model_serving_cost
+    GROUP BY
+        CAST(usage_date AS date)
+'''
+
+ROLLUP_QUERY = '''
+    SELECT
+        CAST(records.usage_date AS date) AS usage_day,
+        records.client_name,
+        records.model_id,
+        records.model_name,
+        SUM(records.total_tokens) AS total_tokens,
+        SUM(records.total_cost) AS total_cost
+    FROM ({source_query}{day_filter}) AS records
+    GROUP BY
+        CAST(records.usage_date AS date), records.client_name, records.model_id, records.model_name
+'''
+
+GROUP_BY_FIELDS = ('client_name', 'model_id', 'model_name')
+
+# Above this many changed days a full rebuild is cheaper than an IN list
+MAX_INCREMENTAL_DAYS = 500
+
+
+def _as_date(value):
+    return value.date() if isinstance(value, datetime) else value
+
+
+def _month_of(day):
+    return day.strftime('%Y-%m')
+
+
+class CostRollupStore:
+    """
+    Per-day and per-month token and cost totals by (client_name, model_id, model_name).
+
+    The totals are aggregated from `source_query`, the same record query the
+    llm_usage_cost GET serves, so client_name follows its resolution rules. At most
+    every `check_interval` seconds a per-day signature of the cost table is read and
+    only the days whose signature changed are re-aggregated. Everything is rebuilt
+    every `full_refresh_interval` seconds, which picks up renamed applications and
+    user groups.
+    """
+
+    def __init__(self, source_query, check_interval, full_refresh_interval):
+        self.source_query = source_query
+        self.check_interval = check_interval
+        self.full_refresh_interval = full_refresh_interval
+        self._daily = {}        # day -> {(client_name, model_id, model_name): [tokens, cost]}
+        self._monthly = {}      # 'YYYY-MM' -> same
+        self._days = []         # sorted days present in _daily
+        self._month_days = {}   # 'YYYY-MM' -> number of days present in _daily
+        self._signatures = {}   # day -> (row count, checksum)
+        self._checked_at = None
+        self._rebuilt_at = None
+        self.refreshed_at = None
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+
+    def query(self, start_date, end_date, granularity='day', group_by=GROUP_BY_FIELDS, filters=None):
+        """
+        :param start_date: First day to include, or None for no lower bound
+        :param end_date: Last day to include, or None for no upper bound
+        :param granularity: 'day' or 'month'
+        :param group_by: Subset of GROUP_BY_FIELDS to keep in the result
+        :param filters: Optional dict of GROUP_BY_FIELDS -> required value
+        :return: List of dicts with period, the group_by fields, total_tokens and total_cost,
+                 sorted by period and group
+        """
+        self._ensure_fresh()
+        filters = filters or {}
+        with self._lock:
+            daily, monthly, days, month_days = self._daily, self._monthly, self._days, self._month_days
+
+        buckets = []  # (period, totals by key)
+        low = bisect.bisect_left(days, start_date) if start_date else 0
+        high = bisect.bisect_right(days, end_date) if end_date else len(days)
+        selected = days[low:high]
+        if granularity == 'month':
+            by_month = {}
+            for day in selected:
+                by_month.setdefault(_month_of(day), []).append(day)
+            for month, selected_days in by_month.items():
+                if len(selected_days) == month_days[month]:
+                    # The whole month is in range, use its maintained totals
+                    buckets.append((month, monthly[month]))
+                else:
+                    buckets.extend((month, daily[day]) for day in selected_days)
+        else:
+            buckets.extend((day.isoformat(), daily[day]) for day in selected)
+
+        positions = [GROUP_BY_FIELDS.index(field) for field in group_by]
+        checks = [(GROUP_BY_FIELDS.index(field), value) for field, value in filters.items()]
+        rows = {}
+        for period, totals in buckets:
+            for key, (tokens, cost) in totals.items():
+                if any(key[index] != value for index, value in checks):
+                    continue
+                row_key = (period,) + tuple(key[index] for index in positions)
+                row = rows.get(row_key)
+                if row is None:
+                    rows[row_key] = [tokens, cost]
+                else:
+                    row[0] += tokens
+                    row[1] += cost
+
+        return [
+            dict(zip(('period',) + tuple(group_by), row_key), total_tokens=tokens, total_cost=cost)
+            for row_key, (tokens, cost) in sorted(rows.items(), key=lambda item: tuple('' if v is None else str(v) for v in item[0]))
+        ]
+
+    def invalidate(self, days=None):
+        """
+        Forces a refresh on the next query.
+
+        :param days: Only forget these days' signatures so just they are re-aggregated;
+                     rebuilds everything when omitted
+        """
+        with self._lock:
+            if days is None:
+                self._rebuilt_at = None
+            else:
+                for day in days:
+                    self._signatures.pop(_as_date(day), None)
+            self._checked_at = None
+
+    def _ensure_fresh(self):
+        if self._checked_at is None or time.monotonic() - self._checked_at >= self.check_interval:
+            # Once totals exist, queries arriving during a refresh get the current ones instead of waiting
+            if self._refresh_lock.acquire(blocking=self.refreshed_at is None):
+                try:
+                    if self._checked_at is None or time.monotonic() - self._checked_at >= self.check_interval:
+                        self._refresh()
+                finally:
+                    self._refresh_lock.release()
+
+    def _refresh(self):
+        db_connection = None
+        cursor = None
+        try:
+            db_connection = get_db_connection()
+            cursor = db_connection.cursor()
+            cursor.execute(DAY_SIGNATURE_QUERY)
+            signatures = {_as_date(row[0]): (row[1], row[2]) for row in cursor.fetchall()}
+
+            full = self._rebuilt_at is None or time.monotonic() - self._rebuilt_at >= self.full_refresh_interval
+            changed = sorted(day for day, signature in signatures.items() if self._signatures.get(day) != signature)
+            removed = [day for day in self._daily if day not in signatures]
+            if len(changed) > MAX_INCREMENTAL_DAYS:
+                full = True
+
+            if full:
+                daily = self._aggregate(cursor, None)
+            elif changed or removed:
+                daily = dict(self._daily)
+                for day in removed:
+                    daily.pop(day, None)
+                for day in changed:
+                    daily.pop(day, None)
+                daily.update(self._aggregate(cursor, changed))
+            else:
+                daily = None
+
+            if daily is not None:
+                monthly = {}
+                month_days = {}
+                for day, totals in daily.items():
+                    month_days[_month_of(day)] = month_days.get(_month_of(day), 0) + 1
+                    month_totals = monthly.setdefault(_month_of(day), {})
+                    for key, (tokens, cost) in totals.items():
+                        row = month_totals.get(key)
+                        if row is None:
+                            month_totals[key] = [tokens, cost]
+                        else:
+                            row[0] += tokens
+                            row[1] += cost
+                with self._lock:
+                    self._daily, self._monthly, self._days = daily, monthly, sorted(daily)
+                    self._month_days = month_days
+            self._signatures = signatures
+            if full:
+                self._rebuilt_at = time.monotonic()
+            self.refreshed_at = time.time()
+        except Exception as e:
+            if self.refreshed_at is None:
+                raise
+            print(f"Error refreshing cost rollups, serving totals from {self.refreshed_at}: {e}")
+        finally:
+            self._checked_at = time.monotonic()
+            if cursor:
+                cursor.close()
+            if db_connection:
+                db_connection.close()
+
+    def _aggregate(self, cursor, days):
+        if days is None:
+            cursor.execute(ROLLUP_QUERY.format(source_query=self.source_query, day_filter=''))
+        else:
+            day_filter = " AND CAST(cost.usage_date AS date) IN ({})".format(','.join(['?'] * len(days)))
+            cursor.execute(ROLLUP_QUERY.format(source_query=self.source_query, day_filter=day_filter), days)
+        daily = {}
+        for usage_day, client_name, model_id, model_name, tokens, cost in cursor.fetchall():
+            daily.setdefault(_as_date(usage_day), {})[(client_name, model_id, model_name)] = [tokens or 0, cost or 0]
+        return daily
@@ -1,7 +1,7 @@
 from flask_restx import Resource, fields, Namespace  # type: ignore # Use flask-restplus instead of flask-restx
 from flask import request
-from azure.identity import ManagedIdentityCredential
 from config import Config
+from token_broker import obo_broker
 
 
 databricks_ns = Namespace('databricks', description='Databricks Token Exchange Operations')
@@ -14,16 +14,14 @@ token_model = databricks_ns.model('TokenResponse', {
 class DatabricksTokenExchangeService:
     def __init__(self):
         """
-        Initializes the DatabricksTokenExchange with tenant ID and Databricks scope.
+        Initializes the DatabricksTokenExchange with the Databricks scope.
         """
-        self.tenant_id = Config.TENANT_ID
         self.databricks_scope = Config.DATABRICKS
-        self.url = f'https://login.microsoftonline.com/{self.tenant_id}/oauth2/v2.0/token'
-        self.credential = ManagedIdentityCredential()
 
     def exchange_token_on_behalf_of(self, user_token):
         """
         Exchanges the provided user token for a Databricks access token using the On-Behalf-Of (OBO) flow.
+        Tokens are cached by the shared OBO broker until shortly before they expire.
         
         Parameters:
         - user_token: str - The user token obtained from the request header to be exchanged.
@@ -32,31 +30,12 @@ class DatabricksTokenExchangeService:
         - str: The Databricks access token that can be used for API calls.
         """
         try:
-            # Retrieve a token for the Databricks API using the specified scope
-            access_token = self.credential.get_token(self.databricks_scope)
-            print("Access token retrieved for Databricks scope")
-
-            # Headers and data for the OBO token request
-            headers = {"Content-Type": "application/x-www-form-urlencoded"}
-            data = {
-                "client_id": self.credential.client_id,
-                "client_secret": self.credential.client_secret,
-                "grant_type": "urn:ietf:params:oauth:grant-type:jwt-bearer",
-                "assertion": user_token,
-                "requested_token_use": "on_behalf_of",
-                "scope": self.databricks_scope,
-            }
-
-            # Make the request to exchange the user token for a Databricks token
-            response = request.post(self.url, headers=headers, data=data)
-
-            # Check if the request was successful
-            if response.status_code == 200:
-                databricks_token = response.json().get("access_token")
-                print("Databricks token successfully retrieved")
-                return databricks_token
-            else:
-                raise Exception(f"Token exchange failed: {response.status_code}, {response.text}")
+            # The Authorization header carries a 'Bearer ' prefix that is not part of the assertion
+            if user_token.startswith('Bearer '):
+                user_token = user_token.split(' ', 1)[1]
+            databricks_token = obo_broker.get_token(user_token, self.databricks_scope)
+            print("Databricks token successfully retrieved")
+            return databricks_token
 
         except Exception as e:
             raise Exception(f"An error occurred during token exchange: {e}")
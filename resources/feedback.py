@@ -23,6 +23,8 @@ class FeedbackResource(Resource):
         """
         Handle creation of a new feedback record. Return the created record.
         """
+        db_connection = None
+        cursor = None
         try:
             # Parse incoming request data
             request_data = json.loads(request.data)
@@ -49,6 +51,11 @@ class FeedbackResource(Resource):
         except Exception as e:
             print(f"Error occurred while creating feedback: {e}")
             return {"message": "An error occurred", "error": str(e)}, 500
+        finally:
+            if cursor:
+                cursor.close()
+            if db_connection:
+                db_connection.close()
 
 # Add resource to the API
 api.add_resource(FeedbackResource, '/')
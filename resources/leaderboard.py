@@ -1,10 +1,16 @@
+import threading
+import time
 from collections import defaultdict
+from email.utils import formatdate
 from flask import request, jsonify
 from flask_restful import Resource
 from flask_jwt_extended import jwt_required
 from db import get_db_connection
 from flask_restx import Resource, Namespace, fields # type: ignore
 from middleware import token_required
+from resources.result_shaping import to_columns, to_records
+from config import Config
+from model_catalog import model_catalog
 
 # Create a namespace for the API
 api = Namespace('leaderboard', description='Leaderboard related operations')
@@ -40,85 +46,162 @@ leaderboard = api.model('Leaderboard', {
     "LB_RAI" : fields.List(fields.Nested(leaderboard_rai_model))
 })
 
+# Cheap change detector for the leaderboard sources, compared before rebuilding the snapshot:
+# the highest row_version (an index seek, see migrations/001_leaderboard_row_version.sql) catches
+# inserts and updates, and the row count from partition metadata catches deletes
+LEADERBOARD_WATERMARK_QUERY = '''SELECT
+                                (SELECT MAX(row_version) FROM dbr_report.model_requester_aggr),
+                                (SELECT SUM(rows) FROM sys.partitions
+                                 WHERE object_id = OBJECT_ID('dbr_report.model_requester_aggr') AND index_id IN (0, 1)),
+                                (SELECT MAX(row_version) FROM dbr_report.lb_latency),
+                                (SELECT SUM(rows) FROM sys.partitions
+                                 WHERE object_id = OBJECT_ID('dbr_report.lb_latency') AND index_id IN (0, 1))'''
+
+RAI_SCORES = [
+    'flesch_kincaid_grade', 'automated_readability_index', 'flesch_reading_ease', 'smog_index',
+    'coleman_liau_index', 'dale_chall_readability_score', 'gunning_fog_score', 'linsear_write_formula',
+    'toxicity', 'perplexity', 'relevance_score'
+]
+
+
+def build_leaderboard(cursor):
+    cursor.execute('''SELECT
+                        mra.model_id,
+                        m.model_name,
+                        SUM(mra.avg_flesch_kincaid_grade) AS flesch_kincaid_grade,
+                        SUM(mra.avg_automated_readability_index) AS automated_readability_index,
+                        SUM(mra.avg_flesch_reading_ease) AS flesch_reading_ease,
+                        SUM(mra.avg_smog_index) AS smog_index,
+                        SUM(mra.avg_coleman_liau_index) AS coleman_liau_index,
+                        SUM(mra.avg_dale_chall_readability_score) AS dale_chall_readability_score,
+                        SUM(mra.avg_gunning_fog_score) AS gunning_fog_score,
+                        SUM(mra.avg_linsear_write_formula) AS linsear_write_formula,
+                        SUM(mra.avg_toxicity) AS toxicity,
+                        SUM(mra.avg_perplexity) AS perplexity,
+                        SUM(mra.avg_relevance_score) AS relevance_score
+                    FROM
+                        dbr_report.model_requester_aggr mra
+                    JOIN
+                        base.models m
+                    ON
+                        mra.model_id = m.model_id
+                    GROUP BY
+                        mra.model_id, m.model_name''')
+    rai_data = to_columns(cursor.fetchall(), ['model_id', 'model_name'] + RAI_SCORES)
+    lb_rai_result = to_records(rai_data, ['model_name'] + RAI_SCORES, start_id=1)
+
+    # Fetch LB_Latency data
+    cursor.execute('SELECT lbl.model_id, lbl.tpot, lbl.ttft, lbl.throughput, m.model_name '
+                   'FROM dbr_report.lb_latency lbl JOIN base.models m ON lbl.model_id = m.model_id')
+    latency_data = to_columns(cursor.fetchall(), ['model_id', 'tpot', 'ttft', 'throughput', 'model_name'])
+    lb_latency_result = to_records(latency_data, ['model_name', 'tpot', 'ttft', 'throughput'], start_id=1)
+
+    # If both results are empty, return empty list
+    if not lb_rai_result and not lb_latency_result:
+        return []
+
+    return [{
+        "LB_latency": lb_latency_result,
+        "LB_RAI": lb_rai_result
+    }]
+
+
+class LeaderboardSnapshot:
+    """
+    Materialized leaderboard, shared by every request in the process.
+
+    At most every `check_interval` seconds a watermark (highest row_version and
+    row count of the source tables, plus the model catalog version) is read; the
+    aggregation is re-run only when the watermark moved. If the sources cannot be
+    read, the previous snapshot keeps being served. Until a first snapshot has been
+    built, every call builds it synchronously and raises if that fails.
+    """
+
+    def __init__(self, check_interval):
+        self.check_interval = check_interval
+        self._data = None
+        self._watermark = None
+        self._built_at = None
+        self._checked_at = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        """
+        :return: (leaderboard rows, unix time the snapshot was built)
+        :raises Exception: If no snapshot could be built yet
+        """
+        if self._is_due():
+            # Once a snapshot exists, requests arriving during a rebuild get the current one instead of waiting
+            if self._lock.acquire(blocking=self._data is None):
+                try:
+                    if self._is_due():
+                        self._refresh()
+                finally:
+                    self._lock.release()
+        return self._data, self._built_at
+
+    def _is_due(self):
+        return self._data is None or self._checked_at is None \
+            or time.monotonic() - self._checked_at >= self.check_interval
+
+    def invalidate(self):
+        with self._lock:
+            self._checked_at = None
+            self._watermark = None
+
+    def _refresh(self):
+        db_connection = None
+        cursor = None
+        try:
+            db_connection = get_db_connection()
+            cursor = db_connection.cursor()
+            cursor.execute(LEADERBOARD_WATERMARK_QUERY)
+            watermark = tuple(cursor.fetchone()) + (model_catalog.snapshot().version,)
+            if watermark != self._watermark or self._data is None:
+                self._data = build_leaderboard(cursor)
+                self._built_at = time.time()
+                self._watermark = watermark
+        except Exception as e:
+            if self._data is None:
+                raise
+            print(f"Error refreshing leaderboard, serving snapshot from {self._built_at}: {e}")
+        finally:
+            self._checked_at = time.monotonic()
+            if cursor:
+                cursor.close()
+            if db_connection:
+                db_connection.close()
+
+
+leaderboard_snapshot = LeaderboardSnapshot(check_interval=Config.LEADERBOARD_CHECK_INTERVAL)
+
+
 # Single endpoint to get data from either LB_Latency or LB_RAI with model name
 class LeaderboardResource(Resource):
     @api.doc('get_leaderboard')
     @api.marshal_with(leaderboard, as_list=True)
     @token_required
     def get(self):
+        """
+        Returns the leaderboard snapshot. The `Age` and `Last-Modified` headers tell how old it is.
+        Answers 503 while no snapshot could be built yet.
+        """
         try:
-            db_connection = get_db_connection()
-            cursor = db_connection.cursor()
-            cursor.execute('''SELECT
-                                mra.model_id,
-                                m.model_name,
-                                SUM(mra.avg_flesch_kincaid_grade) AS flesch_kincaid_grade,
-                                SUM(mra.avg_automated_readability_index) AS automated_readability_index,
-                                SUM(mra.avg_flesch_reading_ease) AS flesch_reading_ease,
-                                SUM(mra.avg_smog_index) AS smog_index,
-                                SUM(mra.avg_coleman_liau_index) AS coleman_liau_index,
-                                SUM(mra.avg_dale_chall_readability_score) AS dale_chall_readability_score,
-                                SUM(mra.avg_gunning_fog_score) AS gunning_fog_score,
-                                SUM(mra.avg_linsear_write_formula) AS linsear_write_formula,
-                                SUM(mra.avg_toxicity) AS toxicity,
-                                SUM(mra.avg_perplexity) AS perplexity,
-                                SUM(mra.avg_relevance_score) AS relevance_score
-                            FROM
-                                dbr_report.model_requester_aggr mra
-                            JOIN
-                                base.models m
-                            ON
-                                mra.model_id = m.model_id
-                            GROUP BY
-                                mra.model_id, m.model_name''')
-            rai_data = cursor.fetchall()
-            lb_rai_result = []
-            if rai_data:
-                for index, rai in enumerate(rai_data, start=1):
-                    lb_rai_result.append({
-                        'id': index,
-                        'model_name': rai[1],
-                        'flesch_kincaid_grade': rai[2],
-                        'automated_readability_index': rai[3],
-                        'flesch_reading_ease': rai[4],
-                        'smog_index': rai[5],
-                        'coleman_liau_index': rai[6],
-                        'dale_chall_readability_score': rai[7],
-                        'gunning_fog_score': rai[8],
-                        'linsear_write_formula': rai[9],
-                        'toxicity': rai[10],
-                        'perplexity': rai[11],
-                        'relevance_score': rai[12]
-                    })
-
-            # Fetch LB_Latency data
-            cursor.execute('SELECT lbl.*, m.model_name FROM dbr_report.lb_latency lbl JOIN base.models m ON lbl.model_id = m.model_id')
-            latency_data = cursor.fetchall()
-            lb_latency_result = []
-            if latency_data:
-                for index, latency in enumerate(latency_data, start=1):
-                    lb_latency_result.append({
-                        'id' : index,
-                        'model_name': latency[4],
-                        'tpot': latency[1],
-                        'ttft': latency[2],
-                        'throughput': latency[3]
-                    })
-            
-            # If both results are empty, return empty list
-            if not lb_rai_result and not lb_latency_result:
-                return [], 200
-            
-            result_data = [{
-                "LB_latency": lb_latency_result,
-                "LB_RAI": lb_rai_result
-            }]
-
-            return result_data, 200
+            result_data, built_at = leaderboard_snapshot.get()
         except Exception as e:
+            print(f"Error building leaderboard: {e}")
+            result_data, built_at = None, None
+        if built_at is None:
+            api.abort(503, "The leaderboard is not available yet, try again later")
+
+        try:
+            headers = {
+                'Age': str(int(time.time() - built_at)),
+                'Last-Modified': formatdate(built_at, usegmt=True),
+            }
+            return result_data, 200, headers
+        except Exception as e:
+            print(f"Error fetching leaderboard: {e}")
             return jsonify({"message": "An error occurred while fetching data"}), 500
-        finally:
-            cursor.close()
-            db_connection.close()
 
-api.add_resource(LeaderboardResource, '/')
+api.add_resource(LeaderboardResource, '/')
\ No newline at end of file
@@ -1,7 +1,9 @@
 from flask import request, jsonify, g
 from db import get_db_connection
+from authorization import get_authorization_context
 from flask_restx import Namespace, fields, Resource
 from middleware import token_required
+from config import Config
 
 # Define the Namespace for the llm_ops_dashboard
 api = Namespace('llm_ops_dashboard', description='LLM Operations Dashboard')
@@ -15,6 +17,61 @@ llm_ops_dashboard = api.model('LlmOpsDashboard', {
     'no_of_tokens': fields.String(description='Number of tokens', example='123')
 })
 
+llm_ops_dashboard_filter = api.model('LlmOpsDashboardFilter', {
+    'application_id': fields.String(description='Application ID (client_id); all visible applications when omitted'),
+    'model_id': fields.String(description='Model ID; all models when omitted')
+})
+
+llm_ops_dashboard_batch_request = api.model('LlmOpsDashboardBatchRequest', {
+    'filters': fields.List(fields.Nested(llm_ops_dashboard_filter), required=True)
+})
+
+llm_ops_dashboard_card = api.inherit('LlmOpsDashboardCard', llm_ops_dashboard, {
+    'application_id': fields.String(description='Application ID of the filter'),
+    'model_id': fields.String(description='Model ID of the filter')
+})
+
+
+def _format_card(total_tokens, total_users, total_requests, total_successful_responses, avg_execution_time):
+    # Handle None results by returning '0' where appropriate
+    return {
+        'avg_execution_time': str(avg_execution_time) if avg_execution_time is not None else '0',
+        'no_of_users': str(total_users) if total_users is not None else '0',
+        'total_no_of_requests': str(total_requests) if total_requests is not None else '0',
+        'no_of_successful_responses': str(total_successful_responses) if total_successful_responses is not None else '0',
+        'no_of_tokens': str(total_tokens) if total_tokens is not None else '0'
+    }
+
+
+def _sum(values):
+    values = [value for value in values if value is not None]
+    return sum(values) if values else None
+
+
+def _combine_groups(groups):
+    """
+    Folds (requester_id, model_id) groups into one card, matching the single-card
+    query: SUMs add up, users are the distinct requesters, and the average is
+    recomputed from the per-group sums and counts.
+    """
+    execution_time_sum = _sum(group[5] for group in groups)
+    execution_time_count = sum(group[6] for group in groups)
+    if execution_time_count:
+        # AVG over an integer column stays an integer in SQL Server
+        if isinstance(execution_time_sum, int):
+            avg_execution_time = execution_time_sum // execution_time_count
+        else:
+            avg_execution_time = execution_time_sum / execution_time_count
+    else:
+        avg_execution_time = None
+    return _format_card(
+        _sum(group[2] for group in groups),
+        len({group[0] for group in groups if group[0] is not None}),
+        _sum(group[3] for group in groups),
+        _sum(group[4] for group in groups),
+        avg_execution_time
+    )
+
 class LlmOpsDashboardResource(Resource):
     @api.doc('llm_ops_dashboard')  # Document endpoint for Swagger
     @api.expect(api.parser().add_argument('model_id', type=str, help='Model ID', required=False))  # Optional model_id parameter
@@ -25,58 +82,27 @@ class LlmOpsDashboardResource(Resource):
         """
         Retrieves LLM operations data. If model_id is provided, filters by model_id; otherwise, uses multiple client_ids.
         """
-        try:
-            # Retrieve user details from the token
-            token_details = g.decoded_token
-            user_email = token_details.get('preferred_username')
-
-            # Establish initial database connection to fetch client_ids based on user_email
-            db_connection = get_db_connection()
-            cursor = db_connection.cursor()
-
-            # Check if the user is an admin
-            admin_check_query = 'SELECT 1 FROM shared.admin_users WHERE email = ? and is_active = 1'
-            cursor.execute(admin_check_query, (user_email,))
-            is_admin = cursor.fetchone() is not None
-
-            # Query to fetch applications based on user role (admin or not)
-            if is_admin:
-                query = 'SELECT client_id, app_name FROM shared.application'
-                cursor.execute(query)
-            else:
-                # If the user is not an admin, filter by owner or app_user
-                query = 'SELECT client_id, app_name FROM shared.application WHERE owner = ? OR app_user = ?'
-                cursor.execute(query, (user_email.lower(), user_email.lower()))
-
-            applications = cursor.fetchall()
-
-            # Check if any application data is returned
-            if not applications:
-                return {"message": "No applications found for the user"}
-
-            # Extract all client_ids from the application data
-            client_ids = [app[0] for app in applications]
-        except Exception as e:
-            print(f"Error fetching application data: {e}")
-            return jsonify({"message": "An error occurred while fetching application data"}), 500
-
-        finally:
-            # Close cursor and initial connection
-            if cursor:
-                cursor.close()
-            if db_connection:
-                db_connection.close()
+        # Retrieve user details from the token
+        token_details = g.decoded_token
+        user_email = token_details.get('preferred_username')
 
         # Retrieve the optional model_id parameter from the query string
         model_id = request.args.get('model_id')
         client_id = request.args.get('application_id')
-        db_connection = None  # Reinitialize for the next query
+        db_connection = None
+        cursor = None
 
         try:
-            # Establish database connection for the main query
             db_connection = get_db_connection()
             cursor = db_connection.cursor()
 
+            # Fetch the client_ids visible to the user (all applications for admins)
+            client_ids = get_authorization_context(user_email, cursor)['client_ids']
+
+            # Check if any application data is returned
+            if not client_ids:
+                return {"message": "No applications found for the user"}
+
             # Base query to retrieve aggregated data from model usage aggregation table
             query = """
                 SELECT 
@@ -116,15 +142,9 @@ class LlmOpsDashboardResource(Resource):
             cursor.execute(query, parameters)
             result = cursor.fetchone()
 
-            # Prepare response data, handling None results by returning '0' where appropriate
+            # Prepare response data
             if result:
-                llm_ops_details = {
-                    'avg_execution_time': str(result[4]) if result and result[4] is not None else '0',
-                    'no_of_users': str(result[1]) if result and result[1] is not None else '0',
-                    'total_no_of_requests': str(result[2]) if result and result[2] is not None else '0',
-                    'no_of_successful_responses': str(result[3]) if result and result[3] is not None else '0',
-                    'no_of_tokens': str(result[0]) if result and result[0] is not None else '0'
-                }
+                llm_ops_details = _format_card(*result)
 
             # Return the response data with a 200 HTTP status code
             return llm_ops_details if llm_ops_details else [], 200
@@ -141,5 +161,111 @@ class LlmOpsDashboardResource(Resource):
             if db_connection:
                 db_connection.close()
 
+class LlmOpsDashboardBatchResource(Resource):
+    @api.doc('llm_ops_dashboard_batch')
+    @api.expect(llm_ops_dashboard_batch_request)
+    @api.response(200, 'Cards in the order of the filters', [llm_ops_dashboard_card])
+    @token_required
+    def post(self):
+        """
+        Retrieves the LLM operations cards for several (application_id, model_id) filters with one grouped query.
+        Each card counts the same requesters as the single card: the given application, every requester
+        of the given model, or the applications visible to the user when neither is given.
+        """
+        token_details = g.decoded_token
+        user_email = token_details.get('preferred_username')
+
+        filters = (request.get_json(silent=True) or {}).get('filters')
+        if not isinstance(filters, list) or not filters:
+            return {"message": "filters must be a non-empty list"}, 400
+        if len(filters) > Config.DASHBOARD_BATCH_MAX_FILTERS:
+            return {"message": f"At most {Config.DASHBOARD_BATCH_MAX_FILTERS} filters are allowed"}, 400
+        filters = [{'application_id': (item or {}).get('application_id') or None,
+                    'model_id': (item or {}).get('model_id') or None} for item in filters]
+
+        db_connection = None
+        cursor = None
+        try:
+            db_connection = get_db_connection()
+            cursor = db_connection.cursor()
+
+            context = get_authorization_context(user_email, cursor)
+            client_ids = context['client_ids']
+            if not client_ids:
+                return {"message": "No applications found for the user"}, 200
+
+            visible = set(client_ids)
+            forbidden = sorted({item['application_id'] for item in filters
+                                if item['application_id'] and item['application_id'] not in visible})
+            if forbidden:
+                return {"message": "Applications not visible to the user", "application_ids": forbidden}, 403
+
+            # One scan grouped by requester and model; every card is folded from these groups
+            query = """
+                SELECT
+                    requester_id,
+                    model_id,
+                    SUM(no_of_tokens) AS total_tokens,
+                    SUM(total_no_of_request) AS total_requests,
+                    SUM(successful_responses) AS total_successful_responses,
+                    SUM(avg_execution_time) AS execution_time_sum,
+                    COUNT(avg_execution_time) AS execution_time_count
+                FROM
+                    dbr_report.model_requester_aggr
+            """
+            parameters = []
+            conditions = []
+
+            # A filter with only a model counts every requester of it, so the scan can only be
+            # narrowed by requester when there is none. Admins see every application, so their
+            # visible applications are not listed in the query.
+            if not context['is_admin'] and all(item['application_id'] or not item['model_id'] for item in filters):
+                requester_ids = {item['application_id'] for item in filters if item['application_id']}
+                if not all(item['application_id'] for item in filters):
+                    requester_ids |= visible
+                requester_ids = sorted(requester_ids)
+                conditions.append("requester_id IN ({})".format(','.join(['?'] * len(requester_ids))))
+                parameters.extend(requester_ids)
+
+            if all(item['model_id'] for item in filters):
+                model_ids = sorted({item['model_id'] for item in filters})
+                conditions.append("model_id IN ({})".format(','.join(['?'] * len(model_ids))))
+                parameters.extend(model_ids)
+
+            if conditions:
+                query += " WHERE " + " AND ".join(conditions)
+            query += " GROUP BY requester_id, model_id"
+
+            cursor.execute(query, parameters)
+            groups = cursor.fetchall()
+
+            cards = []
+            for item in filters:
+                if item['application_id']:
+                    matching = [group for group in groups if group[0] == item['application_id']]
+                elif item['model_id']:
+                    matching = groups
+                else:
+                    matching = [group for group in groups if group[0] in visible]
+                if item['model_id']:
+                    matching = [group for group in matching if group[1] == item['model_id']]
+                card = _combine_groups(matching)
+                card['application_id'] = item['application_id']
+                card['model_id'] = item['model_id']
+                cards.append(card)
+
+            return cards, 200
+
+        except Exception as e:
+            print(f"Error fetching LLM operations data: {e}")
+            return {"message": "An error occurred while fetching data"}, 500
+
+        finally:
+            if cursor:
+                cursor.close()
+            if db_connection:
+                db_connection.close()
+
 # Register the resource with the API namespace at the endpoint '/llm_ops_dashboard'
 api.add_resource(LlmOpsDashboardResource, '/')
+api.add_resource(LlmOpsDashboardBatchResource, '/batch')
@@ -1,10 +1,17 @@
+import base64
+import csv
+import io
 import json
-from flask import request
+import math
+from flask import request, Response, stream_with_context
 from flask_restful import Resource
 from db import get_db_connection
 from flask_restx import Resource, Namespace, fields
 from middleware import token_required
-from datetime import datetime
+from config import Config
+from resources.cost_rollup import CostRollupStore, GROUP_BY_FIELDS
+from datetime import date, datetime
+from decimal import Decimal
 
 api = Namespace('dbr_model_serving_cost', description='DBR Model Serving Cost Management')
 
@@ -17,6 +24,332 @@ dbr_model_serving_cost_model = api.model('DbrModelServingCost', {
     'total_cost': fields.Float(description='Total Cost Incurred', example=12.75),
 })
 
+cost_query_parser = api.parser()
+cost_query_parser.add_argument('startDate', type=str, location='args', help='Start date (YYYY-MM-DD)')
+cost_query_parser.add_argument('endDate', type=str, location='args', help='End date (YYYY-MM-DD)')
+cost_query_parser.add_argument('client_id', type=str, location='args', help='Client request ID')
+cost_query_parser.add_argument('limit', type=int, location='args', help='Page size; enables keyset pagination')
+cost_query_parser.add_argument('cursor', type=str, location='args', help='next_cursor of the previous page')
+cost_query_parser.add_argument('format', type=str, location='args', choices=('csv', 'ndjson'),
+                               help='Stream every matching record as CSV or NDJSON')
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+COST_RECORD_FIELDS = ['client_id', 'model_id', 'usage_date', 'total_tokens', 'total_cost', 'client_name', 'model_name']
+
+# Base query with joins to fetch client name and model name
+COST_QUERY = '''
+    SELECT DISTINCT
+        cost.client_request_id,
+        cost.model_id,
+        cost.usage_date, 
+        cost.total_tokens, 
+        cost.total_cost,
+        COALESCE(
+            CASE 
+                WHEN cost.client_request_id LIKE '%ul_custom_model%' THEN 'Custom Model'
+                WHEN cost.client_request_id LIKE '%ul_dbr_devloper%' THEN 'DBR Developer'
+            END,
+            user_grp.usr_grp_id,
+            app.app_name
+        ) AS client_name,
+        models.model_name AS model_name
+    FROM 
+        dbr_report.dbr_model_serving_cost AS cost
+    LEFT JOIN 
+        shared.application AS app ON cost.client_request_id = app.client_id
+    LEFT JOIN 
+        base.models AS models ON cost.model_id = models.model_id
+    LEFT JOIN 
+        shared.user_grp_map AS user_grp ON cost.client_request_id = user_grp.usr_id
+    WHERE 1=1
+'''
+
+# Page order: every selected column, so the order is total (COST_QUERY is a SELECT DISTINCT).
+# (column, position in a record)
+COST_KEYSET_COLUMNS = [
+    ('usage_date', 2), ('client_request_id', 0), ('model_id', 1), ('total_tokens', 3),
+    ('total_cost', 4), ('client_name', 5), ('model_name', 6),
+]
+
+cost_rollups = CostRollupStore(
+    COST_QUERY,
+    check_interval=Config.COST_ROLLUP_CHECK_INTERVAL,
+    full_refresh_interval=Config.COST_ROLLUP_FULL_REFRESH_INTERVAL,
+)
+
+rollup_query_parser = api.parser()
+rollup_query_parser.add_argument('startDate', type=str, location='args', help='Start date (YYYY-MM-DD)')
+rollup_query_parser.add_argument('endDate', type=str, location='args', help='End date (YYYY-MM-DD)')
+rollup_query_parser.add_argument('granularity', type=str, location='args', choices=('day', 'month'),
+                                 help='Bucket totals per day (default) or per month')
+rollup_query_parser.add_argument('group_by', type=str, location='args',
+                                 help='Comma-separated subset of client_name, model_id, model_name '
+                                      '(default client_name,model_id)')
+rollup_query_parser.add_argument('client_name', type=str, location='args', help='Only this client')
+rollup_query_parser.add_argument('model_id', type=str, location='args', help='Only this model')
+
+COST_RECORD_COLUMNS = ['client_request_id', 'model_id', 'usage_date', 'total_tokens', 'total_cost']
+INSERT_COST_QUERY = '''INSERT INTO dbr_report.dbr_model_serving_cost (client_request_id, model_id, usage_date, total_tokens, total_cost) VALUES (?, ?, ?, ?, ?)'''
+
+# Per-row errors beyond this are counted but not listed in the response
+MAX_REPORTED_ERRORS = 1000
+
+
+def parse_cost_records(body, content_type):
+    """
+    Parses a bulk body: a JSON array, or NDJSON (one JSON object per line).
+
+    :return: (records, errors) where records are (index, dict) and errors are (index, message)
+    :raises ValueError: If a JSON body is not an array
+    """
+    if 'ndjson' not in content_type and body.lstrip()[:1] == '[':
+        records = json.loads(body)
+        return list(enumerate(records)), []
+
+    records = []
+    errors = []
+    for index, line in enumerate(line for line in body.splitlines() if line.strip()):
+        try:
+            records.append((index, json.loads(line)))
+        except json.JSONDecodeError as e:
+            errors.append((index, f"Invalid JSON: {e}"))
+    return records, errors
+
+
+def _to_token_count(value):
+    """:raises ValueError: If the value is not a whole number"""
+    if isinstance(value, bool) or (isinstance(value, float) and not value.is_integer()):
+        raise ValueError(value)
+    return int(value)
+
+
+def _to_cost(value):
+    """:raises ValueError: If the value is not a finite number"""
+    if isinstance(value, bool):
+        raise ValueError(value)
+    cost = float(value)
+    if not math.isfinite(cost):
+        raise ValueError(value)
+    return cost
+
+
+def validate_cost_records(records):
+    """
+    Validates the records column by column with the rules of the single-record POST.
+    Dates are parsed once per distinct value, which a nightly batch repeats thousands of times.
+
+    :param records: List of (index, dict)
+    :return: (rows ready for INSERT_COST_QUERY with their indexes, errors as (index, message))
+    """
+    errors = {}
+    for index, record in records:
+        if not isinstance(record, dict):
+            errors[index] = "Record must be a JSON object."
+    records = [(index, record) for index, record in records if index not in errors]
+
+    columns = {field: [record.get(field) for _, record in records] for field in COST_RECORD_COLUMNS}
+    for field, values in columns.items():
+        for (index, _), value in zip(records, values):
+            if not value:
+                errors.setdefault(index, f"Missing required field: {field}")
+
+    dates = {}
+    for value in set(value for value in columns['usage_date'] if isinstance(value, str)):
+        try:
+            dates[value] = datetime.strptime(value, '%Y-%m-%d').date()
+        except ValueError:
+            pass
+    for (index, _), value in zip(records, columns['usage_date']):
+        if value and not (isinstance(value, str) and value in dates):
+            errors.setdefault(index, "Invalid date format. Use YYYY-MM-DD.")
+
+    for field, cast, message in (('total_tokens', _to_token_count, "total_tokens must be a whole number."),
+                                 ('total_cost', _to_cost, "total_cost must be a finite number.")):
+        values = columns[field]
+        for position, ((index, _), value) in enumerate(zip(records, values)):
+            if value and index not in errors:
+                try:
+                    values[position] = cast(value)
+                except (TypeError, ValueError):
+                    errors[index] = message
+
+    rows = [
+        (index, (client_request_id, model_id, dates[usage_date], total_tokens, total_cost))
+        for (index, _), client_request_id, model_id, usage_date, total_tokens, total_cost
+        in zip(records, *(columns[field] for field in COST_RECORD_COLUMNS))
+        if index not in errors
+    ]
+    return rows, sorted(errors.items())
+
+
+def insert_cost_rows(db_connection, rows):
+    """
+    Inserts the rows with fast_executemany, one transaction per Config.USAGE_COST_INGEST_BATCH_SIZE rows.
+    A failing batch is rolled back and retried row by row to find the offending records.
+
+    :param rows: List of (index, row tuple)
+    :return: (number of inserted rows, errors as (index, message))
+    """
+    inserted = 0
+    errors = []
+    cursor = db_connection.cursor()
+    try:
+        cursor.fast_executemany = True
+        for start in range(0, len(rows), Config.USAGE_COST_INGEST_BATCH_SIZE):
+            batch = rows[start:start + Config.USAGE_COST_INGEST_BATCH_SIZE]
+            try:
+                cursor.executemany(INSERT_COST_QUERY, [row for _, row in batch])
+                db_connection.commit()
+                inserted += len(batch)
+                continue
+            except Exception as e:
+                print(f"Bulk insert batch at row {start} failed, retrying row by row: {e}")
+                db_connection.rollback()
+            for index, row in batch:
+                try:
+                    cursor.execute(INSERT_COST_QUERY, row)
+                    db_connection.commit()
+                    inserted += 1
+                except Exception as e:
+                    db_connection.rollback()
+                    errors.append((index, str(e)))
+    finally:
+        cursor.close()
+    return inserted, errors
+
+
+def build_cost_query(start_date, end_date, client_id):
+    """
+    :return: (query, params) selecting the cost records matching the filters
+    """
+    query = COST_QUERY
+    params = []
+
+    # Apply filters if provided
+    if start_date and end_date:
+        query += " AND cost.usage_date BETWEEN ? AND ?"
+        params.extend([start_date, end_date])
+
+    if client_id:
+        query += " AND cost.client_request_id = ?"
+        params.append(client_id)
+
+    return query, params
+
+
+def format_cost_record(record):
+    return {
+        "client_id": record[0],
+        "model_id": record[1],
+        "usage_date": record[2],
+        "total_tokens": record[3],
+        "total_cost": format(float(record[4]), '.6f') if record[4] is not None else None,  # Rounding to 6 decimal places
+        "client_name": record[5],
+        "model_name": record[6]
+    }
+
+
+def _to_text(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def encode_cost_cursor(record):
+    """Opaque keyset cursor holding the COST_KEYSET_COLUMNS of the last record on a page."""
+    key = json.dumps([_to_text(record[position]) for _, position in COST_KEYSET_COLUMNS])
+    return base64.urlsafe_b64encode(key.encode('utf-8')).decode('ascii')
+
+
+def decode_cost_cursor(page_cursor):
+    """
+    :return: Values of COST_KEYSET_COLUMNS, in that order
+    :raises ValueError: If the cursor was not produced by encode_cost_cursor
+    """
+    try:
+        values = json.loads(base64.urlsafe_b64decode(page_cursor.encode('ascii')))
+        if not isinstance(values, list) or len(values) != len(COST_KEYSET_COLUMNS):
+            raise ValueError(values)
+        usage_date, total_cost = values[0], values[4]
+        values[0] = datetime.fromisoformat(usage_date) if usage_date is not None else None
+        values[4] = Decimal(total_cost) if isinstance(total_cost, str) else total_cost
+        return values
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {e}")
+
+
+def build_keyset_condition(after):
+    """
+    :param after: Decoded cursor values
+    :return: (condition, params) selecting the records that sort after `after` in COST_KEYSET_COLUMNS
+             order; NULLs sort first, as in SQL Server
+    """
+    alternatives = []
+    params = []
+    equal = []
+    equal_params = []
+    for (column, _), value in zip(COST_KEYSET_COLUMNS, after):
+        column = f"records.{column}"
+        if value is None:
+            greater, greater_params = f"{column} IS NOT NULL", []
+        else:
+            greater, greater_params = f"{column} > ?", [value]
+        alternatives.append("(" + " AND ".join(equal + [greater]) + ")")
+        params.extend(equal_params + greater_params)
+        if value is None:
+            equal.append(f"{column} IS NULL")
+        else:
+            equal.append(f"{column} = ?")
+            equal_params = equal_params + [value]
+    return "(" + " OR ".join(alternatives) + ")", params
+
+
+def export_cost_records(query, params, export_format):
+    """
+    Streams the matching cost records as CSV or NDJSON, Config.USAGE_COST_EXPORT_BATCH_SIZE rows
+    at a time, so memory stays flat no matter how large the date range is.
+    """
+    db_connection = None
+    cursor = None
+    try:
+        db_connection = get_db_connection()
+        cursor = db_connection.cursor()
+        cursor.execute(query, params)
+
+        if export_format == 'csv':
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(COST_RECORD_FIELDS)
+            yield buffer.getvalue()
+
+        while True:
+            records = cursor.fetchmany(Config.USAGE_COST_EXPORT_BATCH_SIZE)
+            if not records:
+                break
+            if export_format == 'csv':
+                buffer.seek(0)
+                buffer.truncate()
+                for record in records:
+                    row = format_cost_record(record)
+                    writer.writerow([_to_text(row[field]) for field in COST_RECORD_FIELDS])
+                yield buffer.getvalue()
+            else:
+                yield ''.join(json.dumps(format_cost_record(record), default=_to_text) + '\n' for record in records)
+    except Exception as e:
+        # Headers are already sent, so the error can only be logged and the stream cut short
+        print(f"Error occurred while exporting records: {e}")
+    finally:
+        if cursor:
+            cursor.close()
+        if db_connection:
+            db_connection.close()
+
+
 
 class ModelServingCostResource(Resource):
     @token_required
@@ -26,6 +359,8 @@ class ModelServingCostResource(Resource):
         """
         Create a new record in the model_serving_cost table.
         """
+        db_connection = None
+        cursor = None
         try:
             # Parse the incoming request data
             request_data = json.loads(request.data)
@@ -52,9 +387,9 @@ class ModelServingCostResource(Resource):
             cursor = db_connection.cursor()
 
             # Insert the new record into the database
-            query = '''INSERT INTO dbr_report.dbr_model_serving_cost (client_request_id, model_id, usage_date, total_tokens, total_cost) VALUES (?, ?, ?, ?, ?)'''
-            cursor.execute(query, (client_request_id, model_id, usage_date, total_tokens, total_cost))
+            cursor.execute(INSERT_COST_QUERY, (client_request_id, model_id, usage_date, total_tokens, total_cost))
             db_connection.commit()
+            cost_rollups.invalidate([usage_date])
 
             return {
                 "message": "Record created successfully",
@@ -68,15 +403,27 @@ class ModelServingCostResource(Resource):
         except Exception as e:
             print(f"Error occurred while creating record: {e}")
             return {"message": "An unexpected error occurred.", "error": str(e)}, 500
+        finally:
+            if cursor:
+                cursor.close()
+            if db_connection:
+                db_connection.close()
 
     @token_required
     @api.doc('get_dbr_model_serving_costs')
+    @api.expect(cost_query_parser)
     def get(self):
         """
         Fetch records from the dbr_report.dbr_model_serving_cost table with optional filters:
         - startDate and endDate (YYYY-MM-DD format)
         - client_id (optional).
+
+        Pass `limit` (and the returned `next_cursor` as `cursor`) to page through the records
+        ordered by usage_date, client_request_id, model_id and then the remaining columns, or
+        `format=csv|ndjson` to stream every matching record as a file.
         """
+        db_connection = None
+        cursor = None
         try:
             start_date = request.args.get('startDate')
             end_date = request.args.get('endDate')
@@ -92,78 +439,185 @@ class ModelServingCostResource(Resource):
                 except ValueError:
                     return {"message": "Invalid date format. Use YYYY-MM-DD."}, 400
 
+            query, params = build_cost_query(start_date, end_date, client_id)
+
+            export_format = request.args.get('format')
+            if export_format:
+                if export_format not in EXPORT_FORMATS:
+                    return {"message": f"Unsupported format. Use one of: {', '.join(EXPORT_FORMATS)}."}, 400
+                # The generator opens its own connection: it runs after this handler has returned
+                return Response(
+                    stream_with_context(export_cost_records(query, params, export_format)),
+                    mimetype=EXPORT_FORMATS[export_format],
+                    headers={'Content-Disposition': f'attachment; filename=llm_usage_cost.{export_format}'}
+                )
+
+            page_cursor = request.args.get('cursor')
+            limit = request.args.get('limit')
+            if page_cursor or limit:
+                try:
+                    limit = min(int(limit), Config.USAGE_COST_MAX_PAGE_SIZE) if limit else Config.USAGE_COST_PAGE_SIZE
+                    if limit < 1:
+                        raise ValueError(limit)
+                except ValueError:
+                    return {"message": "limit must be a positive integer."}, 400
+                # Wrapped so the keyset can use the computed columns (client_name)
+                query = f"SELECT * FROM ({query}) AS records"
+                if page_cursor:
+                    try:
+                        after = decode_cost_cursor(page_cursor)
+                    except ValueError:
+                        return {"message": "Invalid cursor."}, 400
+                    condition, condition_params = build_keyset_condition(after)
+                    query += " WHERE " + condition
+                    params.extend(condition_params)
+                # One extra row tells whether another page follows
+                query += " ORDER BY " + ", ".join(f"records.{column}" for column, _ in COST_KEYSET_COLUMNS) + \
+                         " OFFSET 0 ROWS FETCH NEXT ? ROWS ONLY"
+                params.append(limit + 1)
+
             db_connection = get_db_connection()
             if db_connection is None:
                 return {"message": "Failed to connect to the database."}, 500
             cursor = db_connection.cursor()
 
-            # Base query with joins to fetch client name and model name
-            query = '''
-                SELECT DISTINCT
-                    cost.client_request_id,
-                    cost.model_id,
-                    cost.usage_date, 
-                    cost.total_tokens, 
-                    cost.total_cost,
-                    COALESCE(
-                        CASE 
-                            WHEN cost.client_request_id LIKE '%ul_custom_model%' THEN 'Custom Model'
-                            WHEN cost.client_request_id LIKE '%ul_dbr_devloper%' THEN 'DBR Developer'
-                        END,
-                        user_grp.usr_grp_id,
-                        app.app_name
-                    ) AS client_name,
-                    models.model_name AS model_name
-                FROM 
-                    dbr_report.dbr_model_serving_cost AS cost
-                LEFT JOIN 
-                    shared.application AS app ON cost.client_request_id = app.client_id
-                LEFT JOIN 
-                    base.models AS models ON cost.model_id = models.model_id
-                LEFT JOIN 
-                    shared.user_grp_map AS user_grp ON cost.client_request_id = user_grp.usr_id
-                WHERE 1=1
-            '''
-            params = []
-
-            # Apply filters if provided
-            if start_date and end_date:
-                query += " AND cost.usage_date BETWEEN ? AND ?"
-                params.extend([start_date, end_date])
-
-            if client_id:
-                query += " AND cost.client_request_id = ?"
-                params.append(client_id)
-
             cursor.execute(query, params)
             records = cursor.fetchall()
 
+            response = {"message": "Records fetched successfully"}
+            if limit:
+                has_more = len(records) > limit
+                records = records[:limit]
+                response["next_cursor"] = encode_cost_cursor(records[-1]) if has_more else None
+
             # Format the results
-            results = [
-                {
-                    "client_id": record[0],
-                    "model_id": record[1],
-                    "usage_date": record[2],
-                    "total_tokens": record[3],
-                    "total_cost": format(round(float(record[4]), 6), '.6f') if record[4] is not None else None,  # Rounding to 6 decimal places
-                    "client_name": record[5],
-                    "model_name": record[6]
-                }
-                for record in records
-            ]
+            results = [format_cost_record(record) for record in records]
+            response["records"] = results if results else []
 
             # Return results
+            return response, 200
+
+        except ConnectionError:
+            return {"message": "Failed to connect to the database."}, 500
+        except Exception as e:
+            print(f"Error occurred while fetching records: {e}")
+            return {"message": "An unexpected error occurred.", "error": str(e)}, 500
+        finally:
+            if cursor:
+                cursor.close()
+            if db_connection:
+                db_connection.close()
+
+
+class ModelServingCostBulkResource(Resource):
+    @token_required
+    @api.doc('bulk_create_dbr_model_serving_cost',
+             description='Body: JSON array of cost records, or NDJSON (Content-Type: application/x-ndjson).')
+    @api.expect([dbr_model_serving_cost_model])
+    def post(self):
+        """
+        Create many records in the model_serving_cost table in one call.
+        Invalid records are skipped and reported by their position in the body.
+        """
+        db_connection = None
+        try:
+            try:
+                records, parse_errors = parse_cost_records(request.get_data(as_text=True), request.content_type or '')
+            except (json.JSONDecodeError, TypeError) as e:
+                return {"message": "Invalid JSON payload.", "error": str(e)}, 400
+            received = len(records) + len(parse_errors)
+            if not received:
+                return {"message": "No records provided."}, 400
+            if received > Config.USAGE_COST_INGEST_MAX_RECORDS:
+                return {"message": f"At most {Config.USAGE_COST_INGEST_MAX_RECORDS} records are allowed per call."}, 400
+
+            rows, validation_errors = validate_cost_records(records)
+            insert_errors = []
+            inserted = 0
+            if rows:
+                db_connection = get_db_connection()
+                if db_connection is None:
+                    return {"message": "Failed to connect to the database."}, 500
+                inserted, insert_errors = insert_cost_rows(db_connection, rows)
+                cost_rollups.invalidate({row[2] for _, row in rows})
+
+            errors = sorted(parse_errors + validation_errors + insert_errors)
+            response = {
+                "message": "Records created successfully" if not errors else "Some records could not be created",
+                "received": received,
+                "inserted": inserted,
+                "failed": len(errors),
+                "errors": [{"index": index, "message": message} for index, message in errors[:MAX_REPORTED_ERRORS]],
+            }
+            if len(errors) > MAX_REPORTED_ERRORS:
+                response["errors_truncated"] = True
+            if not inserted:
+                return response, 400
+            return response, 201 if not errors else 207
+
+        except ConnectionError:
+            return {"message": "Failed to connect to the database."}, 500
+        except Exception as e:
+            print(f"Error occurred while creating records: {e}")
+            return {"message": "An unexpected error occurred.", "error": str(e)}, 500
+        finally:
+            if db_connection:
+                db_connection.close()
+
+
+class CostRollupResource(Resource):
+    @token_required
+    @api.doc('get_dbr_model_serving_cost_rollups')
+    @api.expect(rollup_query_parser)
+    def get(self):
+        """
+        Daily or monthly token and cost totals grouped by client_name and/or model,
+        served from pre-aggregated rollups instead of the raw records.
+        """
+        try:
+            start_date = request.args.get('startDate')
+            end_date = request.args.get('endDate')
+            try:
+                start_date = datetime.strptime(start_date, '%Y-%m-%d').date() if start_date else None
+                end_date = datetime.strptime(end_date, '%Y-%m-%d').date() if end_date else None
+            except ValueError:
+                return {"message": "Invalid date format. Use YYYY-MM-DD."}, 400
+            if start_date and end_date and start_date > end_date:
+                return {"message": "startDate cannot be greater than endDate."}, 400
+
+            granularity = request.args.get('granularity', 'day')
+            if granularity not in ('day', 'month'):
+                return {"message": "granularity must be 'day' or 'month'."}, 400
+
+            group_by = [field.strip() for field in request.args.get('group_by', 'client_name,model_id').split(',')
+                        if field.strip()]
+            unknown = [field for field in group_by if field not in GROUP_BY_FIELDS]
+            if unknown:
+                return {"message": f"Unsupported group_by fields: {', '.join(unknown)}"}, 400
+
+            filters = {field: request.args.get(field) for field in ('client_name', 'model_id') if request.args.get(field)}
+
+            rows = cost_rollups.query(start_date, end_date, granularity, group_by, filters)
+            for row in rows:
+                row['total_cost'] = format(float(row['total_cost']), '.6f')
+                row['total_tokens'] = int(row['total_tokens'])
+
             return {
-                "message": "Records fetched successfully",
-                "records": results if results else []
+                "message": "Rollups fetched successfully",
+                "granularity": granularity,
+                "group_by": group_by,
+                "as_of": datetime.utcfromtimestamp(cost_rollups.refreshed_at).isoformat() + 'Z',
+                "rows": rows
             }, 200
 
         except ConnectionError:
             return {"message": "Failed to connect to the database."}, 500
         except Exception as e:
-            print(f"Error occurred while fetching records: {e}")
+            print(f"Error occurred while fetching rollups: {e}")
             return {"message": "An unexpected error occurred.", "error": str(e)}, 500
 
 
 # Add resource to the API
 api.add_resource(ModelServingCostResource, '/')
+api.add_resource(ModelServingCostBulkResource, '/bulk')
+api.add_resource(CostRollupResource, '/rollup')
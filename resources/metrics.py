@@ -4,6 +4,7 @@ from middleware import token_required
 from flask_jwt_extended import jwt_required
 from datetime import datetime, timedelta
 from flask import request
+from resources.result_shaping import to_columns, format_epoch_ms, group_indices, take
 
 
 api = Namespace('usage_metrics', description='Usage Metrics operations')
@@ -13,17 +14,112 @@ usage_metrics_response = api.model('Usage Metrics Response', {
     'model_name': fields.String(required = False, description='The name of the model'),
     'cpu_usage_percentage': fields.List(fields.Raw(), description='List of CPU usage metrics'),
     'mem_usage_percentage': fields.List(fields.Raw(), description='List of memory usage metrics'),
+    'bucket': fields.String(required=False, description='Bucket size when downsampled, e.g. 5m, 1h, 1d'),
+    'bucket_ms': fields.Integer(required=False, description='Bucket size in milliseconds when downsampled'),
 })
 
+# Supported downsampling buckets, in milliseconds
+BUCKETS = {
+    '1m': 60 * 1000,
+    '5m': 5 * 60 * 1000,
+    '15m': 15 * 60 * 1000,
+    '1h': 60 * 60 * 1000,
+    '6h': 6 * 60 * 60 * 1000,
+    '1d': 24 * 60 * 60 * 1000,
+}
+
+# Start of the bucket holding a sample. The timestamp is truncated to an integer first,
+# so non-integer timestamps still fall on a bucket boundary.
+BUCKET_START_SQL = 'CAST(timestamp AS BIGINT) / ? * ?'
+
+# Per (metric, served model, bucket) statistics computed in the database, so only
+# one row per bucket is transferred. PERCENTILE_CONT is only available as a window
+# function, hence the window aggregates plus DISTINCT instead of GROUP BY.
+DOWNSAMPLED_METRICS_QUERY = '''
+    WITH samples AS (
+        SELECT
+            metric_name,
+            served_model_id,
+            served_model_name,
+            endpoint_name,
+            workspace_id,
+            CAST(value AS float) AS value,
+            {bucket_start} AS bucket_start
+        FROM dbr_report.cpu_mem_usage_data
+        WHERE metric_name IN ('cpu_usage_percentage', 'mem_usage_percentage')
+          AND timestamp >= ?
+          {model_filter}
+    )
+    SELECT DISTINCT
+        metric_name,
+        served_model_id,
+        MAX(served_model_name) OVER (PARTITION BY metric_name, served_model_id, bucket_start) AS served_model_name,
+        MAX(endpoint_name) OVER (PARTITION BY metric_name, served_model_id, bucket_start) AS endpoint_name,
+        MAX(workspace_id) OVER (PARTITION BY metric_name, served_model_id, bucket_start) AS workspace_id,
+        bucket_start,
+        MIN(value) OVER (PARTITION BY metric_name, served_model_id, bucket_start) AS min_value,
+        AVG(value) OVER (PARTITION BY metric_name, served_model_id, bucket_start) AS avg_value,
+        MAX(value) OVER (PARTITION BY metric_name, served_model_id, bucket_start) AS max_value,
+        PERCENTILE_CONT(0.95) WITHIN GROUP (ORDER BY value)
+            OVER (PARTITION BY metric_name, served_model_id, bucket_start) AS p95_value,
+        COUNT(*) OVER (PARTITION BY metric_name, served_model_id, bucket_start) AS sample_count
+    FROM samples
+    ORDER BY metric_name, served_model_id, bucket_start
+'''
+
+METRIC_COLUMNS = ['metric_name', 'value', 'timestamp', 'endpoint_name', 'workspace_id', 'served_model_id',
+                  'served_model_name']
+DOWNSAMPLED_COLUMNS = ['metric_name', 'served_model_id', 'served_model_name', 'endpoint_name', 'workspace_id',
+                       'bucket_start', 'min_value', 'avg_value', 'max_value', 'p95_value', 'sample_count']
+
+
+def downsample_usage_metrics(cursor, bucket_ms, since_ms, model_id=None):
+    """
+    Reads CPU/memory usage downsampled to `bucket_ms` buckets.
+
+    :return: Dict metric_name -> list of per served model series. Each series holds the
+             model details plus parallel arrays `timestamp` (bucket start, epoch ms),
+             `min`, `avg`, `max`, `p95` and `count`.
+    """
+    query = DOWNSAMPLED_METRICS_QUERY.format(bucket_start=BUCKET_START_SQL,
+                                             model_filter='AND served_model_id = ?' if model_id else '')
+    parameters = [bucket_ms, bucket_ms, since_ms] + ([model_id] if model_id else [])
+    cursor.execute(query, parameters)
+    columns = to_columns(cursor.fetchall(), DOWNSAMPLED_COLUMNS)
+    series = {'cpu_usage_percentage': [], 'mem_usage_percentage': []}
+    # One series per metric and served model, buckets in time order
+    for (metric_name, served_model_id), positions in group_indices(
+            zip(columns['metric_name'], columns['served_model_id'])).items():
+        first = positions[0]
+        series.setdefault(metric_name, []).append({
+            'metric_name': metric_name,
+            'served_model_id': served_model_id,
+            'served_model_name': columns['served_model_name'][first],
+            'endpoint_name': columns['endpoint_name'][first],
+            'workspace_id': columns['workspace_id'][first],
+            'timestamp': take(columns['bucket_start'], positions),
+            'min': take(columns['min_value'], positions),
+            'avg': take(columns['avg_value'], positions),
+            'max': take(columns['max_value'], positions),
+            'p95': take(columns['p95_value'], positions),
+            'count': take(columns['sample_count'], positions),
+        })
+    return series
+
 class UsageMetricsResource(Resource):
     @api.doc('get_usage_metrics')
     @api.doc('get_application_model')
     # @api.doc(security='Bearer Auth')
     @api.marshal_with(usage_metrics_response)
-    @api.expect(api.parser().add_argument('model_id', type=str, help='The model_name', required=False))
+    @api.expect(api.parser().add_argument('model_id', type=str, help='The model_name', required=False)
+                .add_argument('bucket', type=str, required=False, choices=tuple(BUCKETS),
+                              help='Downsample into buckets with min/avg/max/p95 per served model'))
     @token_required  # Ensure that token authentication is applied
     def get(self):
         model_id = request.args.get('model_id')
+        bucket = request.args.get('bucket')
+        if bucket and bucket not in BUCKETS:
+            return {'message': f"Unsupported bucket. Use one of: {', '.join(BUCKETS)}"}, 400
         db_connection = None
         cursor = None
         try:
@@ -37,6 +133,16 @@ class UsageMetricsResource(Resource):
             # Convert the datetime object to a timestamp in milliseconds
             timestamp = int(date_object.timestamp() * 1000)
 
+            if bucket:
+                series = downsample_usage_metrics(cursor, BUCKETS[bucket], timestamp, model_id)
+                return {
+                    'model_id': model_id if model_id else 'All Models',
+                    'bucket': bucket,
+                    'bucket_ms': BUCKETS[bucket],
+                    'cpu_usage_percentage': series['cpu_usage_percentage'],
+                    'mem_usage_percentage': series['mem_usage_percentage']
+                }, 200
+
             # Prepare the SQL query based on whether model_name is provided
             if model_id:
                 query = '''
@@ -66,49 +172,29 @@ class UsageMetricsResource(Resource):
                 'cpu_usage_percentage': [],
                 'mem_usage_percentage': []
             }
-            cpu_values = []
-            cpu_timestamps = []
-            mem_values = []
-            mem_timestamps = []
+            columns = to_columns(metrics, METRIC_COLUMNS)
             if metrics:
-                for metric in metrics:
-                    metric_name, value, timestamp, endpoint_name, workspace_id, served_model_id, served_model_name = metric
-                    
-                    timestamp_seconds = timestamp / 1000
-                    # Convert the timestamp to a datetime object
-                    date_timestamp = datetime.fromtimestamp(timestamp_seconds)
-                    # Format the datetime object as a date string
-                    date_string = date_timestamp.strftime("%Y-%m-%d")
-
-                    if metric_name == 'cpu_usage_percentage':
-                        cpu_values.append(value)
-                        cpu_timestamps.append(date_string)
-                    elif metric_name == 'mem_usage_percentage':
-                        mem_values.append(value)
-                        mem_timestamps.append(date_string)
-
-            # Aggregate the response
-            if cpu_values:
-                response_data['cpu_usage_percentage'].append({
-                    'metric_name': 'cpu_usage_percentage',
-                    'value': cpu_values,
-                    'timestamp': cpu_timestamps,
-                    'endpoint_name': endpoint_name,
-                    'workspace_id': workspace_id,
-                    'served_model_id': served_model_id,
-                    'served_model_name': served_model_name
-                })
-
-            if mem_values:
-                response_data['mem_usage_percentage'].append({
-                    'metric_name': 'mem_usage_percentage',
-                    'value': mem_values,
-                    'timestamp': mem_timestamps,
-                    'endpoint_name': endpoint_name,
-                    'workspace_id': workspace_id,
-                    'served_model_id': served_model_id,
-                    'served_model_name': served_model_name
-                })
+                # Model details are reported from the last sample, for both metrics
+                last = metrics[-1]
+                details = {
+                    'endpoint_name': last[3],
+                    'workspace_id': last[4],
+                    'served_model_id': last[5],
+                    'served_model_name': last[6]
+                }
+                dates = format_epoch_ms(columns['timestamp'])
+                by_metric = group_indices(columns['metric_name'])
+
+                # Aggregate the response
+                for metric_name in ('cpu_usage_percentage', 'mem_usage_percentage'):
+                    positions = by_metric.get(metric_name)
+                    if positions:
+                        response_data[metric_name].append(dict(
+                            details,
+                            metric_name=metric_name,
+                            value=take(columns['value'], positions),
+                            timestamp=take(dates, positions)
+                        ))
 
             return response_data if response_data else [], 200  # Return the structured data with HTTP status 200
 
@@ -1,5 +1,7 @@
-from flask import jsonify, request
+from flask import g, jsonify, request
 from db import get_db_connection
+from authorization import get_authorization_context
+from model_catalog import model_catalog
 from flask_restx import fields, Namespace, Resource
 from middleware import token_required
 
@@ -75,38 +77,42 @@ class BaseModelsResource(Resource):
         """
         Retrieves all base models with ad group access information.
         """
-        db_connection = None
-        cursor = None
         try:
-            db_connection = get_db_connection()
-            cursor = db_connection.cursor()
-            query = '''
-                    SELECT model_id, model_name, adgroupformodelaccess_nonprod, adgroupformodelaccess_prod
-                    FROM base.models
-                    '''
-            cursor.execute(query)
-            models = cursor.fetchall()
-            
             models_data = []
-            for model in models:
+            for model in model_catalog.snapshot().models:
                 models_data.append({
-                    'model_id': model[0],
-                    'model_name': model[1],
-                    'non-prod':model[2],
-                    'prod':model[3]
+                    'model_id': model['model_id'],
+                    'model_name': model['model_name'],
+                    'non-prod': model['adgroupformodelaccess_nonprod'],
+                    'prod': model['adgroupformodelaccess_prod']
                 })
             
             return models_data, 200
         except Exception as e:
             print(f"Database connection failed: {e}")
             return {'message': 'Database connection failed'}, 500
-        finally:
-            if cursor:
-                cursor.close()
-            if db_connection:
-                db_connection.close()
+
+
+class ModelCatalogCacheResource(Resource):
+    @api.doc('invalidate_model_catalog')
+    @token_required
+    def delete(self):
+        """
+        Reloads the cached base.models catalog on next use, so model changes take effect immediately.
+        """
+        token_details = g.decoded_token
+        user_email = token_details['preferred_username'].lower()
+        try:
+            if not get_authorization_context(user_email)['is_admin']:
+                return {'message': 'Only admins can invalidate the model catalog'}, 403
+            model_catalog.invalidate()
+            return {'message': 'Model catalog invalidated', 'catalog': model_catalog.stats()}, 200
+        except Exception as e:
+            print(f"Error invalidating model catalog: {e}")
+            return {'message': 'Internal Server Error', 'details': str(e)}, 500
 
 
 # Register the ModelResource with the API
 api.add_resource(ModelResource, '/')
 api.add_resource(BaseModelsResource, '/base')
+api.add_resource(ModelCatalogCacheResource, '/base/cache')
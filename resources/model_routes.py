@@ -0,0 +1,193 @@
+import json
+import threading
+
+from cache import TTLCache
+from config import Config
+from model_catalog import model_catalog
+
+# Payload templates for the APIM model routes: (prompt, model_id, app_id) -> JSON body
+PAYLOAD_BUILDERS = {
+    'chat': lambda prompt, model_id, app_id: {
+        "messages": [{"role": "user", "content": prompt}],
+        "max_tokens": 256
+    },
+    'chat_o1': lambda prompt, model_id, app_id: {
+        "messages": [{"role": "user", "content": prompt}]
+    },
+    'chat_o3': lambda prompt, model_id, app_id: {
+        "messages": [{"role": "user", "content": prompt}],
+        "max_tokens": 128
+    },
+    'prompt_completion': lambda prompt, model_id, app_id: {
+        "prompt": f"{prompt}",
+        "max_tokens": 256
+    },
+    'completion': lambda prompt, model_id, app_id: {
+        "prompt": [prompt],
+        "max_tokens": 256
+    },
+    'embedding': lambda prompt, model_id, app_id: {
+        "input": prompt
+    },
+    'custom_query': lambda prompt, model_id, app_id: {
+        "client_request_id": app_id,
+        "dataframe_split": {
+            "columns": [
+                "prompt",
+                "temperature",
+                "max_tokens",
+                "model_id",
+                "query_context"
+            ],
+            "data": [
+                [
+                    prompt,
+                    0.7,
+                    256,
+                    model_id,
+                    ""
+                ]
+            ]
+        }
+    },
+}
+
+# Payloads APIM can stream back as OpenAI-style chat completion chunks
+STREAMING_PAYLOADS = {'chat', 'chat_o1', 'chat_o3'}
+
+# Ordered routing rules; the first rule whose substrings all occur in the
+# (lower-cased) provider / model name / model id wins. `path` is relative to
+# Config.APIM_URL. Keep the order: several rules overlap on purpose.
+DEFAULT_ROUTING_RULES = [
+    {'provider': 'openai', 'model_name': 'text-embedding', 'path': 'openai-embeddings/{model_id}', 'payload': 'embedding'},
+    {'provider': 'openai', 'model_name': 'text_embedding_3', 'path': 'openai-embeddings/{model_id}', 'payload': 'embedding'},
+    {'provider': 'openai', 'model_name': 'gpt_4_turbo', 'path': 'openai4/{model_id}', 'payload': 'chat'},
+    {'provider': 'openai', 'model_name': 'o3', 'path': 'o1/{model_id}', 'payload': 'chat_o3'},
+    {'provider': 'openai', 'model_name': 'gpt-3.5-turbo', 'model_id': 'completion', 'path': 'openai3/{model_id}', 'payload': 'prompt_completion'},
+    {'provider': 'openai', 'model_name': 'gpt-3.5-turbo', 'path': 'openai3/{model_id}', 'payload': 'chat'},
+    {'provider': 'openai', 'model_name': 'gpt-4', 'path': 'openai4/{model_id}', 'payload': 'chat'},
+    {'provider': 'openai', 'model_name': 'o1', 'path': 'o1/{model_id}', 'payload': 'chat_o1'},
+    {'provider': 'openai', 'model_name': 'deepseek', 'path': 'deepseek/{model_id}', 'payload': 'chat'},
+    {'provider': 'gemini', 'path': 'google-embeddings/{model_id}', 'payload': 'embedding'},
+    {'provider': 'google cloud vertex ai', 'model_name': 'text-embedding', 'path': 'google-embeddings/{model_id}', 'payload': 'embedding'},
+    {'provider': 'google cloud vertex ai', 'path': 'custom/custom-model', 'payload': 'custom_query'},
+    {'provider': 'dbrx', 'model_name': 'large-en', 'path': 'dbrx-embeddings/{model_id}', 'payload': 'embedding'},
+    {'provider': 'dbrx', 'path': 'custom/custom-model', 'payload': 'custom_query'},
+    {'provider': 'emb', 'path': 'dbrx-embeddings/{model_id}', 'payload': 'embedding'},
+    {'provider': 'completion', 'path': 'openai-embeddings/{model_id}', 'payload': 'completion'},
+    {'model_name': 'phi2', 'path': 'custom/custom-model', 'payload': 'custom_query'},
+    {'model_name': 'phi3', 'path': 'phi-model/{model_id}', 'payload': 'chat'},
+    {'model_name': 'codellama', 'path': 'codellama/{model_id}', 'payload': 'completion'},
+    {'provider': 'meta-llama', 'path': 'custom/custom-model', 'payload': 'custom_query'},
+    {'provider': 'databricks', 'path': 'custom/custom-model', 'payload': 'custom_query'},
+]
+
+
+def load_routing_config():
+    """
+    Reads the routing rules and per-model overrides.
+
+    Config.MODEL_ROUTES_FILE may point to a JSON file with optional keys
+    "rules" (replaces DEFAULT_ROUTING_RULES) and "models" (model_id -> {"path", "payload"}),
+    so new models can be routed without code changes.
+
+    :return: (rules, per-model overrides)
+    """
+    if not Config.MODEL_ROUTES_FILE:
+        return DEFAULT_ROUTING_RULES, {}
+    try:
+        with open(Config.MODEL_ROUTES_FILE) as routes_file:
+            routing = json.load(routes_file)
+        return routing.get('rules', DEFAULT_ROUTING_RULES), routing.get('models', {})
+    except Exception as e:
+        print(f"Error loading model routes from {Config.MODEL_ROUTES_FILE}: {e}")
+        return DEFAULT_ROUTING_RULES, {}
+
+
+def compile_route(model_id, model_name, model_provider, rules, overrides):
+    """
+    Resolves the APIM route for one model.
+
+    :return: Route dict (model_id, model_name, model_provider, url, payload, supports_streaming),
+             or None when no rule matches
+    """
+    spec = overrides.get(model_id)
+    if spec is None:
+        fields = {
+            'provider': (model_provider or '').lower(),
+            'model_name': (model_name or '').lower(),
+            'model_id': (model_id or '').lower(),
+        }
+        spec = next((rule for rule in rules
+                     if all(rule[field].lower() in value for field, value in fields.items() if rule.get(field))), None)
+    if spec is None or spec['payload'] not in PAYLOAD_BUILDERS:
+        return None
+    return {
+        'model_id': model_id,
+        'model_name': model_name,
+        'model_provider': model_provider or '',
+        'url': Config.APIM_URL + spec['path'].format(model_id=model_id),
+        'payload': spec['payload'],
+        # APIM passes OpenAI-style chat completions through with `stream: true`
+        'supports_streaming': "openai" in (model_provider or '').lower() and spec['payload'] in STREAMING_PAYLOADS,
+    }
+
+
+class ModelRouteTable:
+    """
+    Precompiled (model_id, model_name) -> route table built from the model catalog.
+
+    The table is rebuilt only when the catalog version changes, so resolving a
+    model is a dict lookup instead of a DB query plus a chain of substring tests.
+    Models missing from base.models are routed by their requested name alone
+    and cached separately.
+    """
+
+    def __init__(self, ttl):
+        self._routes = {}
+        self._version = None
+        self._lock = threading.Lock()
+        self._adhoc = TTLCache(ttl=ttl, max_size=256)
+
+    def resolve(self, model_id, model_name):
+        """
+        :param model_id: Requested model_id
+        :param model_name: Requested model_name
+        :return: Route dict, or None when the model cannot be routed
+        """
+        key = (model_id, model_name)
+        route = self._get_routes().get(key)
+        if route is not None:
+            return route
+
+        route = self._adhoc.get(key)
+        if route is None:
+            rules, overrides = load_routing_config()
+            route = compile_route(model_id, model_name, '', rules, overrides) or {}
+            self._adhoc.set(key, route)
+        return route or None
+
+    def invalidate(self):
+        with self._lock:
+            self._version = None
+        self._adhoc.invalidate()
+
+    def _get_routes(self):
+        snapshot = model_catalog.snapshot()
+        if snapshot.version != self._version:
+            with self._lock:
+                if snapshot.version != self._version:
+                    rules, overrides = load_routing_config()
+                    routes = {}
+                    for model in snapshot.models:
+                        route = compile_route(model['model_id'], model['model_name'], model['model_provider'],
+                                              rules, overrides)
+                        if route is not None:
+                            routes[(model['model_id'], model['model_name'])] = route
+                    self._routes = routes
+                    self._version = snapshot.version
+                    self._adhoc.invalidate()
+        return self._routes
+
+
+model_routes = ModelRouteTable(ttl=Config.MODEL_ROUTES_TTL)
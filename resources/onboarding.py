@@ -1,10 +1,12 @@
 from flask_restx import Resource, fields, Namespace
 from db import get_db_connection
+from authorization import get_authorization_context
 from middleware import token_required
 from flask import g, request
 import json , requests
 from datetime import datetime,timezone
 from config import Config
+from http_client import http
 
 api = Namespace('onboarding', description='Onboarding operations')
 
@@ -56,9 +58,7 @@ class OnboardingResource(Resource):
             cursor = db_connection.cursor()
 
             # Check if the user is an admin
-            admin_check_query = 'SELECT 1 FROM shared.admin_users WHERE email = ? and is_active = 1'
-            cursor.execute(admin_check_query, (user_email.lower(),))
-            is_admin = cursor.fetchone() is not None
+            is_admin = get_authorization_context(user_email, cursor)['is_admin']
 
             if is_admin:
                 query = 'SELECT * FROM base.onboarding_form'
@@ -203,8 +203,9 @@ class OnboardingResource(Resource):
 
                 if auth_header:
                     try:
-                        response = requests.post(
+                        response = http.post(
                             url,
+                            route='apim',
                             data = application_data,
                             headers={
                                 'Authorization': auth_header,
@@ -4,6 +4,8 @@ from flask import request, jsonify, g
 from flask_restx import Resource, Namespace, fields  # Corrected to only import Resource from flask_restx
 from flask_jwt_extended import jwt_required
 from db import get_db_connection
+from model_catalog import model_catalog
+from id_allocator import prompt_id_allocator
 from middleware import token_required
 
 api = Namespace('prompt', description='Prompt lib creation')
@@ -30,6 +32,8 @@ class PromptResource(Resource):
         """
         Create or update a prompt entry with versioning.
         """
+        db_connection = None
+        cursor = None
         try:
             # Parse the incoming request data
             request_data = json.loads(request.data)
@@ -49,16 +53,14 @@ class PromptResource(Resource):
 
             # Fetch app_name and model_name from their respective tables
             app_query = 'SELECT app_name FROM shared.application WHERE client_id = ?'
-            model_query = 'SELECT model_name FROM base.models WHERE model_id = ?'
-
             app_result = cursor.execute(app_query, (app_id,)).fetchone()
-            model_result = cursor.execute(model_query, (model_id,)).fetchone()
+            model_result = model_catalog.get(model_id)
 
             if not app_result or not model_result:
                 return {"message": "Invalid app_id or model_id. No data found."}, 404
 
             app_name = app_result[0]
-            model_name = model_result[0]
+            model_name = model_result['model_name']
 
             # Retrieve user details from the token
             token_details = g.decoded_token
@@ -67,23 +69,32 @@ class PromptResource(Resource):
             # Check for existing prompt ID
             prompt_id = request_data.get('prompt_id')
             if prompt_id:
-                cursor.execute('SELECT MAX(version) FROM base.prompt_lib WHERE prompt_id = ?', (prompt_id,))
-                version_result = cursor.fetchone()
-
-                if not version_result or version_result[0] is None:
-                    return {"message": "Prompt ID not found for update."}, 404
-
-                # Increment version and update the current flag
-                new_version = version_result[0] + 1
+                # Clearing the current flag returns the current version and locks its row until commit,
+                # so concurrent updates of the same prompt take turns instead of reusing a version
                 cursor.execute(
-                    'UPDATE base.prompt_lib SET is_current = 0 WHERE prompt_id = ? AND is_current = 1',
+                    'UPDATE base.prompt_lib SET is_current = 0 OUTPUT deleted.version '
+                    'WHERE prompt_id = ? AND is_current = 1',
                     (prompt_id,)
                 )
+                versions = [row[0] for row in cursor.fetchall() if row[0] is not None]
+                if not versions:
+                    # No row flagged as current: fall back to the prompt's highest version, locked the same way
+                    cursor.execute(
+                        'SELECT MAX(version) FROM base.prompt_lib WITH (UPDLOCK, HOLDLOCK) WHERE prompt_id = ?',
+                        (prompt_id,)
+                    )
+                    version_result = cursor.fetchone()
+                    if version_result and version_result[0] is not None:
+                        versions.append(version_result[0])
+
+                if not versions:
+                    return {"message": "Prompt ID not found for update."}, 404
+
+                # Increment version
+                new_version = max(versions) + 1
             else:
-                # Generate a new prompt_id and initialize the version
-                cursor.execute('SELECT MAX(CAST(prompt_id AS INTEGER)) FROM base.prompt_lib')
-                max_prompt_id = cursor.fetchone()[0]
-                prompt_id = max_prompt_id + 1 if max_prompt_id else 1
+                # Take a new prompt_id from the sequence-backed allocator and initialize the version
+                prompt_id = prompt_id_allocator.next_id()
                 new_version = 1
 
             # Insert the new or updated prompt entry
@@ -135,5 +146,11 @@ class PromptResource(Resource):
             print(f"Error occurred: {e}")
             return {"message": "An error occurred while processing the request."}, 500
 
+        finally:
+            if cursor:
+                cursor.close()
+            if db_connection:
+                db_connection.close()
+
 # Add resource to API
 api.add_resource(PromptResource, '/')
@@ -3,6 +3,8 @@ from flask import request, jsonify, g
 from flask_restful import Resource
 from flask_jwt_extended import jwt_required
 from db import get_db_connection
+from model_catalog import model_catalog
+from id_allocator import prompt_id_allocator
 from flask_restx import Resource, Namespace, fields  # type: ignore
 from middleware import token_required
 
@@ -27,6 +29,8 @@ class PromptCreateResource(Resource):
         """
         Handle the creation or update of a prompt entry. The prompt is associated with an application and model.
         """
+        db_connection = None
+        cursor = None
         try:
             # Parse the incoming JSON data
             request_data = json.loads(request.data)
@@ -41,11 +45,11 @@ class PromptCreateResource(Resource):
 
                 # SQL queries to fetch application name and model name based on IDs
                 app_query = 'SELECT app_name FROM shared.application WHERE client_id = ?'
-                model_query = 'SELECT model_name FROM base.models WHERE model_id = ?'
 
                 # Execute the queries and fetch the results
                 app_query_result = cursor.execute(app_query, (app_id,)).fetchall()
-                model_query_result = cursor.execute(model_query, (model_id,)).fetchall()
+                model = model_catalog.get(model_id)
+                model_query_result = [(model['model_name'],)] if model else []
 
                 # If no results are returned, raise an exception
                 if not app_query_result or not model_query_result:
@@ -66,12 +70,8 @@ class PromptCreateResource(Resource):
             token_details = g.decoded_token
             user_email = token_details['preferred_username']
 
-            # Get the current highest prompt_id from the database (assumes prompt_id is numeric)
-            cursor.execute('SELECT MAX(CAST(prompt_id AS INTEGER)) FROM base.prompt_lib')
-            result = cursor.fetchone()
-
-            # Determine the next prompt_id
-            new_prompt_id = result[0] + 1 if result[0] is not None else 1
+            # Take the next prompt_id from the sequence-backed allocator
+            new_prompt_id = prompt_id_allocator.next_id()
 
             # Get the current date for creation_date and last_modified_date
             current_date = datetime.date.today()
@@ -105,6 +105,12 @@ class PromptCreateResource(Resource):
         except Exception as e:
             # Catch all other exceptions and log the error
             print(f"Error occurred while inserting/updating prompt: {e}")
-            
+
+        finally:
+            if cursor:
+                cursor.close()
+            if db_connection:
+                db_connection.close()
+
 # Add resource to API
 api.add_resource(PromptCreateResource, '/')
\ No newline at end of file
@@ -8,6 +8,7 @@ from flask_restx import Resource, Namespace, fields  # type: ignore
 # keep these if you’ll switch to DB later; unused while USE_INMEMORY=True
 # from db import get_db_connection
 from middleware import token_required
+from resources.prompt_store import PromptRepository
 
 api = Namespace('prompt_lib', description='Prompt lib operations')
 
@@ -180,15 +181,12 @@ def _to_prompt_lib_row(p: dict, index: int) -> dict:
     }
 
 
-def _find_prompt(prompt_id: str):
-    return next((x for x in PROMPTS if x["prompt_id"] == prompt_id), None)
+# PROMPTS only seeds the store; reads and writes go through prompt_repository
+prompt_repository = PromptRepository(PROMPTS, _to_prompt_lib_row)
 
 
-def _next_version_no(prompt_id: str) -> int:
-    p = _find_prompt(prompt_id)
-    if not p:
-        return 1
-    return int(p["latest_version"]["version_no"]) + 1
+def _find_prompt(prompt_id: str):
+    return prompt_repository.get(prompt_id)
 
 
 # ============================= Swagger models =============================
@@ -245,14 +243,11 @@ class PromptLibResource(Resource):
 
         if USE_INMEMORY:
             try:
-                rows = []
                 if prompt_id:
-                    p = _find_prompt(prompt_id)
-                    if p:
-                        rows.append(_to_prompt_lib_row(p, 1))
+                    row = prompt_repository.row(prompt_id)
+                    rows = [dict(row, id=1)] if row else []
                 else:
-                    for i, p in enumerate(PROMPTS, start=1):
-                        rows.append(_to_prompt_lib_row(p, i))
+                    rows = prompt_repository.rows()
                 return rows, 200
             except Exception as e:
                 print(f"[INMEMORY] Error: {e}")
@@ -303,31 +298,31 @@ class PromptCreate(Resource):
 
         existing = _find_prompt(pid)
         if existing:
-            # create new version
-            new_ver_no = _next_version_no(pid)
-            new_ver_id = str(uuid.uuid4())
-            existing["title"] = title
-            existing["description"] = desc
-            existing["app_name"] = app_name
-            existing["updated_at"] = now_iso
-            existing["owner_user_id"] = owner_user_id
-            if "endpoint" not in existing:
-                existing["endpoint"] = {"ab": {"enabled": False, "arms": [{"model_name": llm_name}]}}
-            else:
-                ab = existing["endpoint"].setdefault("ab", {"enabled": False, "arms": []})
-                arms = ab.setdefault("arms", [])
-                if arms:
-                    arms[0]["model_name"] = llm_name
+            # create new version; the previous one stays in the prompt's history
+            def apply_changes(prompt):
+                prompt["title"] = title
+                prompt["description"] = desc
+                prompt["app_name"] = app_name
+                prompt["updated_at"] = now_iso
+                prompt["owner_user_id"] = owner_user_id
+                if "endpoint" not in prompt:
+                    prompt["endpoint"] = {"ab": {"enabled": False, "arms": [{"model_name": llm_name}]}}
                 else:
-                    arms.append({"model_name": llm_name})
+                    ab = prompt["endpoint"].setdefault("ab", {"enabled": False, "arms": []})
+                    arms = ab.setdefault("arms", [])
+                    if arms:
+                        arms[0]["model_name"] = llm_name
+                    else:
+                        arms.append({"model_name": llm_name})
 
-            existing["latest_version"] = {
-                "version_id": new_ver_id,
-                "version_no": new_ver_no,
+            version = {
+                "version_id": str(uuid.uuid4()),
                 "created_at": now_iso,
                 "created_by": owner_user_id
             }
-            return _to_prompt_lib_row(existing, 1), 201
+            # version_no is allocated by the store
+            prompt = prompt_repository.add_version(pid, apply_changes, version)
+            return dict(prompt_repository.version_row(prompt, is_current=True), id=1), 201
 
         # create brand new prompt
         new_ver_id = str(uuid.uuid4())
@@ -364,8 +359,8 @@ class PromptCreate(Resource):
             "governance": payload.get("governance", {}),
             "stats_30d": payload.get("stats_30d", {"runs": 0, "avg_latency_ms": 0, "total_cost": 0.0})
         }
-        PROMPTS.append(new_prompt)
-        return _to_prompt_lib_row(new_prompt, len(PROMPTS)), 201
+        prompt_repository.add(new_prompt)
+        return prompt_repository.row(pid), 201
 
 
 @api.route('/search')
@@ -381,9 +376,6 @@ class PromptSearch(Resource):
             return jsonify({"message": "DB mode not implemented here"}), 501
 
         key = payload['app_name'].lower()
-        items = []
-        for i, p in enumerate(PROMPTS, start=1):
-            if key and key not in p.get("app_name", "").lower():
-                continue
-            items.append(_to_prompt_lib_row(p, i))
-        return items, 200
+        if not key:
+            return prompt_repository.rows(), 200
+        return prompt_repository.rows(prompt_repository.ids_by_app_substring(key)), 200
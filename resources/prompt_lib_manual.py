@@ -1,13 +1,17 @@
 # prompt_lib.py
 from datetime import datetime, timedelta, date
+import base64
+import json
 import uuid
 
 from flask import request, jsonify
-from flask_restx import Resource, Namespace, fields  # type: ignore
+from flask_restx import Resource, Namespace, fields, marshal  # type: ignore
 
 # keep these if you’ll switch to DB later; unused while USE_INMEMORY=True
 # from db import get_db_connection
 from middleware import token_required
+from config import Config
+from resources.prompt_store import PromptRepository, PromptSearchIndex, FUZZY_SEARCH_FIELDS, SORT_KEYS
 
 api = Namespace('prompt_lib_manual', description='Prompt lib operations')
 
@@ -187,15 +191,32 @@ def _to_prompt_lib_row(p: dict, index: int) -> dict:
     }
 
 
+# PROMPTS only seeds the store; reads and writes go through prompt_repository
+prompt_repository = PromptRepository(PROMPTS, _to_prompt_lib_row,
+                                     keyframe_interval=Config.PROMPT_VERSION_KEYFRAME_INTERVAL,
+                                     version_cache_size=Config.PROMPT_VERSION_CACHE_SIZE)
+prompt_search_index = PromptSearchIndex(prompt_repository)
+
+
 def _find_prompt(prompt_id: str):
-    return next((x for x in PROMPTS if x["prompt_id"] == prompt_id), None)
+    return prompt_repository.get(prompt_id)
+
 
+def _encode_page_cursor(sort, order, after) -> str:
+    """Opaque cursor for the sort, order and position token of the last row on a page."""
+    return base64.urlsafe_b64encode(json.dumps([sort, order, after]).encode('utf-8')).decode('ascii')
 
-def _next_version_no(prompt_id: str) -> int:
-    p = _find_prompt(prompt_id)
-    if not p:
-        return 1
-    return int(p["latest_version"]["version_no"]) + 1
+
+def _decode_page_cursor(page_cursor: str):
+    """
+    :return: (sort, order, position token)
+    :raises ValueError: If the cursor was not produced by _encode_page_cursor
+    """
+    try:
+        sort, order, after = json.loads(base64.urlsafe_b64decode(page_cursor.encode('ascii')))
+        return sort, order, after
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {e}")
 
 
 # ============================= Swagger models =============================
@@ -239,38 +260,114 @@ SearchPromptRequest = api.model('SearchPrompt', {
     'app_name': fields.String(required=True, description='Search by application name'),
 })
 
+PromptLibPage = api.model('PromptLibPage', {
+    'prompts': fields.List(fields.Nested(PromptLibResponse)),
+    'next_cursor': fields.String(description='Pass as cursor to get the next page; null on the last page'),
+})
+
+prompt_lib_parser = api.parser()
+prompt_lib_parser.add_argument('prompt_id', type=str, required=False, help='prompt_id to fetch a specific prompt')
+prompt_lib_parser.add_argument('limit', type=int, required=False, help='Page size; enables cursor pagination')
+prompt_lib_parser.add_argument('cursor', type=str, required=False, help='next_cursor of the previous page')
+prompt_lib_parser.add_argument('sort', type=str, required=False, choices=list(SORT_KEYS),
+                               help='Sort by updated_at, title or total_version (library order by default)')
+prompt_lib_parser.add_argument('order', type=str, required=False, choices=['asc', 'desc'], help='Sort direction')
+prompt_lib_parser.add_argument('fields', type=str, required=False,
+                               help='Comma-separated response fields to return, e.g. prompt_id,title')
+
+prompt_versions_parser = api.parser()
+prompt_versions_parser.add_argument('prompt_id', type=str, required=True, help='Prompt to list the versions of')
+prompt_versions_parser.add_argument('version_no', type=int, required=False, help='Return only this version')
+
 QuickTermsRequest = api.model('QuickTerms', {
     'term': fields.String(required=True, description='Search term, e.g., "wellbeing"'),
     'in_fields': fields.List(fields.String, description='Fields to search among: tags, title, description, category, app_name',
                              example=['tags', 'title', 'description', 'category', 'app_name'])
 })
 
+FuzzySearchRequest = api.model('FuzzySearch', {
+    'query': fields.String(required=True, description='Search text, typos allowed', example='welbeing savngs'),
+    'threshold': fields.Float(description='Minimum similarity between 0 and 1', example=0.3),
+    'top_k': fields.Integer(description='Maximum number of results', example=20),
+    'in_fields': fields.List(fields.String, description='Fields to search among: tags, title, description',
+                             example=['tags', 'title', 'description'])
+})
+
+FuzzySearchResponse = api.inherit('FuzzySearchResult', PromptLibResponse, {
+    'score': fields.Float(description='Similarity to the query, 0..1', example=0.72),
+})
+
 # ============================= Resources =============================
 @api.route('/')
 class PromptLibResource(Resource):
     @api.doc('get_prompt_lib')
-    @api.expect(api.parser().add_argument('prompt_id', type=str, required=False,
-                                          help='prompt_id to fetch a specific prompt'))
-    @api.marshal_with(PromptLibResponse, as_list=True)
+    @api.expect(prompt_lib_parser)
+    @api.response(200, 'Prompts; a PromptLibPage when limit or cursor is given', [PromptLibResponse])
     @token_required
     def get(self):
-        """Return all prompts (or a specific one by prompt_id)."""
+        """
+        Return all prompts (or a specific one by prompt_id).
+
+        Pass `limit` (and the returned `next_cursor` as `cursor`) to page through the library,
+        `sort`/`order` to order it, and `fields` to return only some fields.
+        """
         prompt_id = request.args.get('prompt_id')
 
         if USE_INMEMORY:
             try:
-                rows = []
+                projection = PromptLibResponse
+                if request.args.get('fields'):
+                    names = [name.strip() for name in request.args['fields'].split(',') if name.strip()]
+                    unknown = [name for name in names if name not in PromptLibResponse]
+                    if unknown:
+                        return {"message": f"Unknown fields: {', '.join(unknown)}"}, 400
+                    projection = {name: PromptLibResponse[name] for name in names}
+
+                sort = request.args.get('sort')
+                order = request.args.get('order') or ('desc' if sort == 'updated_at' else 'asc')
+                if sort and sort not in SORT_KEYS:
+                    return {"message": f"sort must be one of: {', '.join(SORT_KEYS)}"}, 400
+                if order not in ('asc', 'desc'):
+                    return {"message": "order must be asc or desc"}, 400
+
                 if prompt_id:
-                    p = _find_prompt(prompt_id)
-                    if p:
-                        rows.append(_to_prompt_lib_row(p, 1))
-                else:
-                    for i, p in enumerate(PROMPTS, start=1):
-                        rows.append(_to_prompt_lib_row(p, i))
-                return rows, 200
+                    row = prompt_repository.row(prompt_id)
+                    return marshal([dict(row, id=1)] if row else [], projection), 200
+
+                page_cursor = request.args.get('cursor')
+                limit = request.args.get('limit')
+                if not page_cursor and not limit:
+                    if sort or order == 'desc':
+                        rows, _ = prompt_repository.page(sort, order == 'desc', limit=len(prompt_repository))
+                    else:
+                        rows = prompt_repository.rows()
+                    return marshal(rows, projection), 200
+
+                try:
+                    limit = min(int(limit), Config.PROMPT_LIB_MAX_PAGE_SIZE) if limit else Config.PROMPT_LIB_PAGE_SIZE
+                    if limit < 1:
+                        raise ValueError(limit)
+                except ValueError:
+                    return {"message": "limit must be a positive integer."}, 400
+                after = None
+                if page_cursor:
+                    try:
+                        # The cursor carries the ordering it was issued for
+                        sort, order, after = _decode_page_cursor(page_cursor)
+                        if (sort and sort not in SORT_KEYS) or order not in ('asc', 'desc') \
+                                or not isinstance(after, list) or len(after) != 2:
+                            raise ValueError(page_cursor)
+                    except ValueError:
+                        return {"message": "Invalid cursor."}, 400
+
+                rows, last = prompt_repository.page(sort, order == 'desc', after, limit)
+                return {
+                    "prompts": marshal(rows, projection),
+                    "next_cursor": _encode_page_cursor(sort, order, last) if last else None
+                }, 200
             except Exception as e:
                 print(f"[INMEMORY] Error: {e}")
-                return jsonify({"message": "An error occurred while fetching data"}), 500
+                return {"message": "An error occurred while fetching data"}, 500
 
         # ==== DB path (keep for later) ====
         # try:
@@ -294,6 +391,38 @@ class PromptLibResource(Resource):
         #     cur.close(); db.close()
 
 
+@api.route('/versions')
+class PromptVersions(Resource):
+    @api.doc('get_prompt_versions')
+    @api.expect(prompt_versions_parser)
+    @api.marshal_with(PromptLibResponse, as_list=True)
+    @token_required
+    def get(self):
+        """Return the known versions of a prompt, newest first (or a single one by version_no)."""
+        if not USE_INMEMORY:
+            return jsonify({"message": "DB mode not implemented here"}), 501
+
+        prompt_id = request.args.get('prompt_id')
+        current = _find_prompt(prompt_id)
+        if not current:
+            return {"message": "Prompt not found"}, 404
+        current_no = current["latest_version"]["version_no"]
+
+        version_no = request.args.get('version_no')
+        if version_no:
+            try:
+                version_no = int(version_no)
+            except ValueError:
+                return {"message": "version_no must be an integer"}, 400
+            prompt = prompt_repository.version(prompt_id, version_no)
+            if not prompt:
+                return {"message": "Version not found"}, 404
+            return [prompt_repository.version_row(prompt, version_no == current_no)], 200
+
+        return [prompt_repository.version_row(p, p["latest_version"]["version_no"] == current_no)
+                for p in reversed(prompt_repository.versions(prompt_id))], 200
+
+
 @api.route('/create')
 class PromptCreate(Resource):
     @api.doc('create_prompt')
@@ -317,33 +446,32 @@ class PromptCreate(Resource):
 
         existing = _find_prompt(pid)
         if existing:
-            # create new version
-            new_ver_no = _next_version_no(pid)
-            new_ver_id = str(uuid.uuid4())
-            existing["title"] = title
-            existing["description"] = desc
-            existing["app_name"] = app_name
-            existing["updated_at"] = now_iso
-            existing["owner_user_id"] = owner_user_id
-            if "endpoint" not in existing:
-                existing["endpoint"] = {"ab": {"enabled": False, "arms": [{"model_name": llm_name}]}}
-            else:
-                ab = existing["endpoint"].setdefault("ab", {"enabled": False, "arms": []})
-                arms = ab.setdefault("arms", [])
-                if arms:
-                    arms[0]["model_name"] = llm_name
+            # create new version; the previous one stays in the prompt's history
+            def apply_changes(prompt):
+                prompt["title"] = title
+                prompt["description"] = desc
+                prompt["app_name"] = app_name
+                prompt["updated_at"] = now_iso
+                prompt["owner_user_id"] = owner_user_id
+                if "endpoint" not in prompt:
+                    prompt["endpoint"] = {"ab": {"enabled": False, "arms": [{"model_name": llm_name}]}}
                 else:
-                    arms.append({"model_name": llm_name})
-
-            existing["latest_version"] = {
-                "version_id": new_ver_id,
-                "version_no": new_ver_no,
+                    ab = prompt["endpoint"].setdefault("ab", {"enabled": False, "arms": []})
+                    arms = ab.setdefault("arms", [])
+                    if arms:
+                        arms[0]["model_name"] = llm_name
+                    else:
+                        arms.append({"model_name": llm_name})
+
+            version = {
+                "version_id": str(uuid.uuid4()),
                 "created_at": now_iso,
                 "created_by": owner_user_id
             }
-            # maintain a rolling counter of how many versions ever existed
-            existing["total_versions"] = int(existing.get("total_versions", new_ver_no - 1)) + 1
-            return _to_prompt_lib_row(existing, 1), 201
+            # version_no and total_version (the rolling counter of how many versions ever existed)
+            # are allocated by the store
+            prompt = prompt_repository.add_version(pid, apply_changes, version)
+            return dict(prompt_repository.version_row(prompt, is_current=True), id=1), 201
 
         # create brand new prompt
         new_ver_id = str(uuid.uuid4())
@@ -365,7 +493,7 @@ class PromptCreate(Resource):
             "created_at": now_iso,
             "created_by": owner_user_id
         },
-        "total_versions": 1,   # <— seed this
+        "total_version": 1,
         "parameters": payload.get("parameters", []),
         "tags": payload.get("tags", []),
         "endpoint": {
@@ -382,7 +510,8 @@ class PromptCreate(Resource):
         "stats_30d": payload.get("stats_30d", {"runs": 0, "avg_latency_ms": 0, "total_cost": 0.0})
     }
 
-        return _to_prompt_lib_row(new_prompt, len(PROMPTS)), 201
+        prompt_repository.add(new_prompt)
+        return prompt_repository.row(pid), 201
 
 
 @api.route('/search')
@@ -398,44 +527,30 @@ class PromptSearch(Resource):
             return jsonify({"message": "DB mode not implemented here"}), 501
 
         key = payload['app_name'].lower()
-        items = []
-        for i, p in enumerate(PROMPTS, start=1):
-            if key and key not in p.get("app_name", "").lower():
-                continue
-            items.append(_to_prompt_lib_row(p, i))
-        return items, 200
+        if not key:
+            return prompt_repository.rows(), 200
+        return prompt_repository.rows(prompt_repository.ids_by_app_substring(key)), 200
     
 
 
     ######################## api for quick terms ############################################
     
 
-def _matches_quick_term(p: dict, term: str, in_fields: list[str]) -> bool:
+QUICK_TERM_FIELDS = ['tags', 'title', 'description', 'category', 'app_name']
+
+
+def _quick_term_ids(term: str, in_fields: list[str]) -> list[str]:
+    """prompt_ids matching the quick term, best ranked first."""
     t = (term or "").strip().lower()
     if not t:
-        return False
-    in_fields = [f.lower() for f in (in_fields or [])] or ['tags', 'title', 'description', 'category', 'app_name']
-
-    def contains(val: str) -> bool:
-        return t in (val or "").lower()
-
-    for f in in_fields:
-        if f == 'tags':
-            tags = p.get('tags', []) or []
-            if any(t in (tag or "").lower() for tag in tags):
-                return True
-        elif f == 'title' and contains(p.get('title', '')):
-            return True
-        elif f == 'description' and contains(p.get('description', '')):
-            return True
-        elif f == 'category':
-            # category is flattened to "General" in response, but source prompts may not have it; check tags/title as fallback
-            if contains('general'):
-                return True
-        elif f == 'app_name' and contains(p.get('app_name', '')):
-            return True
-        # extend later with other fields if you like
-    return False
+        return []
+    in_fields = [f.lower() for f in (in_fields or [])] or QUICK_TERM_FIELDS
+    matches = [pid for pid, _ in prompt_search_index.search(t, fields=in_fields)]
+    if 'category' in in_fields and t in 'general':
+        # category is flattened to "General" in response, so every prompt matches
+        ranked = set(matches)
+        matches += [pid for pid in prompt_repository.ids() if pid not in ranked]
+    return matches
 
 @api.route('/quick-terms')
 class PromptQuickTerms(Resource):
@@ -444,7 +559,7 @@ class PromptQuickTerms(Resource):
     @api.marshal_with(PromptLibResponse, as_list=True)
     @token_required
     def post(self):
-        """Filter prompts by a quick term across tags/title/description/category/app_name (case-insensitive)."""
+        """Filter prompts by a quick term across tags/title/description/category/app_name (case-insensitive word prefixes, best matches first)."""
         payload = request.get_json(force=True) or {}
         if not USE_INMEMORY:
             return jsonify({"message": "DB mode not implemented here"}), 501
@@ -452,9 +567,28 @@ class PromptQuickTerms(Resource):
         term = payload['term']
         in_fields = payload.get('in_fields')  # optional
 
-        rows = []
-        for i, p in enumerate(PROMPTS, start=1):
-            if _matches_quick_term(p, term, in_fields):
-                rows.append(_to_prompt_lib_row(p, i))
-        return rows, 200
+        return [prompt_repository.row(pid) for pid in _quick_term_ids(term, in_fields)], 200
+
+
+@api.route('/fuzzy-search')
+class PromptFuzzySearch(Resource):
+    @api.doc('fuzzy_search_prompts')
+    @api.expect(FuzzySearchRequest, validate=True)
+    @api.marshal_with(FuzzySearchResponse, as_list=True)
+    @token_required
+    def post(self):
+        """Typo-tolerant search over title/description/tags, most similar first."""
+        payload = request.get_json(force=True) or {}
+        if not USE_INMEMORY:
+            return jsonify({"message": "DB mode not implemented here"}), 501
+
+        threshold = payload.get('threshold')
+        threshold = Config.PROMPT_FUZZY_THRESHOLD if threshold is None else threshold
+        top_k = payload.get('top_k') or Config.PROMPT_FUZZY_TOP_K
+        if not 0 <= threshold <= 1 or top_k < 1:
+            return {"message": "threshold must be between 0 and 1 and top_k positive"}, 400
+        in_fields = [f.lower() for f in (payload.get('in_fields') or [])] or FUZZY_SEARCH_FIELDS
 
+        results = prompt_search_index.fuzzy_search(payload['query'], threshold,
+                                                   min(top_k, Config.PROMPT_FUZZY_MAX_TOP_K), fields=in_fields)
+        return [dict(prompt_repository.row(pid), score=round(score, 4)) for pid, score in results], 200
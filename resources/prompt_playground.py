@@ -1,95 +1,289 @@
 from flask_restx import Resource, fields, Namespace  # type: ignore # Use flask-restplus instead of flask-restx
-from db import get_db_connection
 from middleware import token_required
-from flask import g, request
-import requests, json, time
+from flask import g, request, Response, stream_with_context
+import requests, json, time, queue, threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
 from config import Config
-from azure.identity import DefaultAzureCredential
-from azure.keyvault.secrets import SecretClient
+from http_client import http
+from token_broker import obo_broker, TokenExchangeError
 from resources.response_format import convert_to_valid_json_string , transform_data
+from resources.model_routes import model_routes, PAYLOAD_BUILDERS
+from model_catalog import model_catalog
 
 api = Namespace('Playground', description='Playground operations')
 
-def get_model_data(model_id, model_name):
-    db_connection = get_db_connection()
-    cursor = db_connection.cursor()
-    if model_id and model_name:
-        # Query for fetching model details if the model is provided
-        query = '''
-            SELECT model_id, model_name, model_provider 
-            FROM base.models 
-            WHERE model_id = ? and model_name = ?
-        '''
-        cursor.execute(query, model_id, model_name)
-        results = cursor.fetchall()
-
-    return [{
-        'model_id': row[0],
-        'model_name': row[1],
-        'model_provider': row[2],
-    } for row in results]  
-
-def get_client_secret():
-    
-    key_vault_rg=Config.key_vault_rg
-    key_vault_secret=Config.key_vault_secret
-    KEY_VAULT_URL = f"https://{key_vault_rg}.vault.azure.net"
-    secret_name = f"{key_vault_secret}"
-
-    credential = DefaultAzureCredential()
-    # Use the correct secret client initialization
-    secret_client = SecretClient(vault_url=KEY_VAULT_URL, credential=credential)
-    
-    # Fetch the secret using get_secret method
+def build_model_request(item, app_id):
+    """
+    Resolves the APIM route and JSON payload for one playground entry.
+
+    :param item: Entry from the playground request body (model_id, model_name, prompt)
+    :param app_id: Audience of the caller's token, forwarded as client_request_id
+    :return: Dict with model_id, model_name, model_provider, url and payload,
+             or None when the model provider is not supported
+    """
+    route = model_routes.resolve(item['model_id'], item['model_name'])
+    if route is None:
+        return None
+    model_request = dict(route)
+    model_request['payload'] = PAYLOAD_BUILDERS[route['payload']](item['prompt'], route['model_id'], app_id)
+    return model_request
+
+
+def call_model(model_request, headers):
+    """
+    Sends one model request to APIM and shapes the per-model result entry.
+    Runs on the playground worker pool, so it must not touch the Flask request context.
+
+    :param model_request: Output of build_model_request
+    :param headers: APIM headers (bearer token and subscription key)
+    :return: Result entry for the model
+    :raises requests.exceptions.HTTPError: For upstream errors other than 400/403
+    """
+    model_name = model_request['model_name']
+    url = model_request['url']
+    start_time = time.time()
+    try:
+        response = http.post(url, route='apim_model', headers=headers, json=model_request['payload'])
+        latency = time.time() - start_time
+        if response.text and response.text.endswith('2198766\",\"type\":null}}}') and model_request['model_provider'].lower() == "azure openai" and response.status_code == 400:
+            valid_response = convert_to_valid_json_string(response.text)
+            converted_response = transform_data(valid_response)
+            converted_response_json = json.loads(converted_response)
+            return {
+                "message": "Model response received",
+                "model": model_name,
+                "response_data": converted_response_json,
+                "latency": latency
+            }
+        response.raise_for_status()  # Raises an error for bad responses
+        response_data = response.json()
+        if url.endswith("custom/custom-model"):
+            return {"message": "Model response received", "model": model_name, "response_data": response_data, "latency": latency}
+        return {
+            "message": "Model response received",
+            "response_data": response_data,
+            "latency": latency
+        }
+    except requests.exceptions.Timeout:
+        return _timeout_result(model_request)
+    except requests.exceptions.HTTPError as http_err:
+        result = _http_error_result(model_request, http_err)
+        if result is None:
+            raise
+        return result
+
+
+def _http_error_result(model_request, http_err):
+    # Permission and content-filter errors are reported per model; anything else is fatal
+    if '403' in str(http_err) or 'Forbidden' in str(http_err):
+        return {
+            "error_code":"PERMISSION_DENIED",
+            "message":"You do not have permission to query the endpoint",
+            "model_name": model_request['model_name'],
+            "model_id": model_request['model_id']
+        }
+    elif '400' in str(http_err) or 'Forbidden' in str(http_err):
+        return {
+            "error_code":"Bad Request",
+            "status_code": 400,
+            "message":"The response was filtered due to the prompt triggering content management policy. Please modify your prompt and retry.",
+            "model_name": model_request['model_name'],
+            "model_id": model_request['model_id']
+        }
+    return None
+
+
+def _timeout_result(model_request):
+    return {
+        "error_code": "TIMEOUT",
+        "status_code": 504,
+        "message": "The model did not respond in time. Please retry.",
+        "model_name": model_request['model_name'],
+        "model_id": model_request['model_id']
+    }
+
+
+# Shared, bounded pool for outbound model calls; caps concurrent APIM requests per worker process
+model_executor = ThreadPoolExecutor(max_workers=Config.PLAYGROUND_MAX_WORKERS, thread_name_prefix='playground')
+
+
+def run_model_requests(model_requests, headers):
+    """
+    Calls every model concurrently on the shared worker pool.
+
+    Results keep the input order. Models that have not answered before
+    Config.PLAYGROUND_REQUEST_TIMEOUT get a TIMEOUT entry and their queued calls
+    are cancelled. On a fatal upstream error the remaining calls are cancelled
+    and the error is re-raised.
+
+    :param model_requests: List of build_model_request outputs
+    :param headers: APIM headers
+    :return: List of result entries, one per model request
+    """
+    futures = [model_executor.submit(call_model, model_request, headers) for model_request in model_requests]
+    deadline = time.time() + Config.PLAYGROUND_REQUEST_TIMEOUT
+    result_data = []
     try:
-        retrieved_secret = secret_client.get_secret(secret_name)
-        return retrieved_secret.value
+        for model_request, future in zip(model_requests, futures):
+            try:
+                result_data.append(future.result(timeout=max(deadline - time.time(), 0)))
+            except FuturesTimeoutError:
+                future.cancel()
+                result_data.append(_timeout_result(model_request))
+    finally:
+        for future in futures:
+            future.cancel()
+    return result_data
+
+
+def _stream_chat_completion(index, model_request, headers, events, cancelled, start_time):
+    # Relays token deltas from an OpenAI-style SSE response as they arrive
+    payload = dict(model_request['payload'], stream=True)
+    response = http.post(model_request['url'], route='apim_model', headers=headers, json=payload, stream=True)
+    try:
+        response.raise_for_status()
+        ttft = None
+        parts = []
+        for line in response.iter_lines(decode_unicode=True):
+            if cancelled.is_set():
+                break
+            if not line or not line.startswith('data:'):
+                continue
+            data = line[len('data:'):].strip()
+            if data == '[DONE]':
+                break
+            choices = json.loads(data).get('choices') or []
+            delta = (choices[0].get('delta') or {}).get('content') if choices else None
+            if not delta:
+                continue
+            if ttft is None:
+                ttft = time.time() - start_time
+            parts.append(delta)
+            events.put(('chunk', {"index": index, "model_name": model_request['model_name'], "delta": delta}))
+        return {
+            "message": "Model response received",
+            "model": model_request['model_name'],
+            "response_data": {"content": ''.join(parts)},
+            "ttft": ttft,
+            "latency": time.time() - start_time
+        }
+    finally:
+        response.close()
+
+
+def stream_model(index, model_request, headers, events, cancelled):
+    """
+    Runs one model call on the worker pool and pushes its SSE events onto `events`.
+    Models that cannot stream report their whole response as the first token.
+    """
+    start_time = time.time()
+    try:
+        if model_request['supports_streaming']:
+            try:
+                result = _stream_chat_completion(index, model_request, headers, events, cancelled, start_time)
+            except requests.exceptions.Timeout:
+                result = _timeout_result(model_request)
+            except requests.exceptions.HTTPError as http_err:
+                result = _http_error_result(model_request, http_err)
+                if result is None:
+                    raise
+        else:
+            result = call_model(model_request, headers)
+            if 'latency' in result:
+                result['ttft'] = result['latency']
     except Exception as e:
-        print(f"Error retrieving secret: {e}")
-        return None
+        events.put(('error', {
+            "index": index,
+            "error": "Model request failed and url is not giving any data",
+            "details": str(e),
+            "model_name": model_request['model_name'],
+            "model_id": model_request['model_id']
+        }))
+        return
+    result['index'] = index
+    events.put(('result', result))
+
+
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+def stream_model_requests(model_requests, headers):
+    """
+    Generator of Server-Sent Events for a playground run.
+
+    Emits `chunk` events with token deltas for streaming-capable models, one
+    `result` (or `error`) event per model as soon as it finishes, with `ttft`
+    and `latency`, and a final `done` event. `index` refers to the position of
+    the model in the request body.
+    """
+    events = queue.Queue()
+    cancelled = threading.Event()
+    started = time.time()
+    deadline = started + Config.PLAYGROUND_REQUEST_TIMEOUT
+    futures = [model_executor.submit(stream_model, index, model_request, headers, events, cancelled)
+               for index, model_request in enumerate(model_requests)]
+    pending = set(range(len(model_requests)))
+    try:
+        while pending:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            try:
+                event, data = events.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if event in ('result', 'error'):
+                pending.discard(data['index'])
+            yield _sse(event, data)
+        for index in sorted(pending):
+            yield _sse('result', dict(_timeout_result(model_requests[index]), index=index))
+        yield _sse('done', {"total_latency": time.time() - started})
+    finally:
+        # Also runs when the client disconnects mid-stream
+        cancelled.set()
+        for future in futures:
+            future.cancel()
+
+
+def _wants_stream():
+    if request.args.get('stream', '').lower() in ('true', '1'):
+        return True
+    return 'text/event-stream' in request.headers.get('Accept', '')
+
 
 class PlaygroundResource(Resource):
     @api.doc('get_playground')  # API documentation for this endpoint
     @token_required
     def get(self):
-        db_connection = None
-        cursor = None  # Initialize cursor to None
         try:
-            # Connect to the database
-            db_connection = get_db_connection()
-            cursor = db_connection.cursor()
             remove_model_name = ['codellama_13b_python_hf', 'llamaguard_7b']
-            query = '''
-                SELECT DISTINCT model_id, model_name 
-                FROM base.models 
-                WHERE active = ? 
-                AND model_type != ? 
-                AND model_name NOT IN ({})
-            '''.format(','.join(['?'] * len(remove_model_name)))
-            # Execute the query
-            cursor.execute(query, ('true', 'Embedding') + tuple(remove_model_name))
-            models = cursor.fetchall()
-            
-            # Prepare data for response
             models_data = []
-            for model in models:
+            seen = set()
+            for model in model_catalog.snapshot().active_models():
+                # model_type != 'Embedding' in SQL also drops rows without a model_type
+                if not model['model_type'] or model['model_type'].lower() == 'embedding':
+                    continue
+                if model['model_name'] in remove_model_name:
+                    continue
+                key = (model['model_id'], model['model_name'])
+                if key in seen:
+                    continue
+                seen.add(key)
                 models_data.append({
-                    'model_id': model[0],
-                    'model_name': model[1],
+                    'model_id': model['model_id'],
+                    'model_name': model['model_name'],
                 })
 
             return models_data, 200
         except Exception as e:
             print(f"Database connection failed: {e}")
             return {'message': 'Database connection failed'}, 500
-        finally:
-            if cursor:  # Only close the cursor if it was successfully created
-                cursor.close()
-            if db_connection:  # Only close the connection if it was successfully created
-                db_connection.close()
     
               
     @api.doc('playground_createion ')  # Documentation for the POST method
+    @api.expect(api.parser().add_argument('stream', type=str, required=False, location='args',
+                                          help='true to receive Server-Sent Events per model as responses arrive'))
     @token_required
     def post(self):
         auth_header = request.headers.get('Authorization')
@@ -97,268 +291,36 @@ class PlaygroundResource(Resource):
         token_details = g.decoded_token
         app_id = token_details.get('aud')
         
-        client_secret = get_client_secret()
-        if not client_secret:
-            print("Failed to retrieve client secret")
-            return None
-
-        request_data = {
-            "grant_type": "urn:ietf:params:oauth:grant-type:jwt-bearer",
-            "client_id": Config.CLIENT_ID,
-            "client_secret": client_secret, 
-            "assertion": user_token,
-            "scope": Config.APIM_SCOPE,
-            "requested_token_use": "on_behalf_of"
-        }
+        try:
+            token = obo_broker.get_token(user_token, Config.APIM_SCOPE)
+        except TokenExchangeError as e:
+            return {"message": "Failed to fetch access token", "error": e.text}, e.status_code
 
-        url = f"https://login.microsoftonline.com/{Config.TENANT_ID}/oauth2/v2.0/token"
-        headers = {
-            "Content-Type": "application/x-www-form-urlencoded",
-        }
-        response = requests.post(url, headers=headers, data=request_data)
-        
-        if response.status_code == 200:
-            print("Request successful!")
-            response_data = response.json()
-        else:
-            return {"message": "Failed to fetch access token", "error": response.text}, response.status_code
-        
         try:
-            token = response_data['access_token']
             prompt_data = json.loads(request.data)
             headers = {
                     'Authorization': f'Bearer {token}',
                     'Content-Type': 'application/json',
                     'Ocp-Apim-Subscription-Key': Config.Subscription_key
                 }
-            openai_baseurl = Config.APIM_URL+"openai-embeddings"
-            codellama_baseurl = Config.APIM_URL+"codellama"
-            llama_baseurl = Config.APIM_URL+"llama"
-            gemini_baseurl=Config.APIM_URL+"gemini"
-            custom_baseurl=Config.APIM_URL+"custom"
-            dbrx_baseurl=Config.APIM_URL+"dbrx_model"
-            dbrx_emb_baseurl=Config.APIM_URL+"dbrx-embeddings"
-            phi3_baseurl=Config.APIM_URL+"phi-model"
-            openai3_baseurl=Config.APIM_URL+"openai3"
-            openai4_baseurl=Config.APIM_URL+"openai4"
-            query_baseurl=Config.APIM_URL+"custom/custom-model"
-            google_emurl=Config.APIM_URL+"google-embeddings"
-            dbrx_baseurl_emb=Config.APIM_URL+"dbrx-embeddings"
-            o1_baseurl=Config.APIM_URL+"o1"
-            o3_baseurl=Config.APIM_URL+"o1"
-            deepseek_baseurl=Config.APIM_URL+"deepseek"
-            
-            result_data = []
+
+            model_requests = []
             for i in prompt_data:
-                model_data = get_model_data(i['model_id'], i['model_name'])
-                if model_data:
-                    model_id = model_data[0]['model_id']
-                    model_name= model_data[0]['model_name']
-                    model_identified = model_data[0]['model_provider']
-                else:
-                    model_id = i['model_id'],
-                    model_name = i['model_name']
-                prompt = i['prompt']
-                o1_basejson = {
-                    "messages": [{"role": "user", "content": prompt}]
-                }
-                o3_basejson = {
-                    "messages": [{"role": "user", "content": prompt}],
-                    "max_tokens": 128
-                }
-                 
-                openai_basejson = {
-                    "messages": [{"role": "user", "content": prompt}],
-                    "max_tokens": 256
-                }
-                completion_basejson = {
-                    "prompt": [prompt],
-                    "max_tokens": 256
-                }
-                codellama_basejson = {
-                    "prompt": [prompt],
-                    "max_tokens": 256
-                }
-                phi2_basejson = {
-                    "prompt": prompt,
-                    "max_tokens": 256
-                }
-                gemini_basejson = {
-                    "messages": [
-                        {
-                            "role": "user",
-                            "content": [[prompt]]
-                        }
-                    ],
-                    "max_tokens": 256
-                }
-                embedding = {
-                        "input": prompt
-                }
-                customemodel_basejson_meta_llama = {
-                    "dataframe_split": {
-                        "columns": [
-                            "prompt",
-                            "temperature",
-                            "max_tokens",
-                            "model_id",
-                            "query_context"
-                        ],
-                        "data": [
-                            [
-                                prompt,
-                                0.7,  
-                                256,  
-                                model_id,  
-                                ""  
-                            ]
-                        ]
-                    }
-                }
-                query_basejson = {
-                    "client_request_id":app_id,
-                    "dataframe_split": {
-                        "columns": [
-                            "prompt",
-                            "temperature",
-                            "max_tokens",
-                            "model_id",
-                            "query_context"
-                        ],
-                        "data": [
-                            [
-                                prompt,
-                                0.7,  
-                                256,  
-                                model_id,  
-                                "" 
-                            ]
-                        ]
-                    }
-                }
-                openai_35_basejson = {
-                    "prompt": f"{prompt}",
-                    "max_tokens": 256
-                }
-                if "openai" in model_identified.lower() and  "text-embedding" in model_name.lower():
-                        url = openai_baseurl +"/"+ model_id
-                        post_str = (url, embedding)
-                elif "openai" in model_identified.lower() and "text_embedding_3" in model_name.lower():
-                        url = openai_baseurl +"/"+ model_id
-                        post_str = (url, embedding)
-                elif "openai" in model_identified.lower() and  "gpt_4_turbo" in model_name.lower(): 
-                        url = openai4_baseurl +"/"+ model_id
-                        openai_basejson["messages"][0]["content"] = prompt
-                        post_str = (url, openai_basejson)
-                elif "openai" in model_identified.lower() and  "o3" in model_name.lower():
-                        url = o3_baseurl +"/"+ model_id
-                        o3_basejson["messages"][0]["content"] = prompt
-                        post_str = (url, o3_basejson) 
-                elif "openai" in model_identified.lower() and "gpt-3.5-turbo" in model_name.lower() and "completion" in model_id.lower():
-                        url = openai3_baseurl +"/"+ model_id
-                        openai_35_basejson["prompt"] = prompt
-                        post_str = (url, openai_35_basejson) 
-                elif "openai" in model_identified.lower() and  "gpt-3.5-turbo" in model_name.lower(): 
-                        url = openai3_baseurl +"/"+ model_id
-                        openai_basejson["messages"][0]["content"] = prompt
-                        post_str = (url, openai_basejson)
-                elif "openai" in model_identified.lower() and  "gpt-4" in model_name.lower():
-                        url = openai4_baseurl +"/"+ model_id
-                        openai_basejson["messages"][0]["content"] = prompt
-                        post_str = (url, openai_basejson)      
-                elif "openai" in model_identified.lower() and  "o1" in model_name.lower():
-                        url = o1_baseurl +"/"+ model_id
-                        o1_basejson["messages"][0]["content"] = prompt
-                        post_str = (url, o1_basejson) 
-                elif "openai" in model_identified.lower() and  "deepseek" in model_name.lower():
-                        url = deepseek_baseurl +"/"+ model_id
-                        openai_basejson["messages"][0]["content"] = prompt
-                        post_str = (url, openai_basejson)   
-                elif "gemini" in model_identified.lower() or "google cloud vertex ai" in model_identified.lower() and  "text-embedding" in model_name.lower():
-                        url = google_emurl +"/"+ model_id
-                        post_str = (url, embedding)  
-                elif "gemini" in model_identified.lower() or "google cloud vertex ai" in model_identified.lower():
-                    url = query_baseurl
-                    post_str = (url,query_basejson)
-                elif "dbrx" in model_identified.lower() and "large-en" in model_name.lower():
-                        url = dbrx_baseurl_emb +"/"+ model_id
-                        post_str = (url, embedding)        
-                elif "dbrx" in model_identified.lower():
-                        url = query_baseurl
-                        post_str = (url,query_basejson)   
-                        # customemodel_basejson_meta_llama["messages"][0]["content"] = text
-                        # post_str = (url, customemodel_basejson_meta_llama)
-                elif "emb" in model_identified.lower():
-                        url = dbrx_emb_baseurl +"/"+ model_id
-                        post_str = (url, embedding)    
-                elif "completion" in model_identified.lower():
-                        url = openai_baseurl +"/"+ model_id
-                        post_str = (url, completion_basejson)      
-                elif "phi2" in model_name.lower():
-                        url = query_baseurl
-                        post_str = (url,query_basejson)
-                elif "phi3" in model_name.lower():
-                        url = phi3_baseurl +"/"+ model_id
-                        post_str = (url,openai_basejson)
-                elif "codellama" in model_name.lower():
-                        url = codellama_baseurl +"/"+ model_id
-                        post_str = (url, codellama_basejson)           
-                elif "meta-llama" in model_identified.lower() or "databricks" in model_identified.lower():
-                        url = query_baseurl
-                        post_str = (url,query_basejson)   
-                else:
-                        return {"error": "Unsupported model provider"}, 400
-                print("url_generated====>",post_str[0])
-                print("json_generated===>",post_str[1])
-  
-            # Send the POST request
-                try:
-                    start_time = time.time()
-                    response = requests.post(post_str[0], headers=headers, json=post_str[1])
-                    if response.text and response.text.endswith('2198766\",\"type\":null}}}') and model_identified.lower() == "azure openai" and response.status_code == 400:
-                        valid_response = convert_to_valid_json_string(response.text)
-                        converted_response = transform_data(valid_response)
-                        converted_response_json = json.loads(converted_response)
-                        result_data.append({
-                        "message": "Model response received",
-                        "model": model_name,
-                        "response_data": converted_response_json
-                        })
-                    else:
-                        end_time = time.time()
-                        response.raise_for_status()  # Raises an error for bad responses
-                        response_data = response.json()
-                        latency = end_time - start_time               
-                        
-                        if not post_str[0].endswith("custom/custom-model"):
-                            result_data.append({
-                                    "message": "Model response received",
-                                    "response_data": response_data,
-                                    "latency": latency
-                                })
-                        if post_str[0].endswith("custom/custom-model"):
-                            result_data.append(
-                                { "message": "Model response received", "model": model_name, "response_data": response_data}
-                            )    
-                except requests.exceptions.HTTPError as http_err:
-                    if '403' in str(http_err) or 'Forbidden' in str(http_err):
-                        result_data.append({
-                            "error_code":"PERMISSION_DENIED",
-                            "message":"You do not have permission to query the endpoint",
-                            "model_name": model_name,
-                            "model_id": model_id
-                        })
-                    elif '400' in str(http_err) or 'Forbidden' in str(http_err):
-                        result_data.append({
-                            "error_code":"Bad Request",
-                            "status_code": 400,
-                            "message":"The response was filtered due to the prompt triggering content management policy. Please modify your prompt and retry.",
-                            "model_name": model_name,
-                            "model_id": model_id
-                        })
-                    else:
-                        return {"error": "Model request failed and url is not giving any data", "details": str(http_err), "response": response.text}, 500
-            return result_data
+                model_request = build_model_request(i, app_id)
+                if model_request is None:
+                    return {"error": "Unsupported model provider"}, 400
+                model_requests.append(model_request)
+
+            if _wants_stream():
+                return Response(stream_with_context(stream_model_requests(model_requests, headers)),
+                                mimetype='text/event-stream', headers={'Cache-Control': 'no-cache'})
+
+            # Send the POST requests concurrently
+            try:
+                return run_model_requests(model_requests, headers)
+            except requests.exceptions.HTTPError as http_err:
+                response_text = http_err.response.text if http_err.response is not None else ''
+                return {"error": "Model request failed and url is not giving any data", "details": str(http_err), "response": response_text}, 500
         except Exception as e:
                 return {"error": "An error occurred while making the model request", "details": str(e)}, 500
 
@@ -0,0 +1,390 @@
+import bisect
+import copy
+import heapq
+import re
+import threading
+
+from resources.prompt_versions import PromptVersionStore
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+SEARCH_FIELDS = ('title', 'description', 'tags', 'app_name')
+# Relative weight of a hit in each field when ranking search results
+SEARCH_FIELD_WEIGHTS = {'title': 3.0, 'tags': 2.0, 'app_name': 2.0, 'description': 1.0}
+# A hit on a longer token that only starts with the query term counts for this fraction of an exact hit
+PREFIX_MATCH_WEIGHT = 0.5
+FUZZY_SEARCH_FIELDS = ('title', 'description', 'tags')
+
+# Sort orders the library listing can be paged in; ties are broken by insertion order
+SORT_KEYS = {
+    'updated_at': lambda prompt: prompt.get("updated_at") or "",
+    'title': lambda prompt: _key(prompt.get("title")),
+    'total_version': lambda prompt: int(prompt.get("total_version") or 0),
+}
+
+
+def _key(value):
+    return (value or "").lower()
+
+
+def tokenize(text):
+    """Lowercased alphanumeric tokens of `text`."""
+    return _TOKEN_RE.findall(_key(text))
+
+
+def trigrams(token):
+    """Trigrams of a token padded like pg_trgm ("  word "), so short words and word starts still match."""
+    padded = f"  {token} "
+    return frozenset(padded[i:i + 3] for i in range(len(padded) - 2))
+
+
+class PromptRepository:
+    """
+    In-memory prompt store for the prompt library stub.
+
+    Prompts are indexed by prompt_id and, case-insensitively, by app_name,
+    owner_user_id and tag. Version history is kept in a copy-on-write
+    PromptVersionStore, and the library row of the current version is built once by
+    `row_builder` when the version is stored. Prompts are numbered in insertion
+    order; that number is the row "id". Sorted views for paging are rebuilt lazily
+    after writes.
+    """
+
+    def __init__(self, prompts, row_builder, keyframe_interval=20, version_cache_size=256):
+        self._row_builder = row_builder
+        self._lock = threading.RLock()
+        self._prompts = {}      # prompt_id -> current prompt dict (replaced, never mutated, on new versions)
+        self._positions = {}    # prompt_id -> 1-based insertion position
+        self._history = PromptVersionStore(keyframe_interval, version_cache_size)
+        self._rows = {}         # version_id of the current versions -> library row
+        self._order = []        # prompt_ids by position - 1
+        self._sorted = {}       # sort key name -> sorted [(key, position)], reset on writes
+        self._by_app = {}       # lower app_name -> {prompt_id}
+        self._by_owner = {}     # lower owner_user_id -> {prompt_id}
+        self._by_tag = {}       # lower tag -> {prompt_id}
+        self._listeners = []
+        for prompt in prompts:
+            self.add(prompt)
+
+    def __len__(self):
+        return len(self._prompts)
+
+    def __contains__(self, prompt_id):
+        return prompt_id in self._prompts
+
+    def get(self, prompt_id):
+        """:return: Current prompt dict, or None. Shared, treat as read-only."""
+        return self._prompts.get(prompt_id)
+
+    def position(self, prompt_id):
+        return self._positions.get(prompt_id)
+
+    def ids(self):
+        """:return: Every prompt_id in insertion order"""
+        return list(self._order)
+
+    def ids_by_app(self, app_name):
+        return set(self._by_app.get(_key(app_name), ()))
+
+    def ids_by_app_substring(self, text):
+        """prompt_ids whose app_name contains `text` (case-insensitive); scans distinct app names only."""
+        text = _key(text)
+        matches = set()
+        for app_name, prompt_ids in self._by_app.items():
+            if text in app_name:
+                matches |= prompt_ids
+        return matches
+
+    def ids_by_owner(self, owner_user_id):
+        return set(self._by_owner.get(_key(owner_user_id), ()))
+
+    def ids_by_tag(self, tag):
+        return set(self._by_tag.get(_key(tag), ()))
+
+    def next_version_no(self, prompt_id):
+        prompt = self._prompts.get(prompt_id)
+        if not prompt:
+            return 1
+        return int(prompt["latest_version"]["version_no"]) + 1
+
+    def version(self, prompt_id, version_no):
+        """:return: The prompt as of `version_no`, or None if that version is not known"""
+        prompt = self._prompts.get(prompt_id)
+        if prompt is not None and prompt["latest_version"]["version_no"] == version_no:
+            return prompt
+        return self._history.get(prompt_id, version_no)
+
+    def versions(self, prompt_id):
+        """:return: Every known version of the prompt, oldest first"""
+        return self._history.history(prompt_id)
+
+    def version_row(self, prompt, is_current=False):
+        """:return: Library row of a version returned by version(), versions() or add_version()"""
+        if is_current:
+            row = self._rows.get(prompt["latest_version"]["version_id"])
+            if row is not None:
+                return row
+        return dict(self._row_builder(prompt, self._positions[prompt["prompt_id"]]), is_current=is_current)
+
+    def row(self, prompt_id):
+        """:return: Cached library row of the prompt's current version, or None"""
+        prompt = self._prompts.get(prompt_id)
+        if prompt is None:
+            return None
+        return self._rows[prompt["latest_version"]["version_id"]]
+
+    def rows(self, prompt_ids=None):
+        """:return: Library rows of `prompt_ids` (default: all prompts), in insertion order"""
+        if prompt_ids is None:
+            prompt_ids = list(self._order)
+        else:
+            prompt_ids = sorted(prompt_ids, key=self._positions.__getitem__)
+        return [self.row(prompt_id) for prompt_id in prompt_ids]
+
+    def page(self, sort=None, descending=False, after=None, limit=20):
+        """
+        Keyset page of library rows.
+
+        :param sort: Name in SORT_KEYS, or None for insertion order
+        :param descending: Reverse the order
+        :param after: Position token of the last row of the previous page, as returned here
+        :param limit: Page size
+        :return: (rows, position token of the last row, or None when no page follows)
+        """
+        entries = self._sorted_entries(sort)
+        if descending:
+            end = bisect.bisect_left(entries, tuple(after)) if after else len(entries)
+            start = max(end - limit, 0)
+            selected = entries[start:end][::-1]
+            has_more = start > 0
+        else:
+            start = bisect.bisect_right(entries, tuple(after)) if after else 0
+            selected = entries[start:start + limit]
+            has_more = start + limit < len(entries)
+        rows = [self.row(self._order[position - 1]) for _, position in selected]
+        return rows, (list(selected[-1]) if has_more and selected else None)
+
+    def _sorted_entries(self, sort):
+        entries = self._sorted.get(sort)
+        if entries is None:
+            with self._lock:
+                prompts = [self._prompts[prompt_id] for prompt_id in self._order]
+                if sort is None:
+                    entries = [(position, position) for position in range(1, len(prompts) + 1)]
+                else:
+                    sort_key = SORT_KEYS[sort]
+                    entries = sorted((sort_key(prompt), position) for position, prompt in enumerate(prompts, start=1))
+                self._sorted[sort] = entries
+        return entries
+
+    def add(self, prompt):
+        """
+        Stores a new prompt as its first version.
+
+        :raises ValueError: If the prompt_id already exists
+        """
+        with self._lock:
+            prompt_id = prompt["prompt_id"]
+            if prompt_id in self._prompts:
+                raise ValueError(f"Prompt {prompt_id} already exists")
+            self._positions[prompt_id] = len(self._positions) + 1
+            self._order.append(prompt_id)
+            self._store(prompt)
+            self._history.start(prompt)
+            self._notify(prompt)
+        return prompt
+
+    def add_version(self, prompt_id, update, version):
+        """
+        Creates a new version from a copy of the current one; the previous version is left untouched
+        and the new one shares its unchanged fields. The version number is allocated here, under the
+        lock, so concurrent edits of one prompt get consecutive numbers.
+
+        :param prompt_id: Existing prompt
+        :param update: Callable applying the changes to the copied prompt dict
+        :param version: The new latest_version dict without version_no (version_id, created_at, created_by)
+        :return: The new prompt dict; its latest_version holds the allocated version_no
+        :raises KeyError: If the prompt does not exist
+        """
+        with self._lock:
+            current = self._prompts[prompt_id]
+            version = dict(version, version_no=self.next_version_no(prompt_id))
+            working = copy.deepcopy(current)
+            update(working)
+            working["latest_version"] = version
+            working["total_version"] = int(current.get("total_version", version["version_no"] - 1)) + 1
+            prompt = self._history.append(current, working)
+            self._unindex(current)
+            self._rows.pop(current["latest_version"]["version_id"], None)
+            self._store(prompt)
+            # Under the lock, so listeners see the versions in order
+            self._notify(prompt)
+        return prompt
+
+    def subscribe(self, listener):
+        """Registers `listener(prompt)`, called under the lock after every add or new version (e.g. to update search indexes)."""
+        self._listeners.append(listener)
+
+    def _notify(self, prompt):
+        for listener in self._listeners:
+            listener(prompt)
+
+    def _store(self, prompt):
+        prompt_id = prompt["prompt_id"]
+        self._rows[prompt["latest_version"]["version_id"]] = self._row_builder(prompt, self._positions[prompt_id])
+        self._prompts[prompt_id] = prompt
+        self._index(prompt)
+        self._sorted = {}
+
+    def _index(self, prompt):
+        prompt_id = prompt["prompt_id"]
+        self._by_app.setdefault(_key(prompt.get("app_name")), set()).add(prompt_id)
+        self._by_owner.setdefault(_key(prompt.get("owner_user_id")), set()).add(prompt_id)
+        for tag in prompt.get("tags") or []:
+            self._by_tag.setdefault(_key(tag), set()).add(prompt_id)
+
+    def _unindex(self, prompt):
+        prompt_id = prompt["prompt_id"]
+        keys = [(self._by_app, _key(prompt.get("app_name"))), (self._by_owner, _key(prompt.get("owner_user_id")))]
+        keys += [(self._by_tag, _key(tag)) for tag in prompt.get("tags") or []]
+        for index, key in keys:
+            prompt_ids = index.get(key)
+            if prompt_ids is not None:
+                prompt_ids.discard(prompt_id)
+                if not prompt_ids:
+                    del index[key]
+
+
+class PromptSearchIndex:
+    """
+    Inverted index over the title, description, tags and app_name of the prompts in a PromptRepository.
+
+    Every token maps to the prompts and fields it occurs in, and a sorted vocabulary
+    serves prefix lookups. Vocabulary tokens are also indexed by trigram for
+    typo-tolerant lookups. The index subscribes to the repository, so prompts and
+    versions added through /create are reindexed right away.
+    """
+
+    def __init__(self, repository):
+        self._repository = repository
+        self._lock = threading.Lock()
+        self._postings = {}     # token -> {prompt_id: {field: occurrences}}
+        self._vocabulary = []   # sorted tokens, for prefix lookups
+        self._indexed = {}      # prompt_id -> {token} currently indexed for the prompt
+        self._trigram_tokens = {}  # trigram -> {vocabulary token}
+        for prompt_id in repository.ids():
+            self.update(repository.get(prompt_id))
+        repository.subscribe(self.update)
+
+    def update(self, prompt):
+        """(Re)indexes the current version of `prompt`."""
+        prompt_id = prompt["prompt_id"]
+        hits = {}
+        for field in SEARCH_FIELDS:
+            values = (prompt.get(field) or []) if field == 'tags' else [prompt.get(field)]
+            for value in values:
+                for token in tokenize(value):
+                    fields = hits.setdefault(token, {})
+                    fields[field] = fields.get(field, 0) + 1
+        with self._lock:
+            self._remove(prompt_id)
+            for token, fields in hits.items():
+                postings = self._postings.get(token)
+                if postings is None:
+                    postings = self._postings[token] = {}
+                    bisect.insort(self._vocabulary, token)
+                    for trigram in trigrams(token):
+                        self._trigram_tokens.setdefault(trigram, set()).add(token)
+                postings[prompt_id] = fields
+            self._indexed[prompt_id] = set(hits)
+
+    def search(self, query, fields=None, prefix=True):
+        """
+        :param query: Free text; every token of it must match (AND)
+        :param fields: Subset of SEARCH_FIELDS to match in, all of them by default
+        :param prefix: Also match indexed tokens that start with a query token
+        :return: List of (prompt_id, score), best first, ties in repository order
+        """
+        terms = tokenize(query)
+        fields = set(fields or SEARCH_FIELDS) & set(SEARCH_FIELDS)
+        if not terms or not fields:
+            return []
+        scores = None
+        with self._lock:
+            for term in dict.fromkeys(terms):
+                term_scores = {}
+                for token in (self._expand(term) if prefix else [term]):
+                    weight = 1.0 if token == term else PREFIX_MATCH_WEIGHT
+                    for prompt_id, hits in self._postings.get(token, {}).items():
+                        score = sum(SEARCH_FIELD_WEIGHTS[field] * count for field, count in hits.items() if field in fields)
+                        if score:
+                            term_scores[prompt_id] = term_scores.get(prompt_id, 0) + weight * score
+                if scores is None:
+                    scores = term_scores
+                else:
+                    scores = {prompt_id: scores[prompt_id] + score for prompt_id, score in term_scores.items() if prompt_id in scores}
+                if not scores:
+                    return []
+        position = self._repository.position
+        return sorted(scores.items(), key=lambda item: (-item[1], position(item[0])))
+
+    def fuzzy_search(self, query, threshold, top_k, fields=FUZZY_SEARCH_FIELDS):
+        """
+        Typo-tolerant search. Each query word is matched to the vocabulary tokens sharing
+        enough trigrams with it (similarity = shared / total distinct trigrams), so only
+        tokens with a common trigram are ever compared.
+
+        :param query: Free text
+        :param threshold: Minimum similarity, 0..1, of a word match and of a prompt's score
+        :param top_k: Maximum number of results
+        :param fields: Subset of SEARCH_FIELDS to match in
+        :return: List of (prompt_id, score), best first; the score is the mean over the
+                 query words of the prompt's best word similarity
+        """
+        terms = list(dict.fromkeys(tokenize(query)))
+        fields = set(fields) & set(SEARCH_FIELDS)
+        if not terms or not fields or top_k <= 0:
+            return []
+        best = {}  # prompt_id -> [best similarity per query word]
+        with self._lock:
+            for index, term in enumerate(terms):
+                term_trigrams = trigrams(term)
+                shared = {}
+                for trigram in term_trigrams:
+                    for token in self._trigram_tokens.get(trigram, ()):
+                        shared[token] = shared.get(token, 0) + 1
+                for token, count in shared.items():
+                    similarity = count / (len(term_trigrams) + len(trigrams(token)) - count)
+                    if similarity < threshold:
+                        continue
+                    for prompt_id, hits in self._postings[token].items():
+                        if fields.isdisjoint(hits):
+                            continue
+                        similarities = best.setdefault(prompt_id, [0.0] * len(terms))
+                        if similarity > similarities[index]:
+                            similarities[index] = similarity
+        scored = ((prompt_id, sum(similarities) / len(terms)) for prompt_id, similarities in best.items())
+        position = self._repository.position
+        return heapq.nsmallest(top_k, ((prompt_id, score) for prompt_id, score in scored if score >= threshold),
+                               key=lambda item: (-item[1], position(item[0])))
+
+    def _expand(self, term):
+        tokens = []
+        for token in self._vocabulary[bisect.bisect_left(self._vocabulary, term):]:
+            if not token.startswith(term):
+                break
+            tokens.append(token)
+        return tokens
+
+    def _remove(self, prompt_id):
+        for token in self._indexed.pop(prompt_id, ()):
+            postings = self._postings[token]
+            postings.pop(prompt_id, None)
+            if not postings:
+                del self._postings[token]
+                del self._vocabulary[bisect.bisect_left(self._vocabulary, token)]
+                for trigram in trigrams(token):
+                    tokens = self._trigram_tokens[trigram]
+                    tokens.discard(token)
+                    if not tokens:
+                        del self._trigram_tokens[trigram]
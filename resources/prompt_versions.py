@@ -0,0 +1,129 @@
+import difflib
+import threading
+from collections import OrderedDict
+
+# Free-text fields stored as deltas against the previous version
+TEXT_FIELDS = ('title', 'description')
+
+
+def text_delta(old, new):
+    """
+    :return: Delta turning `old` into `new`: (start, end) slices of `old` to keep, and inserted strings
+    """
+    delta = []
+    for tag, i1, i2, j1, j2 in difflib.SequenceMatcher(None, old, new, autojunk=False).get_opcodes():
+        if tag == 'equal':
+            delta.append((i1, i2))
+        elif tag in ('replace', 'insert'):
+            delta.append(new[j1:j2])
+    return delta
+
+
+def apply_text_delta(old, delta):
+    return ''.join(old[part[0]:part[1]] if isinstance(part, tuple) else part for part in delta)
+
+
+class PromptVersionStore:
+    """
+    Copy-on-write version history of prompt dicts.
+
+    A new version shares every unchanged top-level field with the previous one, and
+    only the changed fields are recorded, with TEXT_FIELDS kept as text deltas. Every
+    `keyframe_interval`-th version of a prompt is kept whole, so reconstructing a
+    version applies at most that many entries. The last `cache_size` reconstructed
+    versions are cached. Stored and returned dicts share objects: treat them as read-only.
+    """
+
+    def __init__(self, keyframe_interval=20, cache_size=256):
+        self.keyframe_interval = keyframe_interval
+        self.cache_size = cache_size
+        self._entries = {}      # prompt_id -> [entry per version, oldest first]
+        self._positions = {}    # prompt_id -> {version_no: index in _entries}
+        self._cache = OrderedDict()  # (prompt_id, version_no) -> prompt dict
+        self._lock = threading.Lock()
+
+    def start(self, prompt):
+        """Records `prompt` as the first known version of its prompt_id."""
+        with self._lock:
+            prompt_id = prompt["prompt_id"]
+            self._entries[prompt_id] = [{"version_no": prompt["latest_version"]["version_no"], "snapshot": dict(prompt)}]
+            self._positions[prompt_id] = {prompt["latest_version"]["version_no"]: 0}
+
+    def append(self, previous, working):
+        """
+        Records `working` as the version following `previous`.
+
+        :param previous: The current version, as stored
+        :param working: The new version, typically an edited deep copy of `previous`
+        :return: The new version, sharing the unchanged fields of `previous`
+        """
+        prompt = {}
+        changed = {}
+        deltas = {}
+        for field, value in working.items():
+            old = previous.get(field)
+            if field in previous and old == value:
+                prompt[field] = old
+                continue
+            prompt[field] = value
+            if field in TEXT_FIELDS and isinstance(old, str) and isinstance(value, str):
+                deltas[field] = text_delta(old, value)
+            else:
+                changed[field] = value
+        removed = [field for field in previous if field not in working]
+
+        with self._lock:
+            prompt_id = prompt["prompt_id"]
+            entries = self._entries[prompt_id]
+            version_no = prompt["latest_version"]["version_no"]
+            if len(entries) % self.keyframe_interval == 0:
+                entry = {"version_no": version_no, "snapshot": dict(prompt)}
+            else:
+                entry = {"version_no": version_no, "changed": changed, "deltas": deltas, "removed": removed}
+            self._positions[prompt_id][version_no] = len(entries)
+            entries.append(entry)
+        return prompt
+
+    def get(self, prompt_id, version_no):
+        """:return: The prompt as of `version_no`, or None if that version is not known"""
+        key = (prompt_id, version_no)
+        with self._lock:
+            prompt = self._cache.get(key)
+            if prompt is not None:
+                self._cache.move_to_end(key)
+                return prompt
+            index = self._positions.get(prompt_id, {}).get(version_no)
+            if index is None:
+                return None
+            entries = self._entries[prompt_id]
+            keyframe = index - index % self.keyframe_interval
+            prompt = dict(entries[keyframe]["snapshot"])
+            for entry in entries[keyframe + 1:index + 1]:
+                self._apply(prompt, entry)
+            self._cache[key] = prompt
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+            return prompt
+
+    def history(self, prompt_id):
+        """:return: Every known version of the prompt, oldest first, reconstructed in one forward pass"""
+        with self._lock:
+            entries = list(self._entries.get(prompt_id, ()))
+        versions = []
+        prompt = None
+        for entry in entries:
+            if "snapshot" in entry:
+                prompt = dict(entry["snapshot"])
+            else:
+                prompt = dict(prompt)
+                self._apply(prompt, entry)
+            versions.append(prompt)
+        return versions
+
+    @staticmethod
+    def _apply(prompt, entry):
+        for field in entry["removed"]:
+            prompt.pop(field, None)
+        prompt.update(entry["changed"])
+        for field, delta in entry["deltas"].items():
+            prompt[field] = apply_text_delta(prompt[field], delta)
@@ -2,6 +2,7 @@ from flask import request, g
 from flask_restx import Resource, Namespace, fields  # type: ignore
 from db import get_db_connection
 from middleware import token_required
+from resources.result_shaping import to_columns, to_records
 
 api = Namespace('rai_batch', description='RAI Batch metrics operations')
 
@@ -51,6 +52,9 @@ rai_batch_metrics = api.model('RaiBatchMetrics', {
     "llmjudge_metrics_xaxis": fields.List(fields.Nested(rai_llmjudge_result), description="List of LLMJudge metrics values"),
 })
 
+HALLUCINATION_VALUES = ['avg_hal_score']
+LLMJUDGE_VALUES = ['avg_answer_similarity', 'avg_answer_correctness', 'avg_answer_relevance', 'avg_faithfulness_score']
+
 
 class RaiBatchMetricsResource(Resource):
     @api.doc('get_rai_batch_metrics')
@@ -92,18 +96,15 @@ class RaiBatchMetricsResource(Resource):
                         WHEN 'Oct' THEN 10 WHEN 'Nov' THEN 11 WHEN 'Dec' THEN 12
                     END
             ''', (application_id,))
-            hallucination_metrics = cursor.fetchall()
+            hallucination_metrics = to_columns(cursor.fetchall(), ['month', 'avg_hal_score'])
 
             hallucination_result = [
-                {
-                    'month': row[0],
-                    'values': {
-                        'avg_hal_score': row[1],
-                    }
-                } for row in hallucination_metrics
+                {'month': month, 'values': values}
+                for month, values in zip(hallucination_metrics['month'],
+                                         to_records(hallucination_metrics, HALLUCINATION_VALUES))
             ]
 
-            hallucination_yAxis = [row[0] for row in hallucination_metrics]
+            hallucination_yAxis = hallucination_metrics['month']
 
             # Fetch LLMJudge metrics
             cursor.execute('''
@@ -129,21 +130,14 @@ class RaiBatchMetricsResource(Resource):
                         WHEN 'Oct' THEN 10 WHEN 'Nov' THEN 11 WHEN 'Dec' THEN 12
                     END
             ''', (application_id,))
-            llmjudge_metrics = cursor.fetchall()
+            llmjudge_metrics = to_columns(cursor.fetchall(), ['month'] + LLMJUDGE_VALUES)
 
             llmjudge_result = [
-                {
-                    'month': row[0],
-                    'values': {
-                        'avg_answer_similarity': row[1],
-                        'avg_answer_correctness': row[2],
-                        'avg_answer_relevance': row[3],
-                        'avg_faithfulness_score': row[4],
-                    }
-                } for row in llmjudge_metrics
+                {'month': month, 'values': values}
+                for month, values in zip(llmjudge_metrics['month'], to_records(llmjudge_metrics, LLMJUDGE_VALUES))
             ]
 
-            llmjudge_yAxis = [row[0] for row in llmjudge_metrics]
+            llmjudge_yAxis = llmjudge_metrics['month']
 
             # Combine results
             result_data = {
@@ -2,6 +2,9 @@ from flask import Flask, request,g
 from flask_restx import Api, Resource, Namespace, fields
 from db import get_db_connection
 from middleware import token_required
+from cache import TTLCache
+from resources.result_shaping import chart_series
+from config import Config
 
 
 
@@ -19,9 +22,106 @@ metrics_model = api.model('SafetyMetrics', {
     }))
 })
 
+batch_metrics_model = api.inherit('SafetyMetricsBatch', metrics_model, {
+    "application_id": fields.String(description="Application ID")
+})
+
+SAFETY_LABELS = [
+    "violent_crimes", "privacy", "non_violent_crimes", "intellectual_property",
+    "sex_crimes", "indiscriminate_weapons", "child_exploitation", "hate",
+    "defamation", "self_harm", "specialized_advice", "sexual_content", "elections"
+]
+TASK_TYPES = ('response', 'request')
+
+# One pass over dbr_report.rai_safety_metrics: both task types summed side by side per application.
+# SUM(CASE ... END) stays NULL when an application has no rows of that task type.
+SAFETY_METRICS_QUERY = '''
+    SELECT
+        application_id,
+        {columns}
+    FROM
+        dbr_report.rai_safety_metrics
+    WHERE
+        application_id IN ({placeholders})
+        AND task_type IN ('response', 'request')
+    GROUP BY
+        application_id
+'''
+SAFETY_METRICS_COLUMNS = ',\n        '.join(
+    f"SUM(CASE WHEN task_type = '{task_type}' THEN {label} END) AS {task_type}_{label}"
+    for task_type in TASK_TYPES for label in SAFETY_LABELS
+)
+
+# SQL Server accepts at most 2100 parameters per statement
+MAX_APPLICATIONS_PER_QUERY = 500
+
+# application_id -> shaped metrics, see get_safety_metrics
+_metrics_cache = TTLCache(ttl=Config.SAFETY_METRICS_CACHE_TTL, max_size=Config.SAFETY_METRICS_CACHE_SIZE)
+
 # Check if all elements in data are null
 def is_empty_data(data):
-    return all(item is None for item in data)
+    return data is None or all(item is None for item in data)
+
+
+def _shape_metrics(response_data, request_data):
+    return {
+        task_type: chart_series(["non_harmful_response"], [100]) if is_empty_data(data)
+        else chart_series(SAFETY_LABELS, data)
+        for task_type, data in (("response", response_data), ("request", request_data))
+    }
+
+
+def _load_safety_metrics(application_ids, cursor):
+    label_count = len(SAFETY_LABELS)
+    metrics = {}
+    for start in range(0, len(application_ids), MAX_APPLICATIONS_PER_QUERY):
+        chunk = application_ids[start:start + MAX_APPLICATIONS_PER_QUERY]
+        query = SAFETY_METRICS_QUERY.format(columns=SAFETY_METRICS_COLUMNS,
+                                            placeholders=', '.join(['?'] * len(chunk)))
+        cursor.execute(query, tuple(chunk))
+        for row in cursor.fetchall():
+            sums = list(row[1:])
+            metrics[row[0]] = _shape_metrics(sums[:label_count], sums[label_count:])
+    # Applications without any rows report as non harmful on both sides
+    return {application_id: metrics.get(application_id) or _shape_metrics(None, None)
+            for application_id in application_ids}
+
+
+def get_safety_metrics(application_ids):
+    """
+    Returns request/response safety metrics per application, caching each
+    application's result for Config.SAFETY_METRICS_CACHE_TTL seconds.
+    Applications missing from the cache are loaded together in one query.
+
+    :param application_ids: List of application IDs
+    :return: Dict application_id -> {"response": {...}, "request": {...}}
+    """
+    results = {}
+    missing = []
+    for application_id in dict.fromkeys(application_ids):
+        cached = _metrics_cache.get(application_id)
+        if cached is None:
+            missing.append(application_id)
+        else:
+            results[application_id] = cached
+
+    if missing:
+        db_connection = None
+        cursor = None
+        try:
+            db_connection = get_db_connection()
+            cursor = db_connection.cursor()
+            loaded = _load_safety_metrics(missing, cursor)
+        finally:
+            if cursor:
+                cursor.close()
+            if db_connection:
+                db_connection.close()
+        for application_id, metrics in loaded.items():
+            _metrics_cache.set(application_id, metrics)
+        results.update(loaded)
+
+    return results
 
 
 class SafetyMetricsResource(Resource):
@@ -37,98 +137,35 @@ class SafetyMetricsResource(Resource):
             return {"message": "Application ID is required."}, 400
 
         try:
-            token_details = g.decoded_token
-            user_email = token_details.get('preferred_username', 'Unknown User')
+            return get_safety_metrics([application_id])[application_id], 200
+        except Exception as e:
+            print(f"Error fetching metrics: {e}")
+            return {"message": "Error fetching metrics", "error": str(e)}, 500
 
-            db_connection = get_db_connection()
-            cursor = db_connection.cursor()
 
-            # Query for response metrics
-            response_query = '''
-                SELECT 
-                    SUM(violent_crimes) AS violent_crimes,
-                    SUM(privacy) AS privacy,
-                    SUM(non_violent_crimes) AS non_violent_crimes,
-                    SUM(intellectual_property) AS intellectual_property,
-                    SUM(sex_crimes) AS sex_crimes,
-                    SUM(indiscriminate_weapons) AS indiscriminate_weapons,
-                    SUM(child_exploitation) AS child_exploitation,
-                    SUM(hate) AS hate,
-                    SUM(defamation) AS defamation,
-                    SUM(self_harm) AS self_harm,
-                    SUM(specialized_advice) AS specialized_advice,
-                    SUM(sexual_content) AS sexual_content,
-                    SUM(elections) AS elections
-                FROM 
-                    dbr_report.rai_safety_metrics
-                WHERE 
-                    application_id = ?
-                    AND task_type = 'response';
-            '''
-            cursor.execute(response_query, (application_id,))
-            response_data = cursor.fetchone()
-
-            # Query for request metrics
-            request_query = '''
-                SELECT 
-                    SUM(violent_crimes) AS violent_crimes,
-                    SUM(privacy) AS privacy,
-                    SUM(non_violent_crimes) AS non_violent_crimes,
-                    SUM(intellectual_property) AS intellectual_property,
-                    SUM(sex_crimes) AS sex_crimes,
-                    SUM(indiscriminate_weapons) AS indiscriminate_weapons,
-                    SUM(child_exploitation) AS child_exploitation,
-                    SUM(hate) AS hate,
-                    SUM(defamation) AS defamation,
-                    SUM(self_harm) AS self_harm,
-                    SUM(specialized_advice) AS specialized_advice,
-                    SUM(sexual_content) AS sexual_content,
-                    SUM(elections) AS elections
-                FROM 
-                    dbr_report.rai_safety_metrics
-                WHERE 
-                    application_id = ?
-                    AND task_type = 'request';
-            '''
-            cursor.execute(request_query, (application_id,))
-            request_data = cursor.fetchone()
-
-            labels = [
-                "violent_crimes", "privacy", "non_violent_crimes", "intellectual_property",
-                "sex_crimes", "indiscriminate_weapons", "child_exploitation", "hate",
-                "defamation", "self_harm", "specialized_advice", "sexual_content", "elections"
-            ]
-
-            # response = {
-            #     "response": {
-            #         "labels": labels,
-            #         "data": list(response_data) if response_data else [0] * len(labels)
-            #     },
-            #     "request": {
-            #         "labels": labels,
-            #         "data": list(request_data) if request_data else [0] * len(labels)
-            #     }
-            # }
-            response = {
-                "response": {
-                    "labels": ["non_harmful_response"] if is_empty_data(response_data) else labels,
-                    "data": [100] if is_empty_data(response_data) else list(response_data)
-                },
-                "request": {
-                    "labels": ["non_harmful_response"] if is_empty_data(request_data) else labels,
-                    "data": [100] if is_empty_data(request_data) else list(request_data)
-                }
-            }
-            return response, 200
+class SafetyMetricsBatchResource(Resource):
+    @api.doc('safety metrics for several applications')
+    @token_required
+    @api.expect(api.parser().add_argument('application_ids', type=str, required=True,
+                                          help='Comma-separated application IDs'))
+    @api.marshal_with(batch_metrics_model, as_list=True)
+    def get(self):
+        """Fetch Safety Metrics for several Application IDs in one call"""
+        application_ids = [application_id.strip() for application_id in request.args.get('application_ids', '').split(',')
+                           if application_id.strip()]
+
+        if not application_ids:
+            return {"message": "At least one application ID is required."}, 400
+
+        try:
+            metrics = get_safety_metrics(application_ids)
+            return [dict(metrics[application_id], application_id=application_id)
+                    for application_id in dict.fromkeys(application_ids)], 200
         except Exception as e:
             print(f"Error fetching metrics: {e}")
             return {"message": "Error fetching metrics", "error": str(e)}, 500
-        finally:
-            if 'cursor' in locals():
-                cursor.close()
-            if 'db_connection' in locals():
-                db_connection.close()
 
 
 # Add the namespace to the API
-api.add_resource(SafetyMetricsResource, '/')
\ No newline at end of file
+api.add_resource(SafetyMetricsResource, '/')
+api.add_resource(SafetyMetricsBatchResource, '/batch')
\ No newline at end of file
@@ -0,0 +1,72 @@
+from datetime import datetime
+
+# Timestamps within the same minute always format to the same date, in any time zone
+_MINUTE_MS = 60 * 1000
+
+
+def to_columns(rows, names):
+    """
+    Transposes cursor rows into columns in one pass.
+
+    :param rows: Result of cursor.fetchall()
+    :param names: Column names, in SELECT order
+    :return: Dict name -> list of values (empty lists when there are no rows)
+    """
+    columns = list(zip(*rows)) if rows else [()] * len(names)
+    return {name: list(column) for name, column in zip(names, columns)}
+
+
+def to_records(columns, names, start_id=None):
+    """
+    Turns columns back into row dicts, e.g. for marshalled list responses.
+
+    :param columns: Dict name -> list of values
+    :param names: Mapping output key -> column name, or a list of column names kept as-is
+    :param start_id: When given, adds an 'id' numbered from this value
+    """
+    if not isinstance(names, dict):
+        names = {name: name for name in names}
+    keys = list(names)
+    records = [dict(zip(keys, values)) for values in zip(*(columns[names[key]] for key in keys))]
+    if start_id is not None:
+        for record_id, record in enumerate(records, start=start_id):
+            record['id'] = record_id
+    return records
+
+
+def format_epoch_ms(values, fmt="%Y-%m-%d"):
+    """
+    Formats epoch-millisecond timestamps (local time), converting each distinct minute only once.
+
+    :return: List of formatted strings
+    """
+    formatted = {}
+    result = []
+    for value in values:
+        minute = value // _MINUTE_MS
+        text = formatted.get(minute)
+        if text is None:
+            text = formatted[minute] = datetime.fromtimestamp(value / 1000).strftime(fmt)
+        result.append(text)
+    return result
+
+
+def group_indices(keys):
+    """
+    :param keys: Column (or zip of columns) to group by
+    :return: Dict key -> list of row positions, in first-seen order
+    """
+    groups = {}
+    for position, key in enumerate(keys):
+        groups.setdefault(key, []).append(position)
+    return groups
+
+
+def take(values, positions):
+    """Selects `positions` from a column."""
+    return [values[position] for position in positions]
+
+
+def chart_series(labels, data):
+    """The chart-ready {'labels': [...], 'data': [...]} structure the dashboards consume."""
+    return {'labels': list(labels), 'data': list(data)}
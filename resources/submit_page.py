@@ -4,6 +4,7 @@ from flask import request, jsonify
 from flask_restx import Namespace, Resource, fields
 from middleware import token_required
 from db import get_db_connection
+from model_catalog import model_catalog
 
 api = Namespace('submit_page', description='Submit page operations')
 
@@ -48,8 +49,7 @@ class PromptFormData(Resource):
             apps = [{"id": r[0], "name": r[1]} for r in cur.fetchall()]
 
             # LLMs / Models
-            cur.execute("SELECT model_id, model_name FROM base.models")
-            llms = [{"id": r[0], "name": r[1]} for r in cur.fetchall()]
+            llms = [{"id": m['model_id'], "name": m['model_name']} for m in model_catalog.snapshot().models]
 
             # Static
             interaction_types = ["Single Turn", "Multi Turn"]
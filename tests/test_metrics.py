@@ -0,0 +1,24 @@
+import sqlite3
+
+import pytest
+
+metrics = pytest.importorskip("resources.metrics", exc_type=ImportError)
+
+
+def bucket_starts(timestamps, bucket_ms):
+    connection = sqlite3.connect(":memory:")
+    connection.execute("CREATE TABLE samples (timestamp REAL)")
+    connection.executemany("INSERT INTO samples VALUES (?)", [(timestamp,) for timestamp in timestamps])
+    rows = connection.execute(f"SELECT {metrics.BUCKET_START_SQL} FROM samples ORDER BY rowid",
+                              (bucket_ms, bucket_ms)).fetchall()
+    connection.close()
+    return [row[0] for row in rows]
+
+
+@pytest.mark.parametrize("bucket", sorted(metrics.BUCKETS))
+def test_bucket_start_is_a_boundary(bucket):
+    bucket_ms = metrics.BUCKETS[bucket]
+    start = 1_700_000_000_000 // bucket_ms * bucket_ms
+    timestamps = [start, start + 0.5, start + 1, start + bucket_ms - 0.5, start + bucket_ms - 1,
+                  start + bucket_ms, start + bucket_ms + 0.25]
+    assert bucket_starts(timestamps, bucket_ms) == [start] * 5 + [start + bucket_ms] * 2
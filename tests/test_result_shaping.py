@@ -0,0 +1,33 @@
+from datetime import datetime
+
+from resources.result_shaping import chart_series, format_epoch_ms, group_indices, take, to_columns, to_records
+
+
+def test_to_columns_transposes_rows():
+    assert to_columns([(1, 'a'), (2, 'b')], ['id', 'name']) == {'id': [1, 2], 'name': ['a', 'b']}
+    assert to_columns([], ['id', 'name']) == {'id': [], 'name': []}
+
+
+def test_to_records_renames_and_numbers():
+    columns = {'model_name': ['m1', 'm2'], 'tpot': [0.5, 0.7]}
+    assert to_records(columns, ['model_name']) == [{'model_name': 'm1'}, {'model_name': 'm2'}]
+    assert to_records(columns, {'name': 'model_name', 'tpot': 'tpot'}, start_id=1) == [
+        {'name': 'm1', 'tpot': 0.5, 'id': 1},
+        {'name': 'm2', 'tpot': 0.7, 'id': 2},
+    ]
+
+
+def test_format_epoch_ms_matches_per_value_formatting():
+    values = [1_700_000_000_000 + offset for offset in (0, 1, 59_999, 60_000, 86_400_000, 3 * 86_400_000 + 123)]
+    expected = [datetime.fromtimestamp(value / 1000).strftime("%Y-%m-%d") for value in values]
+    assert format_epoch_ms(values) == expected
+
+
+def test_group_indices_keeps_first_seen_order():
+    groups = group_indices(zip(['cpu', 'mem', 'cpu', 'cpu'], ['s1', 's1', 's2', 's1']))
+    assert list(groups.items()) == [(('cpu', 's1'), [0, 3]), (('mem', 's1'), [1]), (('cpu', 's2'), [2])]
+    assert take(['a', 'b', 'c', 'd'], groups[('cpu', 's1')]) == ['a', 'd']
+
+
+def test_chart_series():
+    assert chart_series(('x', 'y'), iter([1, 2])) == {'labels': ['x', 'y'], 'data': [1, 2]}
@@ -0,0 +1,102 @@
+import hashlib
+import threading
+from concurrent.futures import Future
+
+from azure_credentials import get_client_secret
+from cache import TTLCache
+from config import Config
+from http_client import http
+
+
+class TokenExchangeError(Exception):
+    """Raised when Azure AD rejects an on-behalf-of exchange."""
+
+    def __init__(self, status_code, text):
+        super().__init__(f"Token exchange failed: {status_code}, {text}")
+        self.status_code = status_code
+        self.text = text
+
+
+class OnBehalfOfTokenBroker:
+    """
+    Exchanges user assertions for downstream access tokens with the OAuth 2.0
+    on-behalf-of flow and caches the results.
+
+    Tokens are cached per (SHA-256 of the user assertion, scope) until
+    `refresh_margin` seconds before they expire. Concurrent requests for the
+    same key share a single exchange instead of each calling Azure AD.
+    """
+
+    def __init__(self, tenant_id, client_id, client_secret_provider, refresh_margin, max_size):
+        self.url = f"https://login.microsoftonline.com/{tenant_id}/oauth2/v2.0/token"
+        self.client_id = client_id
+        self.client_secret_provider = client_secret_provider
+        self.refresh_margin = refresh_margin
+        self._cache = TTLCache(ttl=0, max_size=max_size)
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    def get_token(self, user_assertion, scope):
+        """
+        :param user_assertion: The caller's bearer token (without the 'Bearer ' prefix)
+        :param scope: Downstream scope to request
+        :return: Access token for the scope
+        :raises TokenExchangeError: If Azure AD rejects the exchange
+        """
+        key = (hashlib.sha256(user_assertion.encode('utf-8')).hexdigest(), scope)
+        token = self._cache.get(key)
+        if token is not None:
+            return token
+
+        with self._lock:
+            pending = self._inflight.get(key)
+            is_leader = pending is None
+            if is_leader:
+                pending = self._inflight[key] = Future()
+        if not is_leader:
+            return pending.result()
+
+        try:
+            token, expires_in = self._exchange(user_assertion, scope)
+            ttl = expires_in - self.refresh_margin
+            if ttl > 0:
+                self._cache.set(key, token, ttl=ttl)
+            pending.set_result(token)
+            return token
+        except Exception as e:
+            pending.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[key]
+
+    def stats(self):
+        return self._cache.stats()
+
+    def _exchange(self, user_assertion, scope):
+        client_secret = self.client_secret_provider()
+        if not client_secret:
+            raise TokenExchangeError(500, "Failed to retrieve client secret")
+        data = {
+            "grant_type": "urn:ietf:params:oauth:grant-type:jwt-bearer",
+            "client_id": self.client_id,
+            "client_secret": client_secret,
+            "assertion": user_assertion,
+            "scope": scope,
+            "requested_token_use": "on_behalf_of"
+        }
+        headers = {"Content-Type": "application/x-www-form-urlencoded"}
+        response = http.post(self.url, route='obo', headers=headers, data=data)
+        if response.status_code != 200:
+            raise TokenExchangeError(response.status_code, response.text)
+        response_data = response.json()
+        return response_data['access_token'], int(response_data.get('expires_in', 0))
+
+
+obo_broker = OnBehalfOfTokenBroker(
+    Config.TENANT_ID,
+    Config.CLIENT_ID,
+    get_client_secret,
+    refresh_margin=Config.OBO_REFRESH_MARGIN,
+    max_size=Config.OBO_CACHE_SIZE,
+)
@@ -1,11 +1,137 @@
+import threading
+import time
 import jwt
 from jwt.algorithms import RSAAlgorithm
 import requests
 from config import Config
+from http_client import http
+
+def _parse_max_age(cache_control):
+    """
+    Extracts max-age (in seconds) from a Cache-Control header value.
+
+    :param cache_control: Raw Cache-Control header, may be None
+    :return: max-age as int, or None when absent/unparseable
+    """
+    for directive in (cache_control or '').split(','):
+        name, _, value = directive.strip().partition('=')
+        if name.lower() == 'max-age':
+            try:
+                return int(value)
+            except ValueError:
+                return None
+    return None
+
+
+class JwksKeyStore:
+    """
+    In-process cache of Azure AD signing keys indexed by 'kid'.
+
+    Keys are parsed into RSA key objects once per fetch. The JWKS document is
+    kept for the Cache-Control max-age (or Config.JWKS_CACHE_TTL) and refreshed
+    by a background thread shortly before it expires. An unknown 'kid' triggers
+    at most one synchronous refetch, rate limited so forged kids cannot hammer
+    Azure AD. If a refresh fails the previously fetched keys keep being served.
+    """
+
+    def __init__(self, jwks_uri, default_ttl, min_refetch_interval, refresh_margin=60):
+        self.jwks_uri = jwks_uri
+        self.default_ttl = default_ttl
+        self.min_refetch_interval = min_refetch_interval
+        self.refresh_margin = refresh_margin
+        self._keys = {}
+        self._expires_at = 0.0
+        self._last_fetch_attempt = None
+        self._lock = threading.Lock()
+        self._refresher = None
+
+    def get_key(self, kid):
+        """
+        Returns the parsed public key for the given 'kid'.
+
+        :param kid: Key ID from the token header
+        :return: Public RSA key if known, None otherwise
+        """
+        self._ensure_refresher()
+        if time.monotonic() >= self._expires_at and self._may_fetch():
+            self.refresh(only_if_expired=True)
+        key = self._keys.get(kid)
+        if key is None and self._may_fetch():
+            # Keys may have been rotated since our last fetch; refetch once
+            self.refresh()
+            key = self._keys.get(kid)
+        return key
+
+    def refresh(self, only_if_expired=False):
+        """
+        Fetches the JWKS document and swaps in the parsed keys.
+
+        Threads that queued on the lock while another one fetched return without
+        fetching again: the fetch is skipped when the last attempt is more recent than
+        `min_refetch_interval`, or when `only_if_expired` and the keys are fresh.
+
+        :param only_if_expired: Only fetch if the cached keys have expired
+        :return: True if the key set was updated, False if the fetch was skipped or failed
+        """
+        with self._lock:
+            if not self._may_fetch() or (only_if_expired and time.monotonic() < self._expires_at):
+                return False
+            self._last_fetch_attempt = time.monotonic()
+            try:
+                jwks_response = http.get(self.jwks_uri, route='jwks')
+                jwks_response.raise_for_status()  # Raise HTTPError for bad responses
+                jwks = jwks_response.json()
+                keys = {}
+                for key in jwks['keys']:
+                    if key.get('kty') == 'RSA' and 'kid' in key:
+                        keys[key['kid']] = RSAAlgorithm.from_jwk(key)
+            except requests.RequestException as e:
+                print(f"Error fetching JWKS from Azure AD: {e}")
+                return False
+            except Exception as e:
+                print(f"An error occurred while parsing the JWKS document: {e}")
+                return False
+
+            ttl = _parse_max_age(jwks_response.headers.get('Cache-Control'))
+            self._keys = keys
+            self._expires_at = time.monotonic() + (ttl if ttl is not None else self.default_ttl)
+            return True
+
+    def _may_fetch(self):
+        return self._last_fetch_attempt is None or time.monotonic() - self._last_fetch_attempt >= self.min_refetch_interval
+
+    def _ensure_refresher(self):
+        if self._refresher is None:
+            with self._lock:
+                if self._refresher is None:
+                    self._refresher = threading.Thread(target=self._refresh_loop, name='jwks-refresher', daemon=True)
+                    self._refresher.start()
+
+    def _refresh_loop(self):
+        while True:
+            now = time.monotonic()
+            wait = self._expires_at - self.refresh_margin - now
+            if self._last_fetch_attempt is not None:
+                # Never refetch more often than min_refetch_interval: covers failed fetches (stale keys
+                # keep being served) and a max-age at or below refresh_margin
+                wait = max(wait, self._last_fetch_attempt + self.min_refetch_interval - now)
+            if wait > 0:
+                time.sleep(wait)
+                continue
+            self.refresh()
+
+
+jwks_store = JwksKeyStore(
+    f"https://login.microsoftonline.com/{Config.TENANT_ID}/discovery/v2.0/keys",
+    default_ttl=Config.JWKS_CACHE_TTL,
+    min_refetch_interval=Config.JWKS_MIN_REFETCH_INTERVAL,
+)
+
 
 def get_public_key(token):
     """
     Retrieves the public key for the given JWT from Azure AD based on the 'kid' in the token's header.
+    Keys are served from the in-process JWKS cache.
 
     :param token: JWT that needs to be validated
     :return: Public RSA key for the token if found, None otherwise
@@ -22,25 +148,10 @@ def get_public_key(token):
         return None
 
     try:
-        # Fetch the JSON Web Key Set (JWKS) from Azure AD
-        jwks_uri = f"https://login.microsoftonline.com/{Config.TENANT_ID}/discovery/v2.0/keys"
-        jwks_response = requests.get(jwks_uri)
-        jwks_response.raise_for_status()  # Raise HTTPError for bad responses
-        jwks = jwks_response.json()
-
-        # Match 'kid' from the token header to find the correct public key
-        public_key = None
-        for key in jwks['keys']:
-            if key['kid'] == kid:
-                public_key = RSAAlgorithm.from_jwk(key)
-                break
-
+        public_key = jwks_store.get_key(kid)
         if public_key is None:
             print("Public key not found for the token's Key ID.")
         return public_key
-    except requests.RequestException as e:
-        print(f"Error fetching JWKS from Azure AD: {e}")
-        return None
     except Exception as e:
         print(f"An error occurred while retrieving the public key: {e}")
         return None